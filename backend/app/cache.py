@@ -0,0 +1,338 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+import asyncio
+import logging
+import time
+import orjson
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+from app.config import get_settings
+from app.ml.model_store import model_version
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache-invalidation"
+# Namespace of generation counters; see TieredCache.generation
+GENERATIONS = "generations"
+
+
+class MemoryCache:
+    """In-process LRU cache with per-entry expiry (L1)"""
+
+    def __init__(self, max_items: int = 10000, ttl: float = 30.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + min(ttl or self.ttl, self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def delete_matching(self, pattern: str) -> int:
+        keys = [key for key in self._entries if fnmatchcase(key, pattern)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class RedisCache:
+    """Shared cache across workers (L2) on the asyncio Redis client
+
+    Values are stored as orjson-encoded JSON. Any Redis error is logged and
+    treated as a miss so an unavailable Redis never fails a request.
+    """
+
+    def __init__(self, client: Redis):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str, max_connections: int = 50) -> "RedisCache":
+        pool = ConnectionPool.from_url(url, max_connections=max_connections)
+        return cls(Redis(connection_pool=pool))
+
+    async def get_many(self, keys: List[str]) -> List[Any]:
+        if not keys:
+            return []
+        try:
+            raw = await self.client.mget(keys)
+        except RedisError as e:
+            logger.warning(f"Redis mget failed: {e}")
+            return [None] * len(keys)
+        return [orjson.loads(value) if value is not None else None for value in raw]
+
+    async def set_many(self, items: Dict[str, Any], ttl: float):
+        if not items:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(key, orjson.dumps(value), px=int(ttl * 1000))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Redis set failed: {e}")
+
+    async def incr(self, key: str) -> Optional[int]:
+        try:
+            return await self.client.incr(key)
+        except RedisError as e:
+            logger.warning(f"Redis incr failed: {e}")
+            return None
+
+    async def delete_matching(self, pattern: str) -> int:
+        deleted = 0
+        try:
+            batch = []
+            async for key in self.client.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += await self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await self.client.unlink(*batch)
+        except RedisError as e:
+            logger.warning(f"Redis delete failed: {e}")
+        return deleted
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        try:
+            await self.client.publish(channel, orjson.dumps(message))
+        except RedisError as e:
+            logger.warning(f"Redis publish failed: {e}")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class TieredCache:
+    """Namespaced, versioned L1 + optional Redis L2 cache
+
+    Keys look like ``{prefix}:{version}:{namespace}:{key}``; bumping the model
+    version therefore orphans every cached result of the previous models.
+    Invalidations are published so other workers drop their L1 copies too.
+    Cached values must be JSON-compatible and treated as read-only.
+
+    Groups of keys invalidated often, such as one user's recommendations,
+    carry a generation counter in their keys instead: bumping it is one INCR
+    however many keys the group has, and the old keys simply expire. Without
+    Redis the counters live in this worker only.
+    """
+
+    def __init__(
+        self,
+        l1: MemoryCache,
+        l2: Optional[RedisCache] = None,
+        prefix: str = "mvrs",
+        version: str = "1",
+        ttl: float = 300.0
+    ):
+        self.l1 = l1
+        self.l2 = l2
+        self.prefix = prefix
+        self.version = version
+        self.ttl = ttl
+        self._listener: Optional[asyncio.Task] = None
+        # Copies of Redis generation counters, updated from published bumps
+        self._generation_copies = MemoryCache(l1.max_items, l1.ttl)
+        # Counters when there is no Redis; see _bump_local_generation
+        self._local_generations: Dict[str, int] = {}
+        self._generation_clock = 0
+        self._generation_floor = 0
+
+    def key(self, namespace: str, key: Any) -> str:
+        return f"{self.prefix}:{self.version}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key: Any) -> Any:
+        return (await self.get_many(namespace, [key]))[0]
+
+    async def get_many(self, namespace: str, keys: Iterable[Any]) -> List[Any]:
+        """Look up several keys: L1 first, then one Redis MGET for the misses"""
+        full_keys = [self.key(namespace, key) for key in keys]
+        values = [self.l1.get(full_key) for full_key in full_keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and self.l2 is not None:
+            fetched = await self.l2.get_many([full_keys[i] for i in missing])
+            for i, value in zip(missing, fetched):
+                if value is not None:
+                    values[i] = value
+                    self.l1.set(full_keys[i], value)
+        return values
+
+    async def set(self, namespace: str, key: Any, value: Any, ttl: Optional[float] = None):
+        await self.set_many(namespace, {key: value}, ttl)
+
+    async def set_many(self, namespace: str, items: Dict[Any, Any], ttl: Optional[float] = None):
+        full_items = {self.key(namespace, key): value for key, value in items.items()}
+        for full_key, value in full_items.items():
+            self.l1.set(full_key, value, ttl)
+        if self.l2 is not None:
+            await self.l2.set_many(full_items, ttl or self.ttl)
+
+    async def get_or_set(
+        self,
+        namespace: str,
+        key: Any,
+        fn: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """Return the cached value, or compute it with fn() and cache it (None is not cached)"""
+        value = await self.get(namespace, key)
+        if value is None:
+            value = await fn()
+            if value is not None:
+                await self.set(namespace, key, value, ttl)
+        return value
+
+    async def invalidate(self, namespace: str, pattern: str = "*"):
+        """Drop keys of a namespace matching a glob pattern, in every worker"""
+        full_pattern = self.key(namespace, pattern)
+        self.l1.delete_matching(full_pattern)
+        if self.l2 is not None:
+            await self.l2.delete_matching(full_pattern)
+            await self.l2.publish(self._channel, {"pattern": full_pattern})
+
+    def invalidate_local(self, namespace: str, pattern: str = "*"):
+        """Drop matching keys from this worker's L1 only"""
+        self.l1.delete_matching(self.key(namespace, pattern))
+
+    def _generation_key(self, namespace: str, key: Any) -> str:
+        return self.key(GENERATIONS, f"{namespace}:{key}")
+
+    def local_generation(self, namespace: str, key: Any) -> Optional[int]:
+        """Generation of a key group as this worker knows it, or None if it must be read from Redis"""
+        full_key = self._generation_key(namespace, key)
+        if self.l2 is None:
+            return self._local_generations.get(full_key, self._generation_floor)
+        return self._generation_copies.get(full_key)
+
+    async def generation(self, namespace: str, key: Any) -> int:
+        """Current generation of a key group, to be made part of the group's cache keys"""
+        value = self.local_generation(namespace, key)
+        if value is None:
+            full_key = self._generation_key(namespace, key)
+            value = (await self.l2.get_many([full_key]))[0] or 0
+            self._generation_copies.set(full_key, value)
+        return value
+
+    async def bump_generation(self, namespace: str, key: Any):
+        """Orphan every cached key of a group, in every worker"""
+        full_key = self._generation_key(namespace, key)
+        if self.l2 is None:
+            self._bump_local_generation(full_key)
+            return
+        value = await self.l2.incr(full_key)
+        if value is None:
+            # Redis is unavailable; this worker at least stops serving the old generation
+            value = (self._generation_copies.get(full_key) or 0) + 1
+        self._generation_copies.set(full_key, value)
+        await self.l2.publish(self._channel, {"generation": full_key, "value": value})
+
+    def bump_local_generation(self, namespace: str, key: Any):
+        """Apply a bump made by another worker, for callers that learn of it first"""
+        full_key = self._generation_key(namespace, key)
+        if self.l2 is None:
+            self._bump_local_generation(full_key)
+        else:
+            self._generation_copies.delete(full_key)
+
+    def _bump_local_generation(self, full_key: str):
+        # Values come from one clock, so a group never returns to a generation it
+        # had; when the table is full it is cleared and every group moves past
+        # all values handed out so far
+        self._generation_clock += 1
+        self._local_generations[full_key] = self._generation_clock
+        if len(self._local_generations) > self.l1.max_items:
+            self._local_generations.clear()
+            self._generation_clock += 1
+            self._generation_floor = self._generation_clock
+
+    @property
+    def _channel(self) -> str:
+        return f"{self.prefix}:{INVALIDATION_CHANNEL}"
+
+    async def start(self):
+        """Subscribe to invalidations published by other workers"""
+        if self.l2 is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.l2.client.pubsub()
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_message(orjson.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error: {e}")
+                await asyncio.sleep(1.0)
+
+    def _apply_message(self, message: Dict[str, Any]):
+        if "generation" in message:
+            current = self._generation_copies.get(message["generation"])
+            if current is None or current < message["value"]:
+                self._generation_copies.set(message["generation"], message["value"])
+        else:
+            self.l1.delete_matching(message["pattern"])
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self.l2 is not None:
+            await self.l2.close()
+
+
+# Global cache
+_cache: Optional[TieredCache] = None
+
+
+def get_cache() -> TieredCache:
+    """Get the process-wide cache, creating it from settings on first use"""
+    global _cache
+
+    if _cache is None:
+        settings = get_settings()
+        l2 = None
+        if settings.REDIS_URL:
+            l2 = RedisCache.from_url(settings.REDIS_URL, settings.REDIS_MAX_CONNECTIONS)
+            logger.info(f"Using Redis cache at {settings.REDIS_URL}")
+        _cache = TieredCache(
+            MemoryCache(settings.CACHE_L1_MAX_ITEMS, settings.CACHE_L1_TTL_SECONDS),
+            l2,
+            prefix=settings.CACHE_KEY_PREFIX,
+            version=settings.MODEL_VERSION or model_version(settings.MODELS_PATH),
+            ttl=settings.CACHE_TTL_SECONDS
+        )
+
+    return _cache
+
+
+async def close_cache():
+    """Close the process-wide cache"""
+    global _cache
+
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
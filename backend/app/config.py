@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
-from typing import List
+from typing import List, Optional
+from functools import lru_cache
 import os
 
 
@@ -31,6 +32,93 @@ class Settings(BaseSettings):
     
     # ML Models
     MODELS_PATH: str = Field("ml_models", env="MODELS_PATH")
+    HYBRID_SVD_WEIGHT: float = Field(0.7, env="HYBRID_SVD_WEIGHT")
+    HYBRID_CONTENT_WEIGHT: float = Field(0.3, env="HYBRID_CONTENT_WEIGHT")
+    HYBRID_CANDIDATES_PER_SOURCE: int = Field(200, env="HYBRID_CANDIDATES_PER_SOURCE")
+    # Storage of factor and profile matrices: float64, float16 or int8
+    MODEL_PRECISION: str = Field("float64", env="MODEL_PRECISION")
+    
+    # Model scoring pools
+    SCORING_THREAD_WORKERS: int = Field(4, env="SCORING_THREAD_WORKERS")
+    SCORING_PROCESS_WORKERS: int = Field(2, env="SCORING_PROCESS_WORKERS")
+    SCORING_QUEUE_SIZE: int = Field(32, env="SCORING_QUEUE_SIZE")
+    SCORING_TIMEOUT_SECONDS: float = Field(2.0, env="SCORING_TIMEOUT_SECONDS")
+    
+    # Latency budgets per endpoint; slower stages fall back to cheaper ones
+    RECOMMENDATION_BUDGET_MS: int = Field(200, env="RECOMMENDATION_BUDGET_MS")
+    SIMILAR_MOVIES_BUDGET_MS: int = Field(100, env="SIMILAR_MOVIES_BUDGET_MS")
+    
+    # Admission control: concurrent requests per expensive route group, their wait queue,
+    # and the longest queue wait before shedding with 503
+    ADMISSION_ENABLED: bool = Field(True, env="ADMISSION_ENABLED")
+    ADMISSION_RECOMMENDATIONS_CONCURRENCY: int = Field(8, env="ADMISSION_RECOMMENDATIONS_CONCURRENCY")
+    ADMISSION_RECOMMENDATIONS_QUEUE_SIZE: int = Field(32, env="ADMISSION_RECOMMENDATIONS_QUEUE_SIZE")
+    ADMISSION_RECOMMENDATIONS_MAX_WAIT_MS: float = Field(500.0, env="ADMISSION_RECOMMENDATIONS_MAX_WAIT_MS")
+    ADMISSION_POPULAR_CONCURRENCY: int = Field(4, env="ADMISSION_POPULAR_CONCURRENCY")
+    ADMISSION_POPULAR_QUEUE_SIZE: int = Field(16, env="ADMISSION_POPULAR_QUEUE_SIZE")
+    ADMISSION_POPULAR_MAX_WAIT_MS: float = Field(250.0, env="ADMISSION_POPULAR_MAX_WAIT_MS")
+    ADMISSION_USER_STATS_CONCURRENCY: int = Field(4, env="ADMISSION_USER_STATS_CONCURRENCY")
+    ADMISSION_USER_STATS_QUEUE_SIZE: int = Field(16, env="ADMISSION_USER_STATS_QUEUE_SIZE")
+    ADMISSION_USER_STATS_MAX_WAIT_MS: float = Field(250.0, env="ADMISSION_USER_STATS_MAX_WAIT_MS")
+    
+    # Request coalescing: seconds to reuse a finished result (0 disables reuse)
+    SINGLE_FLIGHT_TTL_SECONDS: float = Field(1.0, env="SINGLE_FLIGHT_TTL_SECONDS")
+    
+    # Cache: in-process L1, shared Redis L2 when REDIS_URL is set
+    REDIS_URL: Optional[str] = Field(None, env="REDIS_URL")
+    REDIS_MAX_CONNECTIONS: int = Field(50, env="REDIS_MAX_CONNECTIONS")
+    CACHE_KEY_PREFIX: str = Field("mvrs", env="CACHE_KEY_PREFIX")
+    CACHE_TTL_SECONDS: float = Field(300.0, env="CACHE_TTL_SECONDS")
+    CACHE_L1_TTL_SECONDS: float = Field(30.0, env="CACHE_L1_TTL_SECONDS")
+    CACHE_L1_MAX_ITEMS: int = Field(10000, env="CACHE_L1_MAX_ITEMS")
+    # Cache key version; defaults to a fingerprint of the model files
+    MODEL_VERSION: str = Field("", env="MODEL_VERSION")
+    
+    # In-memory catalog snapshot refresh interval (0 disables periodic refresh)
+    CATALOG_REFRESH_SECONDS: float = Field(300.0, env="CATALOG_REFRESH_SECONDS")
+    
+    # Per-user rating buckets kept alongside the flat ratings collection
+    RATING_BUCKETS_ENABLED: bool = Field(False, env="RATING_BUCKETS_ENABLED")
+    RATING_BUCKET_SIZE: int = Field(256, env="RATING_BUCKET_SIZE")
+    
+    # Trending movies: decay half-life of rating counts and how often counters are saved
+    TRENDING_HALF_LIFE_HOURS: float = Field(24.0, env="TRENDING_HALF_LIFE_HOURS")
+    TRENDING_PERSIST_SECONDS: float = Field(60.0, env="TRENDING_PERSIST_SECONDS")
+    
+    # Demographic cohort lists for users without ratings
+    COHORT_LIST_SIZE: int = Field(100, env="COHORT_LIST_SIZE")
+    COHORT_PRIOR_WEIGHT: float = Field(10.0, env="COHORT_PRIOR_WEIGHT")
+    COHORT_MIN_USERS: int = Field(20, env="COHORT_MIN_USERS")
+    COHORT_REFRESH_SECONDS: float = Field(3600.0, env="COHORT_REFRESH_SECONDS")
+    
+    # Change feed keeping in-memory state current; replaces periodic catalog refresh
+    CHANGE_FEED_ENABLED: bool = Field(True, env="CHANGE_FEED_ENABLED")
+    CHANGE_FEED_POLL_SECONDS: float = Field(2.0, env="CHANGE_FEED_POLL_SECONDS")
+    
+    # Snapshots of in-memory state restored on startup (0 disables periodic writes or the age limit)
+    SNAPSHOT_ENABLED: bool = Field(True, env="SNAPSHOT_ENABLED")
+    SNAPSHOT_DIR: str = Field("snapshots", env="SNAPSHOT_DIR")
+    SNAPSHOT_INTERVAL_SECONDS: float = Field(300.0, env="SNAPSHOT_INTERVAL_SECONDS")
+    SNAPSHOT_KEEP: int = Field(3, env="SNAPSHOT_KEEP")
+    SNAPSHOT_MAX_AGE_SECONDS: float = Field(86400.0, env="SNAPSHOT_MAX_AGE_SECONDS")
+    
+    # Request profiling: profiled on the token header or by sampling; slow requests saved with their Mongo commands
+    PROFILE_DIR: str = Field("logs/profiles", env="PROFILE_DIR")
+    PROFILE_TOKEN: str = Field("", env="PROFILE_TOKEN")
+    PROFILE_SAMPLE_RATE: float = Field(0.0, env="PROFILE_SAMPLE_RATE")
+    PROFILE_SLOW_MS: float = Field(1000.0, env="PROFILE_SLOW_MS")
+    PROFILE_INTERVAL_MS: float = Field(5.0, env="PROFILE_INTERVAL_MS")
+    PROFILE_MAX_FILES: int = Field(200, env="PROFILE_MAX_FILES")
+    
+    # MongoDB commands slower than this are logged with their plan (0 disables)
+    SLOW_QUERY_MS: float = Field(100.0, env="SLOW_QUERY_MS")
+    
+    # Write-behind rating buffer (off by default)
+    RATING_WRITE_BEHIND: bool = Field(False, env="RATING_WRITE_BEHIND")
+    RATING_LOG_DIR: str = Field("logs/ratings", env="RATING_LOG_DIR")
+    RATING_FLUSH_BATCH_SIZE: int = Field(500, env="RATING_FLUSH_BATCH_SIZE")
+    RATING_FLUSH_INTERVAL_SECONDS: float = Field(1.0, env="RATING_FLUSH_INTERVAL_SECONDS")
+    RATING_LOG_FSYNC: bool = Field(False, env="RATING_LOG_FSYNC")
     
     # Server
     PORT: int = Field(8000, env="PORT")
@@ -38,6 +126,7 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
 
+@lru_cache
 def get_settings() -> Settings:
-    """Get application settings"""
+    """Get application settings, parsed once per process"""
     return Settings()
@@ -0,0 +1,222 @@
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.config import Settings, get_settings
+from app.database import get_database, close_database
+from app.cache import TieredCache, get_cache, close_cache
+from app.indexes.catalog import CatalogIndex
+from app.indexes.seen import SeenIndex
+from app.indexes.trending import TrendingIndex
+from app.indexes.cohorts import CohortIndex
+from app.indexes.change_feed import Change, ChangeFeed
+from app.indexes.snapshots import SnapshotStore, StateSnapshots
+from app.repositories.ratings import RatingRepository
+from app.services.home_service import HomeService
+from app.utils.profiling import ProfileStore
+from app.services.movie_service import MovieService
+from app.services.rating_service import RatingService
+from app.services.rating_buffer import RatingWriteBuffer
+from app.services.recommendation_service import RecommendationService
+from app.services.user_service import UserService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Container:
+    """Application-scoped settings, connections and services
+
+    Built once per worker process in the app lifespan (after any fork), so
+    settings are parsed once, the Motor client and cache are shared, and
+    models are loaded once. Tests can pass their own database and cache; the
+    caller then starts and closes them.
+    """
+
+    def __init__(
+        self,
+        settings: Optional[Settings] = None,
+        database: Optional[AsyncIOMotorDatabase] = None,
+        cache: Optional[TieredCache] = None
+    ):
+        self.settings = settings or get_settings()
+        self._owns_database = database is None
+        self._owns_cache = cache is None
+        self.database = get_database() if database is None else database
+        self.cache = get_cache() if cache is None else cache
+
+        self.profiles = ProfileStore(self.settings.PROFILE_DIR, self.settings.PROFILE_MAX_FILES)
+
+        self.change_feed: Optional[ChangeFeed] = None
+        if self.settings.CHANGE_FEED_ENABLED:
+            self.change_feed = ChangeFeed(self.database, self.settings.CHANGE_FEED_POLL_SECONDS)
+            self.change_feed.subscribe("ratings", self._on_rating_changes)
+            self.change_feed.subscribe("movies", self._on_movie_changes)
+
+        self.catalog = CatalogIndex(
+            self.database.movies,
+            0 if self.change_feed is not None else self.settings.CATALOG_REFRESH_SECONDS
+        )
+        self.seen = SeenIndex()
+        self.trending = TrendingIndex(
+            self.database.trending,
+            half_life_seconds=self.settings.TRENDING_HALF_LIFE_HOURS * 3600,
+            persist_seconds=self.settings.TRENDING_PERSIST_SECONDS
+        )
+        self.cohorts = CohortIndex(
+            self.database.users,
+            self.database.ratings,
+            list_size=self.settings.COHORT_LIST_SIZE,
+            prior_weight=self.settings.COHORT_PRIOR_WEIGHT,
+            min_users=self.settings.COHORT_MIN_USERS,
+            refresh_seconds=self.settings.COHORT_REFRESH_SECONDS
+        )
+        self.snapshots: Optional[StateSnapshots] = None
+        if self.settings.SNAPSHOT_ENABLED:
+            self.snapshots = StateSnapshots(
+                SnapshotStore(self.settings.SNAPSHOT_DIR, self.settings.SNAPSHOT_KEEP),
+                self.catalog, self.seen, self.trending, self.cohorts, self.change_feed,
+                interval_seconds=self.settings.SNAPSHOT_INTERVAL_SECONDS,
+                max_age_seconds=self.settings.SNAPSHOT_MAX_AGE_SECONDS
+            )
+        self.rating_buffer: Optional[RatingWriteBuffer] = None
+        if self.settings.RATING_WRITE_BEHIND:
+            self.rating_buffer = RatingWriteBuffer(
+                self.database.ratings,
+                self.settings.RATING_LOG_DIR,
+                batch_size=self.settings.RATING_FLUSH_BATCH_SIZE,
+                flush_interval=self.settings.RATING_FLUSH_INTERVAL_SECONDS,
+                fsync=self.settings.RATING_LOG_FSYNC
+            )
+
+        self.rating_repository = RatingRepository(
+            self.database,
+            bucketed=self.settings.RATING_BUCKETS_ENABLED,
+            bucket_size=self.settings.RATING_BUCKET_SIZE
+        )
+
+        self.movies = MovieService(self.database, self.cache, self.settings, self.catalog, self.trending)
+        self.ratings = RatingService(
+            self.database, self.cache, self.seen, self.rating_buffer, self.rating_repository,
+            # With a change feed, new ratings from every worker are counted from the feed instead
+            trending=self.trending if self.change_feed is None else None
+        )
+        self.users = UserService(self.database, self.rating_repository)
+        self.recommendations = RecommendationService(
+            self.database, self.cache, self.settings, self.catalog, self.seen, self.rating_repository, self.trending,
+            self.cohorts
+        )
+        self.home = HomeService(
+            self.movies, self.recommendations, self.rating_repository, self.catalog, self.trending
+        )
+
+    async def start(self):
+        """Start background work owned by the container"""
+        # Indexes restored from a snapshot skip their initial load below
+        restored = self.snapshots.restore() if self.snapshots is not None else None
+        if self._owns_cache:
+            await self.cache.start()
+        await self.catalog.start()
+        if self.rating_buffer is not None:
+            await self.rating_buffer.start()
+        if not self.seen.loaded:
+            try:
+                await self.seen.load(self.database.ratings)
+            except Exception:
+                logger.warning("Seen sets unavailable, recommendations will exclude each user's fetched history")
+        await self.trending.start(self.database.ratings)
+        await self.cohorts.start()
+        if restored is not None:
+            await self._replay_since_snapshot()
+        if self.change_feed is not None:
+            await self.change_feed.start()
+        if self.snapshots is not None:
+            await self.snapshots.start()
+
+    async def _replay_since_snapshot(self):
+        """Apply writes made after the restored snapshot was taken"""
+        feed = self.change_feed
+        if feed is None:
+            # A one-off feed, only read up to now
+            feed = ChangeFeed(self.database)
+            feed.subscribe("ratings", self._on_rating_changes)
+            feed.subscribe("movies", self._on_movie_changes)
+        for name, (position, resume_token) in self.snapshots.resume_positions().items():
+            feed.resume(name, position, resume_token)
+            # With a resume token the change stream replays the rest itself
+            if resume_token is None or feed is not self.change_feed:
+                try:
+                    await feed.catch_up(name)
+                except Exception as e:
+                    logger.warning(f"Error replaying {name} written since the state snapshot: {e}")
+
+    async def _on_rating_changes(self, changes: List[Change]):
+        """Fold rating writes from any worker into this worker's state"""
+        self.trending.apply_changes(changes)
+        for user_id in self.seen.apply_changes(changes):
+            self.cache.bump_local_generation("recommendations", user_id)
+        self.cache.invalidate_local("popular_movies")
+
+    async def _on_movie_changes(self, changes: List[Change]):
+        """Fold movie writes from any worker into this worker's catalog"""
+        if self.catalog.apply_changes(changes):
+            for namespace in ("movie", "genre_movies", "similar_movies", "popular_movies"):
+                self.cache.invalidate_local(namespace)
+
+    async def close(self):
+        """Release pools and connections"""
+        if self.snapshots is not None:
+            await self.snapshots.close()
+        if self.change_feed is not None:
+            await self.change_feed.close()
+        await self.catalog.close()
+        await self.trending.close()
+        await self.cohorts.close()
+        if self.rating_buffer is not None:
+            await self.rating_buffer.close()
+        if self.recommendations.scoring is not None:
+            self.recommendations.scoring.shutdown()
+        if self._owns_cache:
+            await close_cache()
+        if self._owns_database:
+            close_database()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the container on startup and tear it down on shutdown"""
+    container = getattr(app.state, "container", None) or Container()
+    app.state.container = container
+    await container.start()
+    logger.info("Application container started")
+    try:
+        yield
+    finally:
+        await container.close()
+        app.state.container = None
+
+
+# FastAPI dependencies
+def get_container(request: Request) -> Container:
+    """Get the application container"""
+    return request.app.state.container
+
+
+def get_movie_service(container: Container = Depends(get_container)) -> MovieService:
+    return container.movies
+
+
+def get_rating_service(container: Container = Depends(get_container)) -> RatingService:
+    return container.ratings
+
+
+def get_user_service(container: Container = Depends(get_container)) -> UserService:
+    return container.users
+
+
+def get_recommendation_service(container: Container = Depends(get_container)) -> RecommendationService:
+    return container.recommendations
+
+
+def get_home_service(container: Container = Depends(get_container)) -> HomeService:
+    return container.home
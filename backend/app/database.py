@@ -2,6 +2,8 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncI
 from typing import Optional
 import logging
 from app.config import get_settings
+from app.utils.profiling import command_timeline
+from app.utils.query_plans import SlowQueryLog
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -10,15 +12,23 @@ logger = logging.getLogger(__name__)
 # Global database connection
 _database: Optional[AsyncIOMotorDatabase] = None
 _client: Optional[AsyncIOMotorClient] = None
+_slow_queries: Optional[SlowQueryLog] = None
 
 def get_database() -> AsyncIOMotorDatabase:
     """Get database connection"""
-    global _database, _client
+    global _database, _client, _slow_queries
     
     if _database is None:
         try:
             settings = get_settings()
-            _client = AsyncIOMotorClient(settings.MONGODB_URL)
+            # Listeners record each request's commands for profiling and log slow ones
+            listeners = [command_timeline]
+            if settings.SLOW_QUERY_MS > 0:
+                _slow_queries = SlowQueryLog(settings.SLOW_QUERY_MS)
+                listeners.append(_slow_queries)
+            _client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=listeners)
+            if _slow_queries is not None:
+                _slow_queries.client = _client.delegate
             _database = _client[settings.DATABASE_NAME]
             logger.info(f"Connected to MongoDB database: {settings.DATABASE_NAME}")
         except Exception as e:
@@ -29,12 +39,15 @@ def get_database() -> AsyncIOMotorDatabase:
 
 def close_database():
     """Close database connection"""
-    global _database, _client
+    global _database, _client, _slow_queries
     
     if _client:
         _client.close()
         _client = None
         _database = None
+        if _slow_queries is not None:
+            _slow_queries.close()
+            _slow_queries = None
         logger.info("MongoDB connection closed")
 
 # Collections
@@ -58,6 +71,42 @@ def get_recommendations_collection() -> AsyncIOMotorCollection:
     db = get_database()
     return db.recommendations
 
+# Index declarations per collection: (keys, options). Shared by init_database
+# and the query-plan checks in app.utils.query_plans
+INDEXES = {
+    "movies": [
+        ([("movie_id", 1)], {"unique": True}),
+        ([("title", 1)], {}),
+        ([("genre", 1)], {}),
+        # Sort fields offered by GET /movies
+        ([("vote_average", 1)], {}),
+        ([("vote_count", 1)], {}),
+        ([("release_date", 1)], {}),
+        # Change feed polling position
+        ([("updated_at", 1), ("_id", 1)], {})
+    ],
+    "ratings": [
+        ([("user_id", 1), ("movie_id", 1)], {"unique": True}),
+        ([("user_id", 1)], {}),
+        ([("movie_id", 1)], {}),
+        # Trending counters rebuild
+        ([("created_at", 1)], {}),
+        ([("updated_at", 1), ("_id", 1)], {})
+    ],
+    # Used when RATING_BUCKETS_ENABLED
+    "rating_buckets": [
+        ([("user_id", 1), ("seq", 1)], {"unique": True})
+    ],
+    "users": [
+        ([("user_id", 1)], {"unique": True})
+    ],
+    "recommendations": [
+        ([("user_id", 1), ("model_type", 1)], {}),
+        ([("user_id", 1)], {}),
+        ([("created_at", 1)], {})
+    ]
+}
+
 # Database initialization
 async def init_database():
     """Initialize database with indexes"""
@@ -65,28 +114,9 @@ async def init_database():
         db = get_database()
         
         # Create indexes for better performance
-        movies_collection = get_movies_collection()
-        ratings_collection = get_ratings_collection()
-        users_collection = get_users_collection()
-        recommendations_collection = get_recommendations_collection()
-        
-        # Movies indexes
-        movies_collection.create_index("movie_id", unique=True)
-        movies_collection.create_index("title")
-        movies_collection.create_index("genre")
-        
-        # Ratings indexes
-        ratings_collection.create_index([("user_id", 1), ("movie_id", 1)], unique=True)
-        ratings_collection.create_index("user_id")
-        ratings_collection.create_index("movie_id")
-        
-        # Users indexes
-        users_collection.create_index("user_id", unique=True)
-        
-        # Recommendations indexes
-        recommendations_collection.create_index([("user_id", 1), ("model_type", 1)])
-        recommendations_collection.create_index("user_id")
-        recommendations_collection.create_index("created_at")
+        for collection, indexes in INDEXES.items():
+            for keys, options in indexes:
+                await db[collection].create_index(keys, **options)
         
         logger.info("Database initialized successfully")
         
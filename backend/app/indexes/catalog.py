@@ -0,0 +1,315 @@
+"""Columnar in-memory snapshot of the movie catalog
+
+The catalog is small and read-mostly, so browsing queries (filter, sort, page,
+lookup by id) are answered from NumPy column arrays instead of MongoDB. A
+snapshot is immutable; ``CatalogIndex`` rebuilds it from Mongo and swaps it in
+atomically, so readers never see a half-built catalog.
+
+Filtering keeps MongoDB's semantics for the current API: genre and title
+filters are case-insensitive regex searches. Each movie carries a bitmask of
+its "|"-separated genre tokens. A genre filter without regex syntax (the usual
+"Drama" or "sci-fi") can only match inside one token, so it becomes the set of
+tokens containing it and one AND over the bitmasks. Other patterns run once per
+distinct, interned genre string rather than once per movie.
+Sorting follows BSON order (missing/null < numbers < strings) with ties broken
+by movie id, which is also the order of unsorted results.
+
+``columns`` exports a catalog as flat arrays (numbers as they are, strings as
+UTF-8 bytes plus offsets, genres as the interned table plus codes) and
+``from_columns`` rebuilds it from them, so state snapshots need no JSON.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import re
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.models.movie import MovieResponse
+from app.ml.ranking import index_lookup
+from app.utils.serialization import response_projection, response_template, shape_documents
+from app.indexes.change_feed import Change
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PROJECTION = response_projection(MovieResponse)
+CATALOG_TEMPLATE = response_template(MovieResponse, title="", genre="")
+# Genre filters free of regex syntax, answered from the token bitmasks
+LITERAL_GENRE = re.compile(r"[^.^$*+?{}\[\]\\|()]+")
+MAX_GENRE_TOKENS = 64
+MAX_CACHED_PATTERNS = 1024
+# Free-text fields stored as UTF-8 bytes plus offsets in column exports
+STRING_FIELDS = ("title", "release_date", "overview", "poster_path")
+
+
+def _bson_key(value: Any):
+    """Sort key approximating BSON comparison order across types"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (3, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (4, str(value))
+
+
+def _release_year(value: Any) -> int:
+    match = re.match(r"\s*(\d{4})", str(value)) if value else None
+    return int(match.group(1)) if match else 0
+
+
+def _encode_strings(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """UTF-8 bytes, offsets (one more than values) and null mask of a string column"""
+    encoded = [str(value).encode() if value is not None else b"" for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets, np.array([value is None for value in values], dtype=bool)
+
+
+def _decode_strings(data: np.ndarray, offsets: np.ndarray, null: np.ndarray) -> List[Optional[str]]:
+    buffer = data.tobytes()
+    bounds = offsets.tolist()
+    return [
+        None if missing else buffer[bounds[i]:bounds[i + 1]].decode()
+        for i, missing in enumerate(null.tolist())
+    ]
+
+
+class MovieCatalog:
+    """Immutable column arrays over the movies collection, ordered by movie id"""
+
+    def __init__(self, documents: Sequence[Dict[str, Any]]):
+        records = sorted(shape_documents(documents, CATALOG_TEMPLATE), key=lambda doc: doc["movie_id"])
+        self.records: List[Dict[str, Any]] = records
+        self.movie_ids = np.array([doc["movie_id"] for doc in records], dtype=np.int64)
+        self.vote_average = np.array(
+            [doc["vote_average"] if doc["vote_average"] is not None else np.nan for doc in records],
+            dtype=np.float64
+        )
+        self.vote_count = np.array([doc["vote_count"] or 0 for doc in records], dtype=np.int64)
+        self.release_year = np.array([_release_year(doc["release_date"]) for doc in records], dtype=np.int32)
+
+        # Interned strings: each row holds a code into a small table
+        self.titles: List[str] = [doc["title"] for doc in records]
+        genres, genre_codes = np.unique(
+            np.array([doc["genre"] or "" for doc in records], dtype=object), return_inverse=True
+        )
+        self._index_genres(genres, genre_codes.astype(np.int32))
+
+    def _index_genres(self, genres: np.ndarray, genre_codes: np.ndarray):
+        """Set the genre table, row codes and token bitmasks, and empty the per-snapshot caches"""
+        self.genres = genres
+        self.genre_codes = genre_codes
+        tokens = sorted({token for genre in self.genres for token in genre.split("|") if token})
+        self.genre_tokens: Optional[List[str]] = None
+        self.genre_bits: Optional[np.ndarray] = None
+        if len(tokens) <= MAX_GENRE_TOKENS:
+            bit = {token: 1 << i for i, token in enumerate(tokens)}
+            table = np.array(
+                [sum(bit[token] for token in set(genre.split("|")) if token) for genre in self.genres], dtype=np.uint64
+            )
+            self.genre_tokens = [token.lower() for token in tokens]
+            self.genre_bits = table[self.genre_codes] if len(table) else np.zeros(0, dtype=np.uint64)
+
+        self._sort_keys: Dict[str, np.ndarray] = {}
+        self._genre_matches: Dict[str, np.ndarray] = {}
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Flat arrays holding the whole catalog, for from_columns"""
+        columns = {
+            "movie_id": self.movie_ids,
+            "vote_average": self.vote_average,
+            "vote_count": self.vote_count,
+            "vote_count_null": np.array([doc["vote_count"] is None for doc in self.records], dtype=bool),
+            "release_year": self.release_year,
+            "genre_codes": self.genre_codes,
+            "genre_null": np.array([doc["genre"] is None for doc in self.records], dtype=bool)
+        }
+        columns["genres_data"], columns["genres_offsets"], _ = _encode_strings(self.genres.tolist())
+        for field in STRING_FIELDS:
+            columns[f"{field}_data"], columns[f"{field}_offsets"], columns[f"{field}_null"] = _encode_strings(
+                [doc[field] for doc in self.records]
+            )
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray]) -> "MovieCatalog":
+        """Catalog exported by columns, rebuilt without re-sorting or re-interning"""
+        catalog = cls.__new__(cls)
+        catalog.movie_ids = np.array(columns["movie_id"], dtype=np.int64)
+        catalog.vote_average = np.array(columns["vote_average"], dtype=np.float64)
+        catalog.vote_count = np.array(columns["vote_count"], dtype=np.int64)
+        catalog.release_year = np.array(columns["release_year"], dtype=np.int32)
+        genres = _decode_strings(
+            columns["genres_data"], columns["genres_offsets"], np.zeros(len(columns["genres_offsets"]) - 1, dtype=bool)
+        )
+        catalog._index_genres(np.array(genres, dtype=object), np.array(columns["genre_codes"], dtype=np.int32))
+
+        values: Dict[str, List[Any]] = {
+            field: _decode_strings(columns[f"{field}_data"], columns[f"{field}_offsets"], columns[f"{field}_null"])
+            for field in STRING_FIELDS
+        }
+        values["movie_id"] = catalog.movie_ids.tolist()
+        values["genre"] = [
+            None if missing else genres[code]
+            for code, missing in zip(catalog.genre_codes.tolist(), columns["genre_null"].tolist())
+        ]
+        values["vote_average"] = [None if np.isnan(v) else v for v in catalog.vote_average.tolist()]
+        values["vote_count"] = [
+            None if missing else v for v, missing in zip(catalog.vote_count.tolist(), columns["vote_count_null"].tolist())
+        ]
+        fields = list(CATALOG_TEMPLATE)
+        catalog.records = [dict(zip(fields, row)) for row in zip(*(values[field] for field in fields))]
+        catalog.titles = [doc["title"] for doc in catalog.records]
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def updated(self, upserts: Iterable[Dict[str, Any]], deleted_ids: Iterable[int] = ()) -> "MovieCatalog":
+        """New snapshot with documents replaced or added and ids removed, without reading MongoDB"""
+        by_id = {doc["movie_id"]: doc for doc in self.records}
+        for doc in upserts:
+            by_id[doc["movie_id"]] = {key: doc[key] for key, keep in CATALOG_PROJECTION.items() if keep and key in doc}
+        for movie_id in deleted_ids:
+            by_id.pop(movie_id, None)
+        return MovieCatalog(list(by_id.values()))
+
+    def get(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        """Movie document by id, or None"""
+        position = index_lookup(self.movie_ids, movie_id)
+        return self.records[position] if position >= 0 else None
+
+    def genre_mask(self, genre: str) -> np.ndarray:
+        """Rows whose genre matches a case-insensitive regex"""
+        if self.genre_bits is not None and LITERAL_GENRE.fullmatch(genre):
+            needle = genre.lower()
+            wanted = sum(1 << i for i, token in enumerate(self.genre_tokens) if needle in token)
+            return (self.genre_bits & np.uint64(wanted)) != 0
+        matches = self._genre_matches.get(genre)
+        if matches is None:
+            pattern = re.compile(genre, re.IGNORECASE)
+            matches = np.array([pattern.search(g) is not None for g in self.genres], dtype=bool)
+            if len(self._genre_matches) < MAX_CACHED_PATTERNS:
+                self._genre_matches[genre] = matches
+        return matches[self.genre_codes]
+
+    def title_mask(self, search: str) -> np.ndarray:
+        """Rows whose title matches a case-insensitive regex"""
+        pattern = re.compile(search, re.IGNORECASE)
+        return np.fromiter((pattern.search(t) is not None for t in self.titles), dtype=bool, count=len(self.titles))
+
+    def sort_key(self, field: str) -> np.ndarray:
+        """Unique int64 key per row giving ascending order on a field, ties by id"""
+        if field not in CATALOG_TEMPLATE:
+            # No record has the field, so every value is missing and rows stay in id order;
+            # nothing is cached, so arbitrary sort_by values cannot grow memory
+            return np.arange(len(self.records), dtype=np.int64)
+        key = self._sort_keys.get(field)
+        if key is None:
+            values = [_bson_key(doc.get(field)) for doc in self.records]
+            order = sorted(range(len(values)), key=values.__getitem__)
+            # Dense rank, so equal values compare equal before the tiebreak
+            rank = np.empty(len(values), dtype=np.int64)
+            current = -1
+            for position, row in enumerate(order):
+                if position == 0 or values[row] != values[order[position - 1]]:
+                    current += 1
+                rank[row] = current
+            key = rank * max(len(values), 1) + np.arange(len(values), dtype=np.int64)
+            self._sort_keys[field] = key
+        return key
+
+    def query(
+        self,
+        skip: int = 0,
+        limit: int = 20,
+        genre: Optional[str] = None,
+        search: Optional[str] = None,
+        sort_by: Optional[str] = "title",
+        sort_order: str = "asc"
+    ) -> List[Dict[str, Any]]:
+        """Filter, sort and page the catalog, like find(query).sort().skip().limit()"""
+        mask = np.ones(len(self), dtype=bool)
+        if genre:
+            mask &= self.genre_mask(genre)
+        if search:
+            mask &= self.title_mask(search)
+        rows = np.flatnonzero(mask)
+
+        if sort_by:
+            keys = self.sort_key(sort_by)[rows]
+            if sort_order != "asc":
+                # Descending on the value; ties still by movie id
+                n = max(len(self), 1)
+                keys = -(keys // n) * n + keys % n
+            end = skip + limit
+            if end < len(rows):
+                part = np.argpartition(keys, end - 1)[:end]
+                rows = rows[part[np.argsort(keys[part])]]
+            else:
+                rows = rows[np.argsort(keys)]
+
+        return [self.records[i] for i in rows[skip:skip + limit]]
+
+
+class CatalogIndex:
+    """Holds the current catalog snapshot and refreshes it from MongoDB"""
+
+    def __init__(self, collection: AsyncIOMotorCollection, refresh_seconds: float = 300.0):
+        self.collection = collection
+        self.refresh_seconds = refresh_seconds
+        self.snapshot: Optional[MovieCatalog] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> MovieCatalog:
+        """Rebuild the snapshot from the movies collection"""
+        try:
+            documents = await self.collection.find({}, CATALOG_PROJECTION).to_list(None)
+            self.snapshot = MovieCatalog(documents)
+            logger.info(f"Loaded catalog snapshot with {len(self.snapshot)} movies")
+            return self.snapshot
+        except Exception as e:
+            logger.error(f"Error refreshing catalog: {e}")
+            raise
+
+    def apply_changes(self, changes: List[Change]) -> bool:
+        """Apply movie changes from the change feed; False if there was nothing to apply"""
+        if self.snapshot is None:
+            return False
+        upserts = [c.document for c in changes if c.operation != "delete" and c.document is not None]
+        deleted = [c.before["movie_id"] for c in changes if c.operation == "delete" and c.before is not None]
+        if not upserts and not deleted:
+            return False
+        self.snapshot = self.snapshot.updated(upserts, deleted)
+        return True
+
+    def restore(self, snapshot: MovieCatalog):
+        """Replace the snapshot with one rebuilt from a state snapshot"""
+        self.snapshot = snapshot
+
+    async def start(self):
+        """Load the first snapshot, unless one was restored, and refresh it periodically"""
+        if self.snapshot is None:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.warning("Catalog snapshot unavailable, movie queries will use MongoDB")
+        if self.refresh_seconds > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                # Already logged; keep serving the previous snapshot
+                pass
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
@@ -0,0 +1,226 @@
+"""Tail MongoDB changes to keep every worker's in-memory state current
+
+Each worker runs its own ``ChangeFeed``: one task per watched collection opens
+a change stream and hands batches of changes to the registered handlers,
+resuming from the last token after transient errors. Deployments without
+change streams (a standalone server or a local test stand-in) fall back to
+polling documents by ``updated_at``. Polling cannot observe deletes, and change
+streams only report the deleted document when pre-images are enabled on the
+collection; handlers must tolerate ``before`` being None. Servers before
+MongoDB 6.0 reject the pre-image option, so the stream is reopened without
+it. Polling and catching up read by ``(updated_at, _id)``, and the feed
+creates that index on every collection it reads.
+
+Each collection's position is kept both as a resume token and as an
+``updated_at`` watermark, so a restarted worker can resume from where a
+snapshot of its state was taken. A token that has fallen off the oplog is
+replaced by polling from the watermark until caught up.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from collections import defaultdict
+from datetime import datetime
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning change streams are not available
+CHANGE_STREAMS_UNSUPPORTED = {40573, 115}
+# Server error codes meaning a resume token can no longer be resumed from
+RESUME_TOKEN_LOST = {260, 280, 286}
+# Server error code for an unknown $changeStream option (fullDocumentBeforeChange before 6.0)
+UNKNOWN_FIELD = 40415
+POSITION_INDEX = [("updated_at", 1), ("_id", 1)]
+MAX_BATCH = 1000
+
+
+class Change(NamedTuple):
+    """One document change: operation is insert, update, replace or delete"""
+    operation: str
+    document: Optional[Dict[str, Any]]
+    before: Optional[Dict[str, Any]] = None
+
+
+class Position(NamedTuple):
+    """Polling position: documents after (updated_at, _id), or from updated_at on when last_id is None"""
+    updated_at: datetime
+    last_id: Any = None
+
+
+Handler = Callable[[List[Change]], Awaitable[None]]
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _TokenLost(Exception):
+    pass
+
+
+class _NoPreImages(Exception):
+    pass
+
+
+async def read_changes(collection, position: Position, limit: int = MAX_BATCH) -> Tuple[List[Change], Position]:
+    """Next batch of documents written after a position, as updates, with the position after them"""
+    # Position is (updated_at, _id), so documents sharing a timestamp are neither skipped nor repeated
+    if position.last_id is not None:
+        query = {"$or": [
+            {"updated_at": {"$gt": position.updated_at}},
+            {"updated_at": position.updated_at, "_id": {"$gt": position.last_id}}
+        ]}
+    else:
+        query = {"updated_at": {"$gte": position.updated_at}}
+    documents = await collection.find(query).sort([("updated_at", 1), ("_id", 1)]).limit(limit).to_list(None)
+    if documents:
+        position = Position(documents[-1]["updated_at"], documents[-1]["_id"])
+    return [Change("update", doc) for doc in documents], position
+
+
+class ChangeFeed:
+    """Per-worker change stream consumer with a polling fallback"""
+
+    def __init__(self, database: AsyncIOMotorDatabase, poll_interval: float = 2.0):
+        self.database = database
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.resume_tokens: Dict[str, Any] = {}
+        self.positions: Dict[str, Position] = {}
+        self.modes: Dict[str, str] = {}
+        # Collections whose server rejected pre-images of deleted documents
+        self.without_pre_images: Set[str] = set()
+        self._indexed: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(self, collection_name: str, handler: Handler):
+        """Call handler with each batch of changes to a collection"""
+        self.handlers[collection_name].append(handler)
+
+    def resume(self, collection_name: str, position: Position, resume_token: Any = None):
+        """Start from a saved position instead of from now; call before start"""
+        self.positions[collection_name] = position
+        if resume_token is not None:
+            self.resume_tokens[collection_name] = resume_token
+
+    async def start(self):
+        for name in self.handlers:
+            self._tasks.append(asyncio.create_task(self._follow(name)))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _dispatch(self, name: str, changes: List[Change]):
+        for handler in self.handlers[name]:
+            try:
+                await handler(changes)
+            except Exception as e:
+                logger.error(f"Error applying {len(changes)} {name} changes: {e}")
+
+    async def _ensure_index(self, name: str):
+        """Create the (updated_at, _id) index that polling and catching up read by"""
+        if name in self._indexed:
+            return
+        try:
+            await self.database[name].create_index(POSITION_INDEX)
+            self._indexed.add(name)
+        except Exception as e:
+            logger.warning(f"Could not create the change feed index on {name}: {e}")
+
+    async def catch_up(self, name: str):
+        """Dispatch every document written since the collection's position"""
+        await self._ensure_index(name)
+        while True:
+            changes, self.positions[name] = await read_changes(self.database[name], self.positions[name])
+            if changes:
+                await self._dispatch(name, changes)
+            if len(changes) < MAX_BATCH:
+                return
+
+    async def _follow(self, name: str):
+        # Without a resumed position, start from here; earlier state was loaded at startup
+        self.positions.setdefault(name, Position(datetime.utcnow()))
+        while True:
+            try:
+                self.modes[name] = "change_stream"
+                await self._watch(name)
+            except _NoPreImages:
+                logger.info(f"Server does not support pre-images, watching {name} without deleted documents")
+                self.without_pre_images.add(name)
+            except _Unsupported:
+                logger.info(f"Change streams unavailable for {name}, polling updated_at every {self.poll_interval}s")
+                self.modes[name] = "polling"
+                await self._poll(name)
+            except _TokenLost:
+                logger.warning(f"Resume token for {name} expired, catching up from {self.positions[name].updated_at}")
+                self.modes[name] = "catching_up"
+                await self.catch_up(name)
+                self.resume_tokens.pop(name, None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Change stream on {name} interrupted, resuming: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _watch(self, name: str):
+        options = {} if name in self.without_pre_images else {"full_document_before_change": "whenAvailable"}
+        try:
+            try:
+                stream = self.database[name].watch(
+                    full_document="updateLookup",
+                    resume_after=self.resume_tokens.get(name),
+                    **options
+                )
+            except (TypeError, AttributeError, NotImplementedError):
+                raise _Unsupported()
+            async with stream:
+                while stream.alive:
+                    batch = [await stream.next()]
+                    while len(batch) < MAX_BATCH:
+                        event = await stream.try_next()
+                        if event is None:
+                            break
+                        batch.append(event)
+                    changes = [self._to_change(event) for event in batch]
+                    await self._dispatch(name, changes)
+                    self.resume_tokens[name] = batch[-1]["_id"]
+                    self._advance(name, changes)
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                raise _Unsupported()
+            if e.code in RESUME_TOKEN_LOST and name in self.resume_tokens:
+                raise _TokenLost()
+            if options and (e.code == UNKNOWN_FIELD or "fullDocumentBeforeChange" in str(e)):
+                raise _NoPreImages()
+            raise
+
+    def _advance(self, name: str, changes: List[Change]):
+        """Move the watermark to the newest updated_at streamed, for resuming without a token"""
+        stamps = [c.document["updated_at"] for c in changes if c.document is not None and "updated_at" in c.document]
+        if stamps and max(stamps) > self.positions[name].updated_at:
+            self.positions[name] = Position(max(stamps))
+
+    @staticmethod
+    def _to_change(event: Dict[str, Any]) -> Change:
+        return Change(event["operationType"], event.get("fullDocument"), event.get("fullDocumentBeforeChange"))
+
+    async def _poll(self, name: str):
+        collection = self.database[name]
+        await self._ensure_index(name)
+        while True:
+            try:
+                changes, position = await read_changes(collection, self.positions[name])
+                if changes:
+                    await self._dispatch(name, changes)
+                self.positions[name] = position
+                if len(changes) == MAX_BATCH:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error polling {name} for changes: {e}")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,261 @@
+"""Top-N movie lists per demographic cohort, for users without ratings
+
+Users are bucketed by age band, gender and occupation at several levels of
+detail, from (age band, gender, occupation) down to a single attribute. Each
+cohort's list ranks the movies its members rated by a twice-smoothed Bayesian
+average: a movie's overall average is pulled toward the global mean, and its
+average within the cohort is pulled toward that overall average. A movie few
+members rated keeps roughly its overall standing; one the cohort rates above
+everyone else rises.
+
+Lists for every cohort at every level come from one groupby over the ratings
+joined to user attributes. They are rebuilt on a schedule and served from
+memory. A user gets the list of their most specific cohort with enough raters.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_right
+import asyncio
+import logging
+import numpy as np
+import pandas as pd
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.ml.ranking import exclusion_mask, index_lookup
+
+logger = logging.getLogger(__name__)
+
+# MovieLens age groups
+AGE_BANDS = (18, 25, 35, 45, 50, 56)
+AGE_LABELS = ("under 18", "18-24", "25-34", "35-44", "45-49", "50-55", "56+")
+# Most specific first; a user is served from the first level with a list
+COHORT_LEVELS = (
+    ("age_band", "gender", "occupation"),
+    ("age_band", "gender"),
+    ("age_band",),
+    ("gender",)
+)
+USER_PROJECTION = {"_id": 0, "user_id": 1, "age": 1, "gender": 1, "occupation": 1}
+
+
+def user_attributes(user: Dict[str, Any]) -> Dict[str, str]:
+    """Cohort attributes of a user document; missing or blank fields are left out"""
+    attributes = {}
+    age = user.get("age")
+    if isinstance(age, (int, float)) and age > 0:
+        attributes["age_band"] = AGE_LABELS[bisect_right(AGE_BANDS, age)]
+    gender = (user.get("gender") or "").strip().upper()
+    if gender:
+        attributes["gender"] = gender
+    occupation = (user.get("occupation") or "").strip().lower()
+    if occupation:
+        attributes["occupation"] = occupation
+    return attributes
+
+
+def cohort_keys(attributes: Dict[str, str]) -> List[str]:
+    """Keys of the cohorts a user belongs to, most specific first"""
+    return [
+        "|".join(f"{name}={attributes[name]}" for name in level)
+        for level in COHORT_LEVELS
+        if all(name in attributes for name in level)
+    ]
+
+
+def cohort_label(key: str) -> str:
+    """Readable form of a cohort key, such as '25-34, M, engineer'"""
+    return ", ".join(part.split("=", 1)[1] for part in key.split("|"))
+
+
+def build_cohort_lists(
+    users: List[Dict[str, Any]],
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    ratings: np.ndarray,
+    list_size: int = 100,
+    prior_weight: float = 10.0,
+    min_users: int = 20
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """(movie ids, scores) best first for every cohort with at least min_users raters"""
+    if len(ratings) == 0 or not users:
+        return {}
+    ratings = ratings.astype(np.float64)
+    global_mean = ratings.mean()
+    item_ids, items = np.unique(movie_ids, return_inverse=True)
+    movie_sum = np.bincount(items, weights=ratings, minlength=len(item_ids))
+    movie_count = np.bincount(items, minlength=len(item_ids))
+    prior = (movie_sum + prior_weight * global_mean) / (movie_count + prior_weight)
+
+    known_ids = np.array(sorted(user["user_id"] for user in users), dtype=np.int64)
+    by_id = {user["user_id"]: user_attributes(user) for user in users}
+    positions = index_lookup(known_ids, user_ids)
+    raters = np.bincount(np.unique(positions[positions >= 0]), minlength=len(known_ids)) > 0
+
+    # One cohort code space across all levels, so a single groupby covers them
+    keys: List[str] = []
+    code_columns, rating_rows = [], []
+    for level in COHORT_LEVELS:
+        level_keys = np.array([
+            "|".join(f"{name}={by_id[user_id][name]}" for name in level)
+            if all(name in by_id[user_id] for name in level) else None
+            for user_id in known_ids.tolist()
+        ], dtype=object)
+        codes, uniques = pd.factorize(level_keys)
+        n_raters = np.bincount(codes[(codes >= 0) & raters], minlength=len(uniques))
+        # Cohorts too small to say anything go to the next level down
+        codes = np.where((codes >= 0) & (n_raters[np.maximum(codes, 0)] >= min_users), codes + len(keys), -1)
+        keys.extend(uniques.tolist())
+        rating_codes = np.where(positions >= 0, codes[np.maximum(positions, 0)], -1)
+        kept = np.flatnonzero(rating_codes >= 0)
+        code_columns.append(rating_codes[kept])
+        rating_rows.append(kept)
+
+    rows = np.concatenate(rating_rows)
+    if len(rows) == 0:
+        return {}
+    grouped = pd.DataFrame({
+        "cohort": np.concatenate(code_columns),
+        "item": items[rows],
+        "rating": ratings[rows]
+    }).groupby(["cohort", "item"], sort=False)["rating"].agg(["sum", "count"])
+
+    cohorts = grouped.index.get_level_values("cohort").to_numpy()
+    cohort_items = grouped.index.get_level_values("item").to_numpy()
+    scores = (grouped["sum"].to_numpy() + prior_weight * prior[cohort_items]) / (grouped["count"].to_numpy() + prior_weight)
+
+    order = np.lexsort((item_ids[cohort_items], -scores, cohorts))
+    cohorts, cohort_items, scores = cohorts[order], cohort_items[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, cohorts[1:] != cohorts[:-1]])
+    ends = np.r_[starts[1:], len(cohorts)]
+    return {
+        keys[cohorts[start]]: (item_ids[cohort_items[start:min(end, start + list_size)]], scores[start:min(end, start + list_size)])
+        for start, end in zip(starts.tolist(), ends.tolist())
+    }
+
+
+class CohortIndex:
+    """Cohort top-N lists and each user's cohorts, rebuilt periodically and served from memory"""
+
+    def __init__(
+        self,
+        users_collection: AsyncIOMotorCollection,
+        ratings_collection: AsyncIOMotorCollection,
+        list_size: int = 100,
+        prior_weight: float = 10.0,
+        min_users: int = 20,
+        refresh_seconds: float = 3600.0
+    ):
+        self.users_collection = users_collection
+        self.ratings_collection = ratings_collection
+        self.list_size = list_size
+        self.prior_weight = prior_weight
+        self.min_users = min_users
+        self.refresh_seconds = refresh_seconds
+        self.lists: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.user_keys: Dict[int, List[str]] = {}
+        self.loaded = False
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        """Recompute every cohort list from the users and ratings collections"""
+        try:
+            users = await self.users_collection.find({}, USER_PROJECTION).to_list(None)
+            ratings = await self.ratings_collection.find(
+                {}, {"_id": 0, "user_id": 1, "movie_id": 1, "rating": 1}
+            ).to_list(None)
+            lists = await asyncio.to_thread(
+                build_cohort_lists,
+                users,
+                np.fromiter((r["user_id"] for r in ratings), dtype=np.int64, count=len(ratings)),
+                np.fromiter((r["movie_id"] for r in ratings), dtype=np.int64, count=len(ratings)),
+                np.fromiter((r["rating"] for r in ratings), dtype=np.float64, count=len(ratings)),
+                self.list_size,
+                self.prior_weight,
+                self.min_users
+            )
+            self.lists = lists
+            self.user_keys = {user["user_id"]: cohort_keys(user_attributes(user)) for user in users}
+            self.loaded = True
+            logger.info(f"Built top-{self.list_size} lists for {len(lists)} cohorts")
+        except Exception as e:
+            logger.error(f"Error building cohort lists: {e}")
+            raise
+
+    async def cohort_of(self, user_id: int) -> Optional[str]:
+        """Most specific cohort with a list for the user, looking up users added since the last refresh"""
+        keys = self.user_keys.get(user_id)
+        if keys is None:
+            user = await self.users_collection.find_one({"user_id": user_id}, USER_PROJECTION)
+            if user is None:
+                return None
+            keys = self.user_keys[user_id] = cohort_keys(user_attributes(user))
+        return next((key for key in keys if key in self.lists), None)
+
+    def top(self, key: str, n: int, exclude: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Top-n (movie_id, score) of a cohort's list, skipping excluded movies"""
+        movie_ids, scores = self.lists.get(key, (np.empty(0, dtype=np.int64), np.empty(0)))
+        mask = exclusion_mask(movie_ids, exclude)
+        if mask is not None:
+            movie_ids, scores = movie_ids[~mask], scores[~mask]
+        return list(zip(movie_ids[:n].tolist(), scores[:n].tolist()))
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        """Settings the lists depend on; restored lists must have been built with the same ones"""
+        return {"list_size": self.list_size, "prior_weight": self.prior_weight, "min_users": self.min_users}
+
+    def export(self) -> Dict[str, Any]:
+        """Lists and user cohorts as flat arrays plus the key table they index into"""
+        lists, user_keys = dict(self.lists), dict(self.user_keys)
+        keys = sorted(set(lists).union(*user_keys.values()))
+        codes = {key: code for code, key in enumerate(keys)}
+        list_keys = sorted(lists)
+        user_ids = np.array(sorted(user_keys), dtype=np.int64)
+        return {
+            "keys": keys,
+            "list_codes": np.array([codes[key] for key in list_keys], dtype=np.int32),
+            "list_offsets": np.cumsum([0] + [len(lists[key][0]) for key in list_keys], dtype=np.int64),
+            "list_movie_ids": np.concatenate([lists[key][0] for key in list_keys] or [np.empty(0)]).astype(np.int64),
+            "list_scores": np.concatenate([lists[key][1] for key in list_keys] or [np.empty(0)]).astype(np.float64),
+            "user_ids": user_ids,
+            "user_offsets": np.cumsum([0] + [len(user_keys[user_id]) for user_id in user_ids.tolist()], dtype=np.int64),
+            "user_codes": np.array(
+                [codes[key] for user_id in user_ids.tolist() for key in user_keys[user_id]], dtype=np.int32
+            )
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        """Replace lists and user cohorts with ones from export; lists are views of its arrays"""
+        keys, offsets = state["keys"], state["list_offsets"]
+        self.lists = {
+            keys[code]: (state["list_movie_ids"][offsets[i]:offsets[i + 1]], state["list_scores"][offsets[i]:offsets[i + 1]])
+            for i, code in enumerate(state["list_codes"].tolist())
+        }
+        user_offsets, user_codes = state["user_offsets"].tolist(), state["user_codes"].tolist()
+        self.user_keys = {
+            user_id: [keys[code] for code in user_codes[user_offsets[i]:user_offsets[i + 1]]]
+            for i, user_id in enumerate(state["user_ids"].tolist())
+        }
+        self.loaded = True
+
+    async def start(self):
+        """Build the first lists, unless restored from a snapshot, and rebuild them periodically"""
+        if not self.loaded:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.warning("Cohort lists unavailable, cold users get popular movies")
+        if self.refresh_seconds > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                # Already logged; keep serving the previous lists
+                pass
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
@@ -0,0 +1,178 @@
+"""Per-user sets of rated movies, used to exclude seen items from top-k
+
+Each user's set is stored in whichever of two containers is smaller, as in
+roaring bitmaps: a sorted uint32 array of movie ids for light raters, or a
+packed bitset over the movie id space for heavy ones. Sets are immutable, so a
+scoring thread can read one while a rating write swaps in its replacement.
+
+For snapshots the index is flattened to CSR arrays (user ids, offsets, movie
+ids). A restored index keeps those arrays, memory-mapped, and builds a user's
+set the first time it is asked for.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.ml.ranking import index_lookup
+from app.indexes.change_feed import Change
+
+logger = logging.getLogger(__name__)
+
+
+class SeenSet:
+    """Immutable set of movie ids with a vectorized membership mask"""
+
+    __slots__ = ("ids", "bits", "size")
+
+    def __init__(self, movie_ids: Iterable[int]):
+        if isinstance(movie_ids, np.ndarray):
+            ids = np.unique(movie_ids.astype(np.int64))
+        else:
+            ids = np.unique(np.fromiter(movie_ids, dtype=np.int64))
+        ids = ids[ids >= 0].astype(np.uint32)
+        self.size = len(ids)
+        self.ids: Optional[np.ndarray] = None
+        self.bits: Optional[np.ndarray] = None
+        n_bits = int(ids[-1]) + 1 if self.size else 0
+        if self.size * 32 <= n_bits:
+            self.ids = ids
+        else:
+            dense = np.zeros(n_bits, dtype=bool)
+            dense[ids] = True
+            self.bits = np.packbits(dense, bitorder="little")
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, movie_id: int) -> bool:
+        return bool(self.mask(np.array([movie_id]))[0])
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    def to_array(self) -> np.ndarray:
+        """Movie ids, ascending"""
+        if self.ids is not None:
+            return self.ids.astype(np.int64)
+        return np.flatnonzero(np.unpackbits(self.bits, bitorder="little"))
+
+    @property
+    def nbytes(self) -> int:
+        return (self.ids if self.ids is not None else self.bits).nbytes
+
+    def mask(self, item_ids: np.ndarray) -> np.ndarray:
+        """Boolean mask over item_ids, True where the movie has been seen"""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if self.ids is not None:
+            return index_lookup(self.ids, item_ids) >= 0
+        in_range = (item_ids >= 0) & (item_ids < len(self.bits) * 8)
+        safe = np.where(in_range, item_ids, 0)
+        return in_range & ((self.bits[safe >> 3] >> (safe & 7)) & 1).astype(bool)
+
+    def add(self, movie_id: int) -> "SeenSet":
+        return SeenSet(np.append(self.to_array(), movie_id))
+
+    def remove(self, movie_id: int) -> "SeenSet":
+        ids = self.to_array()
+        return SeenSet(ids[ids != movie_id])
+
+
+EMPTY = SeenSet(())
+
+
+class SeenIndex:
+    """Seen sets for every user, built from the ratings collection"""
+
+    def __init__(self):
+        self.users: Dict[int, SeenSet] = {}
+        self.loaded = False
+        # Restored CSR arrays; users not yet in self.users are built from them on first use
+        self._base: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def get(self, user_id: int) -> SeenSet:
+        seen = self.users.get(user_id)
+        if seen is None and self._base is not None:
+            base_users, offsets, movie_ids = self._base
+            position = int(index_lookup(base_users, user_id))
+            if position >= 0:
+                seen = self.users[user_id] = SeenSet(movie_ids[offsets[position]:offsets[position + 1]])
+        return seen if seen is not None else EMPTY
+
+    def build(self, user_ids: np.ndarray, movie_ids: np.ndarray):
+        """Replace every set from aligned (user_id, movie_id) arrays"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        order = np.argsort(user_ids, kind="stable")
+        users, starts = np.unique(user_ids[order], return_index=True)
+        groups = np.split(movie_ids[order], starts[1:]) if len(users) else []
+        self.users = {int(user): SeenSet(group) for user, group in zip(users, groups)}
+        self._base = None
+        self.loaded = True
+
+    def restore(self, user_ids: np.ndarray, offsets: np.ndarray, movie_ids: np.ndarray):
+        """Replace every set with CSR arrays from export; sets are built lazily"""
+        self.users = {}
+        self._base = (user_ids, offsets, movie_ids)
+        self.loaded = True
+
+    def copy(self) -> "SeenIndex":
+        """Index sharing this one's sets, unaffected by later writes to it"""
+        index = SeenIndex()
+        index.users = dict(self.users)
+        index._base = self._base
+        index.loaded = self.loaded
+        return index
+
+    def export(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(user ids ascending, offsets, movie ids) with user i's ids at offsets[i]:offsets[i + 1]"""
+        groups: Dict[int, np.ndarray] = {}
+        if self._base is not None:
+            base_users, offsets, movie_ids = self._base
+            for position, user_id in enumerate(base_users.tolist()):
+                groups[user_id] = movie_ids[offsets[position]:offsets[position + 1]]
+        for user_id, seen in self.users.items():
+            groups[user_id] = seen.to_array()
+        user_ids = np.array(sorted(groups), dtype=np.int64)
+        offsets = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum([len(groups[user_id]) for user_id in user_ids.tolist()], out=offsets[1:])
+        movie_ids = np.empty(offsets[-1], dtype=np.uint32)
+        for position, user_id in enumerate(user_ids.tolist()):
+            movie_ids[offsets[position]:offsets[position + 1]] = groups[user_id]
+        return user_ids, offsets, movie_ids
+
+    async def load(self, ratings_collection: AsyncIOMotorCollection):
+        """Build from all ratings"""
+        try:
+            ratings = await ratings_collection.find({}, {"_id": 0, "user_id": 1, "movie_id": 1}).to_list(None)
+            self.build(
+                np.fromiter((r["user_id"] for r in ratings), dtype=np.int64, count=len(ratings)),
+                np.fromiter((r["movie_id"] for r in ratings), dtype=np.int64, count=len(ratings))
+            )
+            logger.info(f"Loaded seen sets for {len(self.users)} users ({self.nbytes // 1024} KiB)")
+        except Exception as e:
+            logger.error(f"Error loading seen sets: {e}")
+            raise
+
+    def add(self, user_id: int, movie_id: int):
+        self.users[user_id] = self.get(user_id).add(movie_id)
+
+    def remove(self, user_id: int, movie_id: int):
+        self.users[user_id] = self.get(user_id).remove(movie_id)
+
+    def apply_changes(self, changes: List[Change]) -> Set[int]:
+        """Apply rating changes from the change feed, returning the affected users"""
+        users = set()
+        for change in changes:
+            if change.operation == "delete":
+                if change.before is not None:
+                    self.remove(change.before["user_id"], change.before["movie_id"])
+                    users.add(change.before["user_id"])
+            elif change.document is not None:
+                self.add(change.document["user_id"], change.document["movie_id"])
+                users.add(change.document["user_id"])
+        return users
+
+    @property
+    def nbytes(self) -> int:
+        base = sum(array.nbytes for array in self._base) if self._base is not None else 0
+        return base + sum(seen.nbytes for seen in self.users.values())
@@ -0,0 +1,266 @@
+"""Snapshots of derived serving state, for warm restarts
+
+A snapshot holds the catalog columns, every user's seen set, the trending
+counters and the cohort lists, written as flat ``.npy`` arrays under one
+versioned directory with a ``manifest.json``. The manifest records the
+MongoDB position each collection had been applied up to: the change stream
+resume token and an ``updated_at`` watermark.
+
+On startup the newest usable snapshot is memory-mapped and restored in place
+of the collection scans; seen sets are built per user on first use. Writes
+made since the snapshot are then replayed: the change feed resumes from the
+saved positions, or, without a feed, ratings and movies updated since the
+watermark are read once. Polling cannot see deletes, so a rating deleted
+while no worker was running stays in its user's seen set until the next full
+load.
+
+Snapshots are written to a temporary directory renamed into place, so a
+reader never sees a partial one. Every worker writes its own; the newest
+``keep`` are kept.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import orjson
+from bson import ObjectId
+from app.indexes.catalog import CatalogIndex, MovieCatalog
+from app.indexes.change_feed import ChangeFeed, Position
+from app.indexes.cohorts import CohortIndex
+from app.indexes.seen import SeenIndex
+from app.indexes.trending import TrendingIndex
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+COLLECTIONS = ("ratings", "movies")
+# Without a change feed, local writes are applied to memory just after they are
+# stored; replaying from slightly before the snapshot covers writes in between
+REPLAY_MARGIN_SECONDS = 5.0
+
+
+class SnapshotStore:
+    """Versioned snapshot directories of .npy arrays plus a manifest"""
+
+    def __init__(self, directory: str, keep: int = 3):
+        self.directory = directory
+        self.keep = keep
+
+    def write(self, arrays: Dict[str, np.ndarray], manifest: Dict[str, Any]) -> str:
+        """Write a snapshot and return its directory"""
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        staging = os.path.join(self.directory, f".{name}.tmp")
+        os.makedirs(staging)
+        try:
+            for key, array in arrays.items():
+                np.save(os.path.join(staging, f"{key}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+            with open(os.path.join(staging, MANIFEST_FILE), "wb") as f:
+                f.write(orjson.dumps({**manifest, "format": FORMAT_VERSION, "arrays": sorted(arrays)}))
+            path = os.path.join(self.directory, name)
+            os.rename(staging, path)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._prune()
+        return path
+
+    def _prune(self):
+        for name in self._names()[:-max(self.keep, 1)]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _names(self) -> List[str]:
+        """Complete snapshot directory names, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if not name.startswith("."))
+
+    def latest(self, max_age_seconds: float = 0.0) -> Optional[Tuple[Dict[str, Any], Dict[str, np.ndarray]]]:
+        """Manifest and memory-mapped arrays of the newest readable snapshot, or None"""
+        for name in reversed(self._names()):
+            path = os.path.join(self.directory, name)
+            try:
+                with open(os.path.join(path, MANIFEST_FILE), "rb") as f:
+                    manifest = orjson.loads(f.read())
+                if manifest.get("format") != FORMAT_VERSION:
+                    continue
+                if max_age_seconds > 0 and time.time() - manifest["created_at"] > max_age_seconds:
+                    logger.info(f"Newest state snapshot {name} is older than {max_age_seconds:.0f}s, not restoring")
+                    return None
+                arrays = {
+                    key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r", allow_pickle=False)
+                    for key in manifest["arrays"]
+                }
+                manifest["name"] = name
+                return manifest, arrays
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable state snapshot {name}: {e}")
+        return None
+
+
+def _encode_position(position: Position) -> Dict[str, Any]:
+    return {
+        "updated_at": position.updated_at.isoformat(),
+        # Other _id types are replayed from the timestamp alone
+        "last_id": str(position.last_id) if isinstance(position.last_id, ObjectId) else None
+    }
+
+
+def _decode_position(doc: Dict[str, Any]) -> Position:
+    last_id = doc.get("last_id")
+    return Position(datetime.fromisoformat(doc["updated_at"]), ObjectId(last_id) if last_id else None)
+
+
+class StateSnapshots:
+    """Captures the in-memory indexes to a SnapshotStore and restores them at startup"""
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        catalog: CatalogIndex,
+        seen: SeenIndex,
+        trending: TrendingIndex,
+        cohorts: CohortIndex,
+        change_feed: Optional[ChangeFeed] = None,
+        interval_seconds: float = 300.0,
+        max_age_seconds: float = 86400.0
+    ):
+        self.store = store
+        self.catalog = catalog
+        self.seen = seen
+        self.trending = trending
+        self.cohorts = cohorts
+        self.change_feed = change_feed
+        self.interval_seconds = interval_seconds
+        self.max_age_seconds = max_age_seconds
+        self.restored: Optional[Dict[str, Any]] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    def _positions(self) -> Dict[str, Dict[str, Any]]:
+        """Position of each collection the captured state reflects"""
+        positions = {}
+        for name in COLLECTIONS:
+            if self.change_feed is not None and name in self.change_feed.positions:
+                position = self.change_feed.positions[name]
+                token = self.change_feed.resume_tokens.get(name)
+            else:
+                position = Position(datetime.utcnow() - timedelta(seconds=REPLAY_MARGIN_SECONDS))
+                token = None
+            positions[name] = {**_encode_position(position), "resume_token": token}
+        return positions
+
+    def capture(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Copy references to the current state; runs on the event loop so no change is applied meanwhile"""
+        manifest: Dict[str, Any] = {"created_at": time.time(), "positions": self._positions(), "parts": []}
+        captured: Dict[str, Any] = {}
+        if self.catalog.snapshot is not None:
+            captured["catalog"] = self.catalog.snapshot
+        if self.seen.loaded:
+            captured["seen"] = self.seen.copy()
+        if self.trending.loaded:
+            counters = self.trending.counters
+            captured["trending_movie_ids"], captured["trending_scores"] = counters.to_arrays()
+            manifest["trending"] = {"landmark": counters.landmark, "half_life_seconds": counters.half_life_seconds}
+        if self.cohorts.loaded:
+            captured["cohorts"] = self.cohorts
+            manifest["cohorts"] = {"params": self.cohorts.params}
+        return captured, manifest
+
+    def _write(self, captured: Dict[str, Any], manifest: Dict[str, Any]) -> str:
+        """Flatten captured state to arrays and write it; runs in a worker thread"""
+        arrays: Dict[str, np.ndarray] = {}
+        if "catalog" in captured:
+            arrays.update({f"catalog_{key}": array for key, array in captured["catalog"].columns().items()})
+            manifest["parts"].append("catalog")
+        if "seen" in captured:
+            arrays["seen_user_ids"], arrays["seen_offsets"], arrays["seen_movie_ids"] = captured["seen"].export()
+            manifest["parts"].append("seen")
+        if "trending_movie_ids" in captured:
+            arrays["trending_movie_ids"] = captured["trending_movie_ids"]
+            arrays["trending_scores"] = captured["trending_scores"]
+            manifest["parts"].append("trending")
+        if "cohorts" in captured:
+            state = captured["cohorts"].export()
+            manifest["cohorts"]["keys"] = state.pop("keys")
+            arrays.update({f"cohort_{key}": array for key, array in state.items()})
+            manifest["parts"].append("cohorts")
+        return self.store.write(arrays, manifest)
+
+    async def save(self) -> Optional[str]:
+        """Write a snapshot of the current state"""
+        try:
+            captured, manifest = self.capture()
+            started = time.perf_counter()
+            path = await asyncio.to_thread(self._write, captured, manifest)
+            logger.info(f"Wrote state snapshot {os.path.basename(path)} ({', '.join(manifest['parts'])}) in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return path
+        except Exception as e:
+            logger.warning(f"Error writing state snapshot: {e}")
+            return None
+
+    def restore(self) -> Optional[Dict[str, Any]]:
+        """Restore indexes from the newest snapshot; returns its manifest, or None to load from MongoDB"""
+        try:
+            latest = self.store.latest(self.max_age_seconds)
+            if latest is None:
+                return None
+            manifest, arrays = latest
+            parts = set(manifest["parts"])
+            started = time.perf_counter()
+            # Everything that can fail is read before any index is replaced
+            catalog = MovieCatalog.from_columns(
+                {key[len("catalog_"):]: array for key, array in arrays.items() if key.startswith("catalog_")}
+            ) if "catalog" in parts else None
+            positions = {name: _decode_position(doc) for name, doc in manifest["positions"].items()}
+            if catalog is not None:
+                self.catalog.restore(catalog)
+            if "seen" in parts:
+                self.seen.restore(arrays["seen_user_ids"], arrays["seen_offsets"], arrays["seen_movie_ids"])
+            if "trending" in parts:
+                trending = manifest["trending"]
+                self.trending.restore(
+                    arrays["trending_movie_ids"], arrays["trending_scores"], trending["landmark"], trending["half_life_seconds"]
+                )
+            if "cohorts" in parts:
+                if manifest["cohorts"]["params"] == self.cohorts.params:
+                    state = {key[len("cohort_"):]: array for key, array in arrays.items() if key.startswith("cohort_")}
+                    self.cohorts.restore({**state, "keys": manifest["cohorts"]["keys"]})
+                else:
+                    logger.info("Cohort settings changed since the snapshot, rebuilding cohort lists")
+            logger.info(
+                f"Restored {', '.join(manifest['parts'])} from state snapshot {manifest['name']} "
+                f"({time.time() - manifest['created_at']:.0f}s old) in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            self.restored = {**manifest, "positions": {
+                name: (positions[name], doc.get("resume_token")) for name, doc in manifest["positions"].items()
+            }}
+            return manifest
+        except Exception as e:
+            logger.warning(f"Error restoring state snapshot, loading from MongoDB: {e}")
+            return None
+
+    def resume_positions(self) -> Dict[str, Tuple[Position, Any]]:
+        """(position, resume token) per collection recorded in the restored snapshot"""
+        return self.restored["positions"] if self.restored is not None else {}
+
+    async def start(self):
+        """Write snapshots periodically"""
+        if self.interval_seconds > 0 and self._writer is None:
+            self._writer = asyncio.create_task(self._save_periodically())
+
+    async def _save_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.save()
+
+    async def close(self):
+        """Stop periodic snapshots and write a last one for the next start"""
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        await self.save()
@@ -0,0 +1,217 @@
+"""Trending movies from exponentially decayed rating counts
+
+Each new rating adds ``exp(rate * (t - landmark))`` to its movie's score, where
+``rate = ln 2 / half_life``. Every score shares the same decay factor, so
+nothing has to be decayed on write; a score's current value is the stored
+value times ``exp(-rate * (now - landmark))``. When the exponent grows large
+the landmark moves forward and all scores are rescaled once.
+
+Counters are persisted to the ``trending`` collection periodically and loaded
+on startup; with no persisted state they are rebuilt from recent ratings once.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import logging
+import math
+import time
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.indexes.change_feed import Change
+from app.ml.ranking import exclusion_mask
+
+logger = logging.getLogger(__name__)
+
+STATE_ID = "rating_counters"
+# Rescale before stored scores approach float64 overflow
+MAX_EXPONENT = 50.0
+# Ratings older than this many half-lives contribute under 0.4% and are skipped when rebuilding
+REBUILD_HALF_LIVES = 8
+
+
+def _epoch(at: datetime) -> float:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return at.timestamp()
+
+
+class TrendingCounters:
+    """Decayed per-movie rating counts with O(1) updates"""
+
+    def __init__(self, half_life_seconds: float = 86400.0, landmark: Optional[float] = None, ranking_ttl: float = 1.0):
+        self.half_life_seconds = half_life_seconds
+        self.rate = math.log(2) / half_life_seconds
+        self.landmark = time.time() if landmark is None else landmark
+        self.scores: Dict[int, float] = {}
+        self.ranking_ttl = ranking_ttl
+        self._ranking: Optional[np.ndarray] = None
+        self._ranked_at = 0.0
+        self._dirty = False
+
+    def add(self, movie_id: int, at: Optional[float] = None, weight: float = 1.0):
+        """Count one rating of movie_id at epoch seconds `at`"""
+        at = time.time() if at is None else at
+        exponent = self.rate * (at - self.landmark)
+        if exponent > MAX_EXPONENT:
+            self._rebase(at)
+            exponent = 0.0
+        self.scores[movie_id] = self.scores.get(movie_id, 0.0) + weight * math.exp(exponent)
+        self._dirty = True
+
+    def _rebase(self, landmark: float):
+        factor = math.exp(-self.rate * (landmark - self.landmark))
+        self.scores = {movie_id: score * factor for movie_id, score in self.scores.items() if score * factor > 1e-12}
+        self.landmark = landmark
+
+    def score(self, movie_id: int, now: Optional[float] = None) -> float:
+        """Current decayed count for a movie"""
+        now = time.time() if now is None else now
+        return self.scores.get(movie_id, 0.0) * math.exp(-self.rate * (now - self.landmark))
+
+    def ranked_ids(self) -> np.ndarray:
+        """All counted movie ids, most trending first; recomputed at most once per ranking_ttl"""
+        if self._ranking is None or (self._dirty and time.monotonic() - self._ranked_at >= self.ranking_ttl):
+            ids = np.fromiter(self.scores.keys(), dtype=np.int64, count=len(self.scores))
+            scores = np.fromiter(self.scores.values(), dtype=np.float64, count=len(self.scores))
+            self._ranking = ids[np.lexsort((ids, -scores))]
+            self._ranked_at = time.monotonic()
+            self._dirty = False
+        return self._ranking
+
+    def top(self, n: int, now: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Top-n (movie_id, decayed count)"""
+        return [(movie_id, self.score(movie_id, now)) for movie_id in self.ranked_ids()[:n].tolist()]
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(movie ids, stored scores) as little-endian int64 and float64"""
+        return (
+            np.fromiter(self.scores.keys(), dtype="<i8", count=len(self.scores)),
+            np.fromiter(self.scores.values(), dtype="<f8", count=len(self.scores))
+        )
+
+    def to_document(self) -> Dict[str, Any]:
+        movie_ids, scores = self.to_arrays()
+        return {
+            "half_life_seconds": self.half_life_seconds,
+            "landmark": self.landmark,
+            "movie_ids": movie_ids.tobytes(),
+            "scores": scores.tobytes()
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any], half_life_seconds: float) -> "TrendingCounters":
+        return cls.from_arrays(
+            np.frombuffer(doc["movie_ids"], dtype="<i8"),
+            np.frombuffer(doc["scores"], dtype="<f8"),
+            doc["landmark"],
+            doc["half_life_seconds"],
+            half_life_seconds
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        movie_ids: np.ndarray,
+        scores: np.ndarray,
+        landmark: float,
+        saved_half_life_seconds: float,
+        half_life_seconds: float
+    ) -> "TrendingCounters":
+        counters = cls(saved_half_life_seconds, landmark)
+        counters.scores = dict(zip(np.asarray(movie_ids).tolist(), np.asarray(scores).tolist()))
+        if half_life_seconds != counters.half_life_seconds:
+            # Keep current values; only future decay follows the new half-life
+            counters._rebase(time.time())
+            counters.half_life_seconds = half_life_seconds
+            counters.rate = math.log(2) / half_life_seconds
+        return counters
+
+
+class TrendingIndex:
+    """Trending counters kept current from rating writes and persisted periodically"""
+
+    def __init__(self, collection: AsyncIOMotorCollection, half_life_seconds: float = 86400.0, persist_seconds: float = 60.0):
+        self.collection = collection
+        self.half_life_seconds = half_life_seconds
+        self.persist_seconds = persist_seconds
+        self.counters = TrendingCounters(half_life_seconds)
+        self.loaded = False
+        self._persister: Optional[asyncio.Task] = None
+
+    async def load(self, ratings_collection: AsyncIOMotorCollection):
+        """Load persisted counters, or rebuild them from recent ratings"""
+        try:
+            doc = await self.collection.find_one({"_id": STATE_ID})
+            if doc is not None:
+                self.counters = TrendingCounters.from_document(doc, self.half_life_seconds)
+                self.loaded = True
+                logger.info(f"Loaded trending counters for {len(self.counters.scores)} movies")
+                return
+            since = datetime.utcfromtimestamp(time.time() - REBUILD_HALF_LIVES * self.half_life_seconds)
+            cursor = ratings_collection.find({"created_at": {"$gte": since}}, {"_id": 0, "movie_id": 1, "created_at": 1})
+            counters = TrendingCounters(self.half_life_seconds)
+            async for rating in cursor:
+                counters.add(rating["movie_id"], _epoch(rating["created_at"]))
+            self.counters = counters
+            self.loaded = True
+            logger.info(f"Rebuilt trending counters for {len(counters.scores)} movies from recent ratings")
+        except Exception as e:
+            logger.error(f"Error loading trending counters: {e}")
+            raise
+
+    def restore(self, movie_ids: np.ndarray, scores: np.ndarray, landmark: float, half_life_seconds: float):
+        """Replace the counters with ones from a snapshot"""
+        self.counters = TrendingCounters.from_arrays(movie_ids, scores, landmark, half_life_seconds, self.half_life_seconds)
+        self.loaded = True
+
+    def record(self, movie_id: int, at: Optional[datetime] = None):
+        """Count a new rating"""
+        self.counters.add(movie_id, _epoch(at) if at is not None else None)
+
+    def apply_changes(self, changes: List[Change]):
+        """Count new ratings from the change feed; updates to an existing rating are not new activity"""
+        for change in changes:
+            doc = change.document
+            if doc is None or change.operation == "delete":
+                continue
+            # Buffered writes are stored after they were accepted, so their insert time is kept apart
+            inserted_at = doc.get("inserted_at", doc.get("created_at"))
+            if change.operation == "insert" or inserted_at == doc.get("updated_at"):
+                self.record(doc["movie_id"], doc.get("created_at"))
+
+    def top_ids(self, n: int, exclude: Optional[Iterable[int]] = None) -> List[int]:
+        """Top-n trending movie ids, skipping excluded ones"""
+        ranked = self.counters.ranked_ids()
+        mask = exclusion_mask(ranked, exclude)
+        if mask is not None:
+            ranked = ranked[~mask]
+        return ranked[:n].tolist()
+
+    async def save(self):
+        try:
+            await self.collection.replace_one(
+                {"_id": STATE_ID}, {**self.counters.to_document(), "updated_at": datetime.utcnow()}, upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Error persisting trending counters: {e}")
+
+    async def start(self, ratings_collection: AsyncIOMotorCollection):
+        """Load counters, unless restored from a snapshot, and persist them periodically"""
+        if not self.loaded:
+            try:
+                await self.load(ratings_collection)
+            except Exception:
+                logger.warning("Trending counters start empty")
+        if self.persist_seconds > 0 and self._persister is None:
+            self._persister = asyncio.create_task(self._persist_periodically())
+
+    async def _persist_periodically(self):
+        while True:
+            await asyncio.sleep(self.persist_seconds)
+            await self.save()
+
+    async def close(self):
+        if self._persister is not None:
+            self._persister.cancel()
+            self._persister = None
+            await self.save()
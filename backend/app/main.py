@@ -10,9 +10,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import routers
-from app.routers import movies, recommendations, ratings, users
+from app.routers import movies, recommendations, ratings, users, home, debug
 from app.config import get_settings
-from app.database import get_database
+from app.container import Container, get_container, lifespan
+from app.utils.serialization import ORJSONResponse
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.admission import AdmissionMiddleware, default_routes
 
 # Create FastAPI app
 app = FastAPI(
@@ -20,12 +23,18 @@ app = FastAPI(
     description="A RESTful API for movie recommendations using collaborative filtering and content-based algorithms",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Get settings
 settings = get_settings()
 
+# Limit concurrent expensive requests; added first so shed responses still get CORS headers
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, routes=default_routes(settings))
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -35,11 +44,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profile requests on demand and keep slow ones, in the container's profile store
+app.add_middleware(
+    ProfilingMiddleware,
+    token=settings.PROFILE_TOKEN,
+    sample_rate=settings.PROFILE_SAMPLE_RATE,
+    slow_ms=settings.PROFILE_SLOW_MS,
+    interval_ms=settings.PROFILE_INTERVAL_MS
+)
+
 # Include routers
 app.include_router(movies.router, prefix="/movies", tags=["movies"])
 app.include_router(recommendations.router, prefix="/recommendations", tags=["recommendations"])
 app.include_router(ratings.router, prefix="/ratings", tags=["ratings"])
 app.include_router(users.router, prefix="/users", tags=["users"])
+app.include_router(home.router, prefix="/home", tags=["home"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"], include_in_schema=False)
 
 @app.get("/")
 async def root():
@@ -53,13 +73,11 @@ async def root():
     }
 
 @app.get("/health")
-async def health_check():
+async def health_check(container: Container = Depends(get_container)):
     """Health check endpoint"""
     try:
-        # Check database connection
-        db = get_database()
-        # Simple database ping
-        db.admin.command('ping')
+        # Simple database ping over the shared client
+        await container.database.command("ping")
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
@@ -0,0 +1 @@
+# Machine learning modules
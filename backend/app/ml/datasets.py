@@ -0,0 +1,63 @@
+from typing import Optional, Tuple
+from sklearn.model_selection import train_test_split
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MovieLens genre flags, in the column order of u.item (genre_0 ... genre_18)
+GENRES = [
+    "unknown", "Action", "Adventure", "Animation", "Children's", "Comedy",
+    "Crime", "Documentary", "Drama", "Fantasy", "Film-Noir", "Horror",
+    "Musical", "Mystery", "Romance", "Sci-Fi", "Thriller", "War", "Western"
+]
+
+GENRE_COLUMNS = [f"genre_{i}" for i in range(len(GENRES))]
+
+RATINGS_COLUMNS = ["user_id", "movie_id", "rating", "timestamp"]
+MOVIES_COLUMNS = ["movie_id", "movie_title", "release_date", "video_release_date", "imdb_url"] + GENRE_COLUMNS
+USERS_COLUMNS = ["user_id", "age", "gender", "occupation", "zip_code"]
+
+
+def load_ratings(path: str) -> pd.DataFrame:
+    """Load a MovieLens u.data ratings file"""
+    ratings_df = pd.read_csv(
+        path,
+        sep="\t",
+        names=RATINGS_COLUMNS,
+        dtype={"user_id": "int64", "movie_id": "int64", "rating": "float64", "timestamp": "int64"}
+    )
+    logger.info(f"Loaded {len(ratings_df)} ratings from {path}")
+    return ratings_df
+
+
+def load_movies(path: str) -> pd.DataFrame:
+    """Load movies from a MovieLens u.item file or the notebook's movies_data.csv"""
+    if path.endswith(".csv"):
+        movies_df = pd.read_csv(path)
+    else:
+        movies_df = pd.read_csv(path, sep="|", names=MOVIES_COLUMNS, encoding="latin-1")
+    logger.info(f"Loaded {len(movies_df)} movies from {path}")
+    return movies_df
+
+
+def load_users(path: str) -> pd.DataFrame:
+    """Load a MovieLens u.user file"""
+    users_df = pd.read_csv(path, sep="|", names=USERS_COLUMNS, dtype={"zip_code": str})
+    logger.info(f"Loaded {len(users_df)} users from {path}")
+    return users_df
+
+
+def split_ratings(
+    ratings_df: pd.DataFrame,
+    test_size: float = 0.2,
+    random_state: Optional[int] = 42
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split ratings into train and test sets, stratified by user as in the notebook"""
+    return train_test_split(
+        ratings_df,
+        test_size=test_size,
+        random_state=random_state,
+        stratify=ratings_df["user_id"]
+    )
+
@@ -0,0 +1,269 @@
+"""Offline ranking evaluation over every test user
+
+Scores users in batches as (users x items) matrices, masks each user's training
+items, takes a vectorized top-k and accumulates precision@k, recall@k, NDCG@k
+and catalog coverage. RMSE/MAE are computed over the full test set. Batches run
+on a thread pool; NumPy releases the GIL inside the matrix products.
+
+Usage:
+    python -m app.ml.evaluation --ratings path/to/u.data --models-path ml_models
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from app.ml.datasets import load_ratings, split_ratings
+from app.ml.model_store import load_models
+from app.ml.ranking import top_k, index_lookup
+
+logger = logging.getLogger(__name__)
+
+METRICS = ["precision", "recall", "ndcg", "coverage", "rmse", "mae"]
+
+
+class EvaluationResult(BaseModel):
+    """Evaluation metrics for one model"""
+    model: str = Field(..., description="Model name")
+    k: int = Field(..., description="Cut-off for ranking metrics")
+    users: int = Field(..., description="Number of test users with relevant items")
+    precision: float = Field(..., description="Mean precision@k")
+    recall: float = Field(..., description="Mean recall@k")
+    ndcg: float = Field(..., description="Mean NDCG@k")
+    coverage: float = Field(..., description="Share of the catalog recommended to at least one user")
+    rmse: float = Field(..., description="Root mean squared error on the test ratings")
+    mae: float = Field(..., description="Mean absolute error on the test ratings")
+    seconds: float = Field(..., description="Wall-clock evaluation time")
+
+
+def _item_space(model: Any, train_df: pd.DataFrame) -> np.ndarray:
+    """Movie ids the model ranks, in the column order of its score matrix"""
+    item_ids = getattr(model, "item_ids", None)
+    if item_ids is None:
+        item_ids = np.unique(train_df["movie_id"].to_numpy())
+    return np.asarray(item_ids, dtype=np.int64)
+
+
+def _score_users(model: Any, user_ids: np.ndarray, item_ids: np.ndarray) -> np.ndarray:
+    """Score matrix for a batch of users, falling back to per-pair predictions"""
+    if hasattr(model, "score_users"):
+        return np.asarray(model.score_users(user_ids), dtype=np.float64)
+    return np.array(
+        [[model.predict_rating(u, i) for i in item_ids] for u in user_ids.tolist()],
+        dtype=np.float64
+    )
+
+
+def _predict(model: Any, user_ids: np.ndarray, movie_ids: np.ndarray) -> np.ndarray:
+    """Predicted ratings for aligned id arrays, falling back to per-pair predictions"""
+    if hasattr(model, "predict_batch"):
+        return np.asarray(model.predict_batch(user_ids, movie_ids), dtype=np.float64)
+    predict = getattr(model, "predict_rating", None) or model.predict
+    return np.array([predict(u, m) for u, m in zip(user_ids.tolist(), movie_ids.tolist())], dtype=np.float64)
+
+
+def _group_by_user(
+    df: pd.DataFrame,
+    user_ids: np.ndarray,
+    item_ids: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR-style (indptr, item columns) of df restricted to user_ids, plus per-user row counts"""
+    rows = index_lookup(user_ids, df["user_id"].to_numpy())
+    cols = index_lookup(item_ids, df["movie_id"].to_numpy())
+    counts = np.bincount(rows[rows >= 0], minlength=len(user_ids))
+
+    keep = (rows >= 0) & (cols >= 0)
+    rows, cols = rows[keep], cols[keep]
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=len(user_ids)))
+    return indptr, cols[order], counts
+
+
+def _batch_mask(indptr: np.ndarray, cols: np.ndarray, start: int, end: int, n_items: int) -> np.ndarray:
+    """Dense boolean (batch x items) mask for users start..end of a CSR grouping"""
+    mask = np.zeros((end - start, n_items), dtype=bool)
+    lengths = np.diff(indptr[start:end + 1])
+    rows = np.repeat(np.arange(end - start), lengths)
+    mask[rows, cols[indptr[start]:indptr[end]]] = True
+    return mask
+
+
+def evaluate_model(
+    name: str,
+    model: Any,
+    train_df: pd.DataFrame,
+    test_df: pd.DataFrame,
+    k: int = 10,
+    min_rating: Optional[float] = None,
+    batch_size: int = 512,
+    n_jobs: Optional[int] = None
+) -> EvaluationResult:
+    """Evaluate one model on every test user"""
+    started = time.perf_counter()
+    item_ids = _item_space(model, train_df)
+    column_order = np.argsort(item_ids, kind="stable")
+    sorted_items = item_ids[column_order]
+    n_items = len(sorted_items)
+
+    relevant_df = test_df if min_rating is None else test_df[test_df["rating"] >= min_rating]
+    user_ids = np.unique(relevant_df["user_id"].to_numpy())
+    train_indptr, train_cols, _ = _group_by_user(train_df, user_ids, sorted_items)
+    test_indptr, test_cols, n_relevant = _group_by_user(relevant_df, user_ids, sorted_items)
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = np.cumsum(discounts)
+
+    def evaluate_batch(start: int) -> Tuple[float, float, float, np.ndarray]:
+        end = min(start + batch_size, len(user_ids))
+        scores = _score_users(model, user_ids[start:end], item_ids)[:, column_order]
+        seen = _batch_mask(train_indptr, train_cols, start, end, n_items)
+        relevant = _batch_mask(test_indptr, test_cols, start, end, n_items)
+
+        ranked = top_k(scores, k, exclude=seen)
+        valid = ranked >= 0
+        hits = np.take_along_axis(relevant, np.maximum(ranked, 0), axis=1) & valid
+
+        n_hits = hits.sum(axis=1)
+        n_rel = n_relevant[start:end]
+        dcg = (hits * discounts[:hits.shape[1]]).sum(axis=1)
+        idcg = ideal[np.minimum(n_rel, k) - 1]
+        recommended = np.zeros(n_items, dtype=bool)
+        recommended[ranked[valid]] = True
+        return (
+            float((n_hits / k).sum()),
+            float((n_hits / n_rel).sum()),
+            float((dcg / idcg).sum()),
+            recommended
+        )
+
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+        partials = list(executor.map(evaluate_batch, range(0, len(user_ids), batch_size)))
+
+    n_users = len(user_ids)
+    recommended = np.zeros(n_items, dtype=bool)
+    for partial in partials:
+        recommended |= partial[3]
+
+    predictions = _predict(model, test_df["user_id"].to_numpy(), test_df["movie_id"].to_numpy())
+    errors = predictions - test_df["rating"].to_numpy(dtype=np.float64)
+
+    return EvaluationResult(
+        model=name,
+        k=k,
+        users=n_users,
+        precision=sum(p[0] for p in partials) / n_users if n_users else 0.0,
+        recall=sum(p[1] for p in partials) / n_users if n_users else 0.0,
+        ndcg=sum(p[2] for p in partials) / n_users if n_users else 0.0,
+        coverage=float(recommended.sum()) / n_items if n_items else 0.0,
+        rmse=float(np.sqrt(np.mean(errors ** 2))) if len(errors) else 0.0,
+        mae=float(np.mean(np.abs(errors))) if len(errors) else 0.0,
+        seconds=round(time.perf_counter() - started, 3)
+    )
+
+
+def compare_models(
+    models: Dict[str, Any],
+    train_df: pd.DataFrame,
+    test_df: pd.DataFrame,
+    **kwargs
+) -> List[EvaluationResult]:
+    """Evaluate several models on the same split"""
+    results = []
+    for name, model in models.items():
+        logger.info(f"Evaluating model: {name}")
+        results.append(evaluate_model(name, model, train_df, test_df, **kwargs))
+    return results
+
+
+def format_report(results: List[EvaluationResult]) -> str:
+    """Render results as a fixed-width comparison table"""
+    if not results:
+        return "No models evaluated"
+    k = results[0].k
+    header = ["model", f"P@{k}", f"R@{k}", f"NDCG@{k}", "coverage", "RMSE", "MAE", "users", "seconds"]
+    rows = [
+        [r.model, f"{r.precision:.4f}", f"{r.recall:.4f}", f"{r.ndcg:.4f}", f"{r.coverage:.4f}",
+         f"{r.rmse:.4f}", f"{r.mae:.4f}", str(r.users), f"{r.seconds:.2f}"]
+        for r in results
+    ]
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+def check_requirements(results: List[EvaluationResult], requirements: List[str]) -> List[str]:
+    """Return a failure message for every METRIC=VALUE requirement a model misses
+
+    Error metrics (rmse, mae) must be at most VALUE, ranking metrics at least VALUE.
+    """
+    failures = []
+    for requirement in requirements:
+        metric, _, value = requirement.partition("=")
+        if metric not in METRICS or not value:
+            raise ValueError(f"Invalid requirement '{requirement}', expected METRIC=VALUE with METRIC in {METRICS}")
+        threshold = float(value)
+        for result in results:
+            actual = getattr(result, metric)
+            passed = actual <= threshold if metric in ("rmse", "mae") else actual >= threshold
+            if not passed:
+                failures.append(f"{result.model}: {metric}={actual:.4f} does not meet {threshold}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate recommendation models on a held-out split")
+    parser.add_argument("--ratings", required=True, help="MovieLens u.data ratings file")
+    parser.add_argument("--models-path", default="ml_models", help="Directory containing *_model.pkl files")
+    parser.add_argument("--models", nargs="*", help="Model names to evaluate (default: all loaded)")
+    parser.add_argument("--k", type=int, default=10, help="Cut-off for ranking metrics")
+    parser.add_argument("--min-rating", type=float, help="Only count test ratings >= this as relevant")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Test split fraction")
+    parser.add_argument("--seed", type=int, default=42, help="Split random state (42 matches the notebook)")
+    parser.add_argument("--batch-size", type=int, default=512, help="Users scored per batch")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker threads (default: CPU count)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--require", action="append", default=[], metavar="METRIC=VALUE",
+                        help="Exit non-zero if any model misses this threshold")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    models = load_models(args.models_path)
+    if args.models:
+        missing = set(args.models) - set(models)
+        if missing:
+            parser.error(f"Models not found in {args.models_path}: {sorted(missing)}")
+        models = {name: models[name] for name in args.models}
+    if not models:
+        parser.error(f"No models found in {args.models_path}")
+
+    train_df, test_df = split_ratings(load_ratings(args.ratings), args.test_size, args.seed)
+    results = compare_models(
+        models, train_df, test_df,
+        k=args.k,
+        min_rating=args.min_rating,
+        batch_size=args.batch_size,
+        n_jobs=args.jobs
+    )
+
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([r.model_dump() for r in results], f, indent=2)
+
+    failures = check_requirements(results, args.require)
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, Optional
+import hashlib
+import pickle
+import logging
+import os
+from app.ml import recommenders
+from app.ml.pipeline import build_hybrid_pipeline
+from app.ml.quantization import quantize_models
+
+logger = logging.getLogger(__name__)
+
+# Model files produced by the notebook's save_models() and app.ml.als, keyed by model name
+MODEL_FILES = [
+    "popularity_model.pkl",
+    "user_cf_model.pkl",
+    "item_cf_model.pkl",
+    "svd_model.pkl",
+    "content_model.pkl",
+    "hybrid_model.pkl",
+    "als_model.pkl"
+]
+# Built by app.ml.text_index; not a pickle, but part of the serving version
+TEXT_INDEX_FILE = "text_index.npz"
+
+
+class ModelUnpickler(pickle.Unpickler):
+    """Unpickler that resolves notebook classes pickled from __main__"""
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == "__main__":
+            if not hasattr(recommenders, name):
+                raise pickle.UnpicklingError(f"No serving implementation for notebook class {name}")
+            return getattr(recommenders, name)
+        return super().find_class(module, name)
+
+
+def load_model(path: str) -> Any:
+    """Load a pickled model file"""
+    with open(path, "rb") as f:
+        return ModelUnpickler(f).load()
+
+
+def load_models(models_path: str, model_files: Iterable[str] = MODEL_FILES) -> Dict[str, Any]:
+    """Load every available model file from a directory, keyed by model name"""
+    models = {}
+    if not os.path.isdir(models_path):
+        logger.warning(f"Models directory not found: {models_path}")
+        return models
+
+    for model_file in model_files:
+        model_path = os.path.join(models_path, model_file)
+        if not os.path.exists(model_path):
+            continue
+        try:
+            model_name = model_file.replace("_model.pkl", "")
+            models[model_name] = load_model(model_path)
+            logger.info(f"Loaded model: {model_name}")
+        except Exception as e:
+            logger.error(f"Error loading model {model_file}: {e}")
+
+    return models
+
+
+def model_version(models_path: str, model_files: Iterable[str] = (*MODEL_FILES, TEXT_INDEX_FILE)) -> str:
+    """Short fingerprint of the model files on disk (name, size, mtime)"""
+    digest = hashlib.sha1()
+    for model_file in model_files:
+        model_path = os.path.join(models_path, model_file)
+        if os.path.exists(model_path):
+            stat = os.stat(model_path)
+            digest.update(f"{model_file}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+def load_serving_models(
+    models_path: str,
+    hybrid_weights: Optional[Dict[str, float]] = None,
+    candidates_per_source: int = 200,
+    precision: str = "float64"
+) -> Dict[str, Any]:
+    """Load models and add the names the API serves (hybrid pipeline, collaborative)
+
+    With a precision other than float64, factor and profile matrices are
+    quantized after the pipeline's candidate indexes are built from them.
+    """
+    models = load_models(models_path)
+
+    # Hybrid is served by the two-stage pipeline unless a pickled hybrid exists
+    if "hybrid" not in models:
+        pipeline = build_hybrid_pipeline(models, hybrid_weights, candidates_per_source)
+        if pipeline is not None:
+            models["hybrid"] = pipeline
+
+    # "collaborative" is the public name of the SVD model
+    if "svd" in models:
+        models.setdefault("collaborative", models["svd"])
+
+    return quantize_models(models, precision)
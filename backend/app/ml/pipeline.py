@@ -0,0 +1,262 @@
+"""Two-stage hybrid recommendation: candidate generation, then re-ranking
+
+Cheap generators each propose a few hundred movie ids; ``HybridBlender`` scores
+only their union with the SVD and content models in one vectorized pass.
+``RecommendationPipeline`` exposes the same ``recommend`` interface as the
+single models so the service can treat it as the ``hybrid`` model.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+from app.ml.ranking import top_k, index_lookup, exclusion_mask
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateGenerator:
+    """Base class for first-stage candidate sources"""
+
+    name = "base"
+
+    def generate(self, user_id: int, history: Sequence[int], n: int) -> np.ndarray:
+        """Return up to n candidate movie ids for a user"""
+        raise NotImplementedError
+
+
+class PopularityCandidates(CandidateGenerator):
+    """Globally most popular movies, precomputed once"""
+
+    name = "popularity"
+
+    def __init__(self, popularity_model):
+        order = np.argsort(-popularity_model._item_scores, kind="stable")
+        self.ranked_ids = popularity_model.item_ids[order]
+
+    def generate(self, user_id: int, history: Sequence[int], n: int) -> np.ndarray:
+        return self.ranked_ids[:n]
+
+
+class ItemNeighbourCandidates(CandidateGenerator):
+    """Nearest neighbours (cosine over item factors) of the movies a user rated"""
+
+    name = "item_neighbours"
+
+    def __init__(self, item_ids: np.ndarray, item_factors: np.ndarray, n_neighbours: int = 20, block_size: int = 1024):
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        norms = np.linalg.norm(item_factors, axis=1, keepdims=True)
+        normalized = np.divide(item_factors, norms, out=np.zeros_like(item_factors), where=norms > 0)
+
+        n_items = len(self.item_ids)
+        self.neighbours = np.empty((n_items, min(n_neighbours, n_items - 1)), dtype=np.int64)
+        for start in range(0, n_items, block_size):
+            end = min(start + block_size, n_items)
+            similarity = normalized[start:end] @ normalized.T
+            self_mask = np.zeros_like(similarity, dtype=bool)
+            self_mask[np.arange(end - start), np.arange(start, end)] = True
+            self.neighbours[start:end] = top_k(similarity, self.neighbours.shape[1], exclude=self_mask)
+
+    def generate(self, user_id: int, history: Sequence[int], n: int) -> np.ndarray:
+        positions = index_lookup(self.item_ids, np.asarray(history[:50], dtype=np.int64))
+        positions = positions[positions >= 0]
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        neighbours, counts = np.unique(self.neighbours[positions].ravel(), return_counts=True)
+        order = np.argsort(-counts, kind="stable")[:n]
+        return self.item_ids[neighbours[order]]
+
+
+class FactorANNCandidates(CandidateGenerator):
+    """Approximate maximum inner product search over SVD item factors
+
+    An inverted-file index: items are clustered with k-means and a query only
+    scores the items in the ``n_probe`` clusters whose centroids match best.
+    Only the centroids and inverted lists are kept; probed items are scored
+    from the model's own ``item_factors``, so a quantized model is not
+    shadowed by a full-precision copy here.
+    """
+
+    name = "factor_ann"
+
+    def __init__(self, svd_model, n_lists: Optional[int] = None, n_probe: int = 4, n_iter: int = 10, seed: int = 42):
+        self.svd_model = svd_model
+        self.item_ids = np.asarray(svd_model.item_ids, dtype=np.int64)
+        self.item_bias = np.asarray(svd_model.item_bias, dtype=np.float64)
+        self.n_probe = n_probe
+
+        # Dense factors for clustering only (dequantized if the model already is)
+        factors = np.asarray(svd_model.item_factors[:], dtype=np.float64)
+        n_items = len(self.item_ids)
+        n_lists = n_lists or max(1, int(np.sqrt(n_items)))
+        rng = np.random.default_rng(seed)
+        centroids = factors[rng.choice(n_items, size=min(n_lists, n_items), replace=False)]
+        for _ in range(n_iter):
+            assignment = self._assign(factors, centroids)
+            for c in range(len(centroids)):
+                members = factors[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        self.centroids = centroids
+
+        assignment = self._assign(factors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.list_items = order
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+
+    @staticmethod
+    def _assign(factors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (
+            (factors ** 2).sum(axis=1)[:, np.newaxis]
+            - 2 * factors @ centroids.T
+            + (centroids ** 2).sum(axis=1)[np.newaxis, :]
+        )
+        return np.argmin(distances, axis=1)
+
+    def generate(self, user_id: int, history: Sequence[int], n: int) -> np.ndarray:
+        user_idx = self.svd_model.user_index([user_id])[0]
+        if user_idx < 0:
+            return np.empty(0, dtype=np.int64)
+        query = self.svd_model.user_factors[user_idx]
+
+        probes = top_k(self.centroids @ query, self.n_probe)
+        items = np.concatenate([
+            self.list_items[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes
+        ])
+        # Only the probed rows are read (and dequantized)
+        scores = self.item_bias[items] + self.svd_model.item_factors[items] @ query
+        return self.item_ids[items[top_k(scores, n)]]
+
+
+class GenreCandidates(CandidateGenerator):
+    """Popular movies from posting lists of the user's favourite genres"""
+
+    name = "genre"
+
+    def __init__(self, content_model, popularity_model=None, n_genres: int = 3):
+        self.content_model = content_model
+        self.n_genres = n_genres
+        item_ids = content_model.item_ids
+        features = content_model.item_features.loc[item_ids].to_numpy() > 0
+
+        if popularity_model is not None:
+            popularity = popularity_model.predict_batch(np.zeros(len(item_ids)), item_ids)
+        else:
+            popularity = np.zeros(len(item_ids))
+        order = np.argsort(-popularity, kind="stable")
+        # One posting list per genre, each sorted by popularity
+        self.postings = [item_ids[order][features[order, g]] for g in range(features.shape[1])]
+
+    def generate(self, user_id: int, history: Sequence[int], n: int) -> np.ndarray:
+        profile = self.content_model.user_profile(user_id)
+        if profile is None or not np.any(profile):
+            return np.empty(0, dtype=np.int64)
+        genres = top_k(np.asarray(profile, dtype=np.float64), self.n_genres)
+        per_genre = max(1, n // len(genres))
+        return np.concatenate([self.postings[g][:per_genre] for g in genres])
+
+
+class HybridBlender:
+    """Second stage: weighted blend of SVD and content predictions over candidates"""
+
+    def __init__(self, svd_model, content_model, weights: Optional[Dict[str, float]] = None):
+        self.svd_model = svd_model
+        self.content_model = content_model
+        weights = weights or {"svd": 0.7, "content": 0.3}
+        total = sum(weights.values()) or 1.0
+        self.weights = {name: weight / total for name, weight in weights.items()}
+
+    def score_pairs(self, user_ids, movie_ids) -> np.ndarray:
+        """Blended predicted ratings for aligned user/movie id arrays"""
+        return (
+            self.weights.get("svd", 0.0) * self.svd_model.predict_batch(user_ids, movie_ids)
+            + self.weights.get("content", 0.0) * self.content_model.predict_batch(user_ids, movie_ids)
+        )
+
+    def score(self, user_id: int, candidates: np.ndarray) -> np.ndarray:
+        """Blended predicted ratings for one user's candidate movie ids"""
+        return self.score_pairs(np.full(len(candidates), user_id, dtype=np.int64), candidates)
+
+
+class RecommendationPipeline:
+    """Candidate generators followed by a blender, behaving like a model"""
+
+    def __init__(self, generators: List[CandidateGenerator], blender: HybridBlender, candidates_per_source: int = 200):
+        self.generators = generators
+        self.blender = blender
+        self.candidates_per_source = candidates_per_source
+
+    @property
+    def item_ids(self) -> np.ndarray:
+        return np.asarray(self.blender.svd_model.item_ids, dtype=np.int64)
+
+    def candidates(self, user_id: int, history: Sequence[int] = (), extra: Sequence[int] = ()) -> np.ndarray:
+        """Union of every generator's candidates and any supplied by the caller"""
+        sources = [g.generate(user_id, history, self.candidates_per_source) for g in self.generators]
+        if len(extra):
+            sources.append(np.asarray(extra, dtype=np.int64))
+        return np.unique(np.concatenate(sources)) if sources else np.empty(0, dtype=np.int64)
+
+    def predict_rating(self, user_id, movie_id) -> float:
+        return float(self.blender.score(user_id, np.array([movie_id], dtype=np.int64))[0])
+
+    def predict_batch(self, user_ids, movie_ids) -> np.ndarray:
+        return self.blender.score_pairs(np.asarray(user_ids), np.asarray(movie_ids))
+
+    def score_users(self, user_ids) -> np.ndarray:
+        """Blended scores over item_ids, -inf outside each user's candidate set
+
+        Used by offline evaluation; no rating history is available here, so
+        history-based generators contribute nothing.
+        """
+        item_ids = self.item_ids
+        scores = np.full((len(user_ids), len(item_ids)), -np.inf)
+        for row, user_id in enumerate(np.asarray(user_ids).tolist()):
+            positions = index_lookup(item_ids, self.candidates(user_id))
+            positions = positions[positions >= 0]
+            scores[row, positions] = self.blender.score(user_id, item_ids[positions])
+        return scores
+
+    def recommend(
+        self,
+        user_id,
+        n_recommendations=10,
+        exclude_seen=None,
+        history: Sequence[int] = (),
+        extra_candidates: Sequence[int] = ()
+    ) -> List[Tuple[int, float]]:
+        """Get top-N hybrid recommendations from the candidate set
+
+        `extra_candidates` come from live sources held by the caller (such as
+        trending movies), which scoring worker processes cannot see.
+        """
+        candidates = self.candidates(user_id, history, extra_candidates)
+        if len(candidates) == 0:
+            return []
+        scores = self.blender.score(user_id, candidates)
+        indices = top_k(scores, n_recommendations, exclusion_mask(candidates, exclude_seen))
+        return [(int(candidates[i]), float(scores[i])) for i in indices]
+
+
+def build_hybrid_pipeline(
+    models: Dict[str, object],
+    weights: Optional[Dict[str, float]] = None,
+    candidates_per_source: int = 200
+) -> Optional[RecommendationPipeline]:
+    """Assemble the hybrid pipeline from loaded svd, content and popularity models"""
+    svd_model = models.get("svd")
+    content_model = models.get("content")
+    popularity_model = models.get("popularity")
+    if svd_model is None or content_model is None:
+        logger.warning("Hybrid pipeline needs both svd and content models")
+        return None
+
+    generators: List[CandidateGenerator] = [
+        ItemNeighbourCandidates(svd_model.item_ids, svd_model.item_factors),
+        FactorANNCandidates(svd_model),
+        GenreCandidates(content_model, popularity_model)
+    ]
+    if popularity_model is not None:
+        generators.insert(0, PopularityCandidates(popularity_model))
+
+    pipeline = RecommendationPipeline(generators, HybridBlender(svd_model, content_model, weights), candidates_per_source)
+    logger.info(f"Built hybrid pipeline with generators: {[g.name for g in generators]}")
+    return pipeline
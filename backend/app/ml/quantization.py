@@ -0,0 +1,197 @@
+"""Reduced-precision storage for factor and profile matrices
+
+Serving keeps SVD and ALS factors and content profiles in every worker, and
+their size grows as users x factors x 8 bytes. ``QuantizedMatrix`` stores
+them as float16 (a quarter of float64) or as int8 codes with one float32
+scale per row (about an eighth). The int8 scale is max |value| / 127, so each
+row keeps its own dynamic range.
+
+Scoring never builds a full-precision copy. ``queries @ matrix.T`` runs over
+blocks of rows, each cast to float32 just before its BLAS product. int8
+scales are applied to the block's scores rather than to the codes:
+s_j * (q . c_j) == q . (s_j * c_j). Row lookups dequantize only the rows
+asked for.
+
+``main`` reports what each precision costs in held-out RMSE and ranking
+metrics:
+    python -m app.ml.quantization --ratings path/to/u.data --models-path ml_models
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import logging
+import sys
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("float64", "float16", "int8")
+# Rows cast to float32 per product; 4096 x 64 float32 is 1 MiB
+BLOCK_ROWS = 4096
+
+
+class QuantizedMatrix:
+    """Row-major matrix stored as float16, or as int8 codes with per-row scales"""
+
+    def __init__(self, values: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.values = values
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, precision: str) -> "QuantizedMatrix":
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if precision == "float16":
+            return cls(matrix.astype(np.float16))
+        if precision == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127 if matrix.size else np.zeros(len(matrix))
+            codes = np.divide(matrix, scales[:, np.newaxis], out=np.zeros_like(matrix), where=scales[:, np.newaxis] > 0)
+            return cls(np.round(codes).astype(np.int8), scales.astype(np.float32))
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS[1:]}")
+
+    @property
+    def precision(self) -> str:
+        return "int8" if self.scales is not None else "float16"
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, rows) -> np.ndarray:
+        """Dequantized float32 rows"""
+        values = self.values[rows].astype(np.float32)
+        if self.scales is not None:
+            values *= np.asarray(self.scales[rows])[..., np.newaxis]
+        return values
+
+    def dot_t(self, queries: np.ndarray) -> np.ndarray:
+        """queries @ matrix.T as float32, one block of rows at a time"""
+        queries = np.asarray(queries, dtype=np.float32)
+        n_rows = len(self.values)
+        scores = np.empty((queries.shape[0], n_rows), dtype=np.float32)
+        for start in range(0, n_rows, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, n_rows)
+            np.matmul(queries, self.values[start:end].astype(np.float32).T, out=scores[:, start:end])
+            if self.scales is not None:
+                scores[:, start:end] *= self.scales[start:end]
+        return scores
+
+
+def matmul_t(queries: np.ndarray, matrix) -> np.ndarray:
+    """queries @ matrix.T for a NumPy or quantized matrix"""
+    if isinstance(matrix, np.ndarray):
+        return queries @ matrix.T
+    return matrix.dot_t(queries)
+
+
+def model_nbytes(model: Any) -> int:
+    """Bytes held by a model's factor and profile matrices"""
+    if hasattr(model, "collaborative_model"):
+        return model_nbytes(model.collaborative_model) + model_nbytes(model.content_model)
+    total = 0
+    for name in ("user_factors", "item_factors"):
+        total += getattr(getattr(model, name, None), "nbytes", 0)
+    if hasattr(model, "user_profiles"):
+        total += sum(np.asarray(profile).nbytes for profile in model.user_profiles.values())
+        for name in ("_profile_matrix", "_item_matrix"):
+            total += getattr(model.__dict__.get(name), "nbytes", 0)
+    return total
+
+
+def quantize_model(model: Any, precision: str) -> Any:
+    """Replace a model's factor or profile matrices with quantized ones, in place"""
+    if precision == "float64":
+        return model
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+
+    if hasattr(model, "collaborative_model"):
+        quantize_model(model.collaborative_model, precision)
+        quantize_model(model.content_model, precision)
+    elif hasattr(model, "user_profiles"):
+        # Everything derived from full-precision profiles is computed first
+        for name in ("_profile_ids", "_profile_defined", "_item_defined"):
+            getattr(model, name)
+        for name in ("_profile_matrix", "_item_matrix"):
+            matrix = getattr(model, name)
+            if isinstance(matrix, np.ndarray):
+                model.__dict__[name] = QuantizedMatrix.quantize(matrix, precision)
+        # Profiles are served from the quantized matrix from here on
+        model.user_profiles = {}
+    else:
+        for name in ("user_factors", "item_factors"):
+            matrix = getattr(model, name, None)
+            if isinstance(matrix, np.ndarray) and matrix.ndim == 2:
+                setattr(model, name, QuantizedMatrix.quantize(matrix, precision))
+    return model
+
+
+def quantize_models(models: Dict[str, Any], precision: str) -> Dict[str, Any]:
+    """Quantize every model once (models shared under several names included)"""
+    if precision == "float64":
+        return models
+    done = set()
+    for name, model in models.items():
+        if id(model) in done:
+            continue
+        done.add(id(model))
+        before = model_nbytes(model)
+        quantize_model(model, precision)
+        if before:
+            logger.info(f"Quantized {name} to {precision}: {before / 2 ** 20:.1f} MiB -> {model_nbytes(model) / 2 ** 20:.1f} MiB")
+    return models
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.ml.datasets import load_ratings, split_ratings
+    from app.ml.evaluation import compare_models
+    from app.ml.model_store import load_models
+
+    parser = argparse.ArgumentParser(description="Compare held-out accuracy and memory of models at each precision")
+    parser.add_argument("--ratings", required=True, help="MovieLens u.data ratings file")
+    parser.add_argument("--models-path", default="ml_models", help="Directory with pickled models")
+    parser.add_argument("--models", nargs="*", help="Model names to compare (default: all with matrices)")
+    parser.add_argument("--precisions", nargs="*", default=list(PRECISIONS), choices=PRECISIONS)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    train_df, test_df = split_ratings(load_ratings(args.ratings), args.test_size, args.seed)
+    rows = []
+    baseline: Dict[str, Any] = {}
+    for precision in args.precisions:
+        # Fresh copies, since quantization replaces matrices in place
+        models = {name: model for name, model in load_models(args.models_path).items() if model_nbytes(model)}
+        if args.models:
+            models = {name: model for name, model in models.items() if name in args.models}
+        if not models:
+            parser.error(f"No models with factor or profile matrices found in {args.models_path}")
+        quantize_models(models, precision)
+        for result in compare_models(models, train_df, test_df, k=args.k):
+            base = baseline.setdefault(result.model, result)
+            rows.append([
+                result.model, precision, f"{model_nbytes(models[result.model]) / 2 ** 20:.2f}",
+                f"{result.rmse:.4f}", f"{result.rmse - base.rmse:+.4f}",
+                f"{result.recall:.4f}", f"{result.recall - base.recall:+.4f}",
+                f"{result.ndcg:.4f}", f"{result.ndcg - base.ndcg:+.4f}"
+            ])
+
+    k = args.k
+    header = ["model", "precision", "MiB", "RMSE", "dRMSE", f"R@{k}", f"dR@{k}", f"NDCG@{k}", f"dNDCG@{k}"]
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    print("\n".join(lines))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
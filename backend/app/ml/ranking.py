@@ -0,0 +1,71 @@
+from typing import Optional
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return column indices of the k highest scores per row, best first
+
+    Works on a single score vector or a (users x items) score matrix. `exclude`
+    is a boolean mask of the same shape; masked entries are never returned.
+    Matrix rows that run out of unmasked items are padded with -1.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    single = scores.ndim == 1
+    if single:
+        scores = scores[np.newaxis, :]
+        if exclude is not None:
+            exclude = np.asarray(exclude)[np.newaxis, :]
+
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+
+    n_items = scores.shape[1]
+    k = min(k, n_items)
+    if k <= 0:
+        result = np.empty((scores.shape[0], 0), dtype=np.int64)
+        return result[0] if single else result
+
+    if k < n_items:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(n_items), (scores.shape[0], 1))
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    result = np.take_along_axis(candidates, order, axis=1)
+
+    if exclude is not None:
+        # Drop excluded entries that only made it in because a row ran out of items
+        valid = np.isfinite(np.take_along_axis(scores, result, axis=1))
+        if single:
+            return result[0][valid[0]]
+        result = np.where(valid, result, -1)
+
+    return result[0] if single else result
+
+
+def index_lookup(sorted_ids: np.ndarray, query_ids) -> np.ndarray:
+    """Map ids to their positions in a sorted id array, -1 where absent"""
+    query_ids = np.asarray(query_ids)
+    if len(sorted_ids) == 0:
+        return np.full(query_ids.shape, -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_ids, query_ids)
+    positions = np.clip(positions, 0, len(sorted_ids) - 1)
+    found = sorted_ids[positions] == query_ids
+    return np.where(found, positions, -1).astype(np.int64)
+
+
+def exclusion_mask(item_ids: np.ndarray, exclude_seen=None) -> Optional[np.ndarray]:
+    """Boolean mask of item_ids to exclude, or None when nothing is excluded
+
+    `exclude_seen` may be any object with a vectorized ``mask(item_ids)`` (such
+    as a per-user seen set) or a plain iterable of movie ids.
+    """
+    if exclude_seen is None:
+        return None
+    if hasattr(exclude_seen, "mask"):
+        return exclude_seen.mask(item_ids)
+    seen = np.fromiter(exclude_seen, dtype=np.int64)
+    if len(seen) == 0:
+        return None
+    return np.isin(item_ids, seen)
@@ -0,0 +1,263 @@
+"""Serving-side counterparts of the recommenders trained in ml/mv-rs.ipynb
+
+The notebook pickles its models as ``__main__.<ClassName>``. The classes below
+keep the same names and instance attributes so those pickles load unchanged
+(see ``app.ml.model_store``), and add batched scoring on top of the original
+per-pair ``predict_rating``:
+
+- ``item_ids``: movie ids of the columns returned by ``score_users``
+- ``score_users(user_ids)``: (users x items) matrix of predicted ratings
+- ``predict_batch(user_ids, movie_ids)``: predictions for aligned id pairs
+"""
+from typing import List, Optional, Tuple
+from functools import cached_property
+import numpy as np
+from app.ml.ranking import top_k, index_lookup, exclusion_mask
+from app.ml.quantization import matmul_t
+
+
+def _recommend_from_scores(
+    item_ids: np.ndarray,
+    scores: np.ndarray,
+    n_recommendations: int,
+    exclude_seen=None
+) -> List[Tuple[int, float]]:
+    """Turn one row of scores into (movie_id, score) pairs"""
+    indices = top_k(scores, n_recommendations, exclusion_mask(item_ids, exclude_seen))
+    return [(int(item_ids[i]), float(scores[i])) for i in indices]
+
+
+class PopularityRecommender:
+    """Bayesian-average popularity model"""
+
+    def __init__(self):
+        self.movie_scores = {}
+        self.global_mean = 0
+
+    @cached_property
+    def item_ids(self) -> np.ndarray:
+        return np.array(sorted(self.movie_scores), dtype=np.int64)
+
+    @cached_property
+    def _item_scores(self) -> np.ndarray:
+        return np.array([self.movie_scores[i] for i in self.item_ids], dtype=np.float64)
+
+    def predict_rating(self, user_id, movie_id) -> float:
+        """Predict rating as the movie's popularity score"""
+        return float(self.movie_scores.get(movie_id, self.global_mean))
+
+    def predict_batch(self, user_ids, movie_ids) -> np.ndarray:
+        """Predict ratings for aligned user/movie id arrays"""
+        positions = index_lookup(self.item_ids, movie_ids)
+        return np.where(positions >= 0, self._item_scores[positions], self.global_mean)
+
+    def score_users(self, user_ids) -> np.ndarray:
+        """Score every item for each user (identical rows)"""
+        return np.broadcast_to(self._item_scores, (len(user_ids), len(self.item_ids)))
+
+    def recommend(self, user_id=None, n_recommendations=10, exclude_seen=None):
+        """Get top-N popular movies"""
+        return _recommend_from_scores(self.item_ids, self._item_scores, n_recommendations, exclude_seen)
+
+
+class MatrixFactorizationSVD:
+    """Biased matrix factorization model trained with SGD"""
+
+    def __init__(self, n_factors=50, learning_rate=0.01, regularization=0.1, n_epochs=100):
+        self.n_factors = n_factors
+        self.learning_rate = learning_rate
+        self.regularization = regularization
+        self.n_epochs = n_epochs
+        self.user_factors = None
+        self.item_factors = None
+        self.user_bias = None
+        self.item_bias = None
+        self.global_mean = 0
+
+    @cached_property
+    def _user_ids(self) -> np.ndarray:
+        return np.asarray(self.user_ids, dtype=np.int64)
+
+    @cached_property
+    def _item_ids(self) -> np.ndarray:
+        return np.asarray(self.item_ids, dtype=np.int64)
+
+    def user_index(self, user_ids) -> np.ndarray:
+        """Map user ids to factor rows, -1 for unknown users"""
+        return index_lookup(self._user_ids, user_ids)
+
+    def predict_rating(self, user_id, item_id) -> float:
+        """Predict rating for a user-item pair"""
+        if user_id not in self.user_id_to_idx or item_id not in self.item_id_to_idx:
+            return self.global_mean
+
+        user_idx = self.user_id_to_idx[user_id]
+        item_idx = self.item_id_to_idx[item_id]
+
+        prediction = self.global_mean + self.user_bias[user_idx] + self.item_bias[item_idx]
+        prediction += np.dot(self.user_factors[user_idx], self.item_factors[item_idx])
+
+        return min(5, max(1, prediction))
+
+    def predict_batch(self, user_ids, movie_ids) -> np.ndarray:
+        """Predict ratings for aligned user/movie id arrays"""
+        users = self.user_index(user_ids)
+        items = index_lookup(self._item_ids, movie_ids)
+        known = (users >= 0) & (items >= 0)
+
+        predictions = np.full(len(users), float(self.global_mean))
+        u, i = users[known], items[known]
+        predictions[known] = np.clip(
+            self.global_mean + self.user_bias[u] + self.item_bias[i]
+            + np.einsum("ij,ij->i", self.user_factors[u], self.item_factors[i]),
+            1, 5
+        )
+        return predictions
+
+    def score_users(self, user_ids) -> np.ndarray:
+        """Score every item for each user; unknown users get the global mean"""
+        users = self.user_index(user_ids)
+        known = users >= 0
+        scores = np.full((len(users), len(self._item_ids)), float(self.global_mean))
+        u = users[known]
+        scores[known] = np.clip(
+            self.global_mean + self.user_bias[u][:, np.newaxis] + self.item_bias[np.newaxis, :]
+            + matmul_t(self.user_factors[u], self.item_factors),
+            1, 5
+        )
+        return scores
+
+    def recommend(self, user_id, n_recommendations=10, exclude_seen=None):
+        """Get top-N recommendations for a user"""
+        if user_id not in self.user_id_to_idx:
+            return []
+        scores = self.score_users([user_id])[0]
+        return _recommend_from_scores(self._item_ids, scores, n_recommendations, exclude_seen)
+
+
+class ContentBasedRecommender:
+    """Genre-profile content-based model"""
+
+    def __init__(self):
+        self.user_profiles = {}
+        self.item_features = None
+        self.genre_columns = None
+
+    @cached_property
+    def item_ids(self) -> np.ndarray:
+        return np.sort(self.item_features.index.to_numpy(dtype=np.int64))
+
+    @cached_property
+    def _item_matrix(self) -> np.ndarray:
+        """Item features in item_ids order, L2-normalized (zero rows stay zero)"""
+        features = self.item_features.loc[self.item_ids].to_numpy(dtype=np.float64)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        return np.divide(features, norms, out=np.zeros_like(features), where=norms > 0)
+
+    @cached_property
+    def _profile_ids(self) -> np.ndarray:
+        return np.array(sorted(self.user_profiles), dtype=np.int64)
+
+    @cached_property
+    def _profile_matrix(self) -> np.ndarray:
+        """User profiles in _profile_ids order, L2-normalized (zero rows stay zero)"""
+        n_genres = self._item_matrix.shape[1]
+        profiles = np.array(
+            [self.user_profiles[u] for u in self._profile_ids], dtype=np.float64
+        ).reshape(-1, n_genres)
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        return np.divide(profiles, norms, out=np.zeros_like(profiles), where=norms > 0)
+
+    @cached_property
+    def _profile_defined(self) -> np.ndarray:
+        return self._profile_matrix.any(axis=1)
+
+    @cached_property
+    def _item_defined(self) -> np.ndarray:
+        return self._item_matrix.any(axis=1)
+
+    def user_profile(self, user_id) -> Optional[np.ndarray]:
+        """A user's normalized genre profile, or None for unknown users"""
+        user = index_lookup(self._profile_ids, [user_id])[0]
+        return self._profile_matrix[user] if user >= 0 else None
+
+    def predict_rating(self, user_id, movie_id) -> float:
+        """Predict rating based on content similarity"""
+        return float(self.predict_batch([user_id], [movie_id])[0])
+
+    def _similarities(self, users: np.ndarray, items: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of profile rows to item rows; zero-norm pairs map to 0"""
+        profiles = self._profile_matrix[np.maximum(users, 0)]
+        profiles[users < 0] = 0
+        if items is None:
+            return matmul_t(profiles, self._item_matrix)
+        features = self._item_matrix[np.maximum(items, 0)]
+        features[items < 0] = 0
+        return np.einsum("ij,ij->i", profiles, features)
+
+    def _to_ratings(self, similarity: np.ndarray, defined: np.ndarray) -> np.ndarray:
+        return np.where(defined, np.clip(3.0 + 2.0 * similarity, 1, 5), 3.0)
+
+    def predict_batch(self, user_ids, movie_ids) -> np.ndarray:
+        """Predict ratings for aligned user/movie id arrays"""
+        users = index_lookup(self._profile_ids, user_ids)
+        items = index_lookup(self.item_ids, movie_ids)
+        similarity = self._similarities(users, items)
+        defined = (users >= 0) & (items >= 0)
+        defined[defined] &= self._profile_defined[users[defined]]
+        defined[defined] &= self._item_defined[items[defined]]
+        return self._to_ratings(similarity, defined)
+
+    def score_users(self, user_ids) -> np.ndarray:
+        """Score every item for each user; unknown users get 3.0"""
+        users = index_lookup(self._profile_ids, user_ids)
+        similarity = self._similarities(users)
+        user_defined = (users >= 0) & self._profile_defined[np.maximum(users, 0)]
+        return self._to_ratings(similarity, user_defined[:, np.newaxis] & self._item_defined[np.newaxis, :])
+
+    def recommend(self, user_id, n_recommendations=10, exclude_seen=None):
+        """Get top-N content-based recommendations"""
+        if index_lookup(self._profile_ids, [user_id])[0] < 0:
+            return []
+        scores = self.score_users([user_id])[0]
+        return _recommend_from_scores(self.item_ids, scores, n_recommendations, exclude_seen)
+
+
+class HybridRecommender:
+    """Weighted blend of a collaborative and a content-based model"""
+
+    def __init__(self, collaborative_model, content_model, alpha=0.7):
+        self.collaborative_model = collaborative_model
+        self.content_model = content_model
+        self.alpha = alpha
+
+    @property
+    def item_ids(self) -> np.ndarray:
+        return np.asarray(self.collaborative_model.item_ids, dtype=np.int64)
+
+    def predict_rating(self, user_id, movie_id) -> float:
+        """Predict rating using weighted combination"""
+        cf_rating = self.collaborative_model.predict_rating(user_id, movie_id)
+        content_rating = self.content_model.predict_rating(user_id, movie_id)
+        hybrid_rating = self.alpha * cf_rating + (1 - self.alpha) * content_rating
+        return min(5, max(1, hybrid_rating))
+
+    def predict_batch(self, user_ids, movie_ids) -> np.ndarray:
+        """Predict ratings for aligned user/movie id arrays"""
+        cf = self.collaborative_model.predict_batch(user_ids, movie_ids)
+        content = self.content_model.predict_batch(user_ids, movie_ids)
+        return np.clip(self.alpha * cf + (1 - self.alpha) * content, 1, 5)
+
+    def score_users(self, user_ids) -> np.ndarray:
+        """Score the collaborative model's items for each user"""
+        cf = self.collaborative_model.score_users(user_ids)
+        content = self.content_model.score_users(user_ids)
+        positions = index_lookup(self.content_model.item_ids, self.item_ids)
+        aligned = np.where(positions >= 0, content[:, np.maximum(positions, 0)], 3.0)
+        return np.clip(self.alpha * cf + (1 - self.alpha) * aligned, 1, 5)
+
+    def recommend(self, user_id, n_recommendations=10, exclude_seen=None):
+        """Get hybrid recommendations"""
+        scores = self.score_users([user_id])[0]
+        return _recommend_from_scores(self.item_ids, scores, n_recommendations, exclude_seen)
+
@@ -0,0 +1,144 @@
+"""Run CPU-bound model calls off the asyncio event loop
+
+Vectorized models (anything with ``predict_batch``) spend their time in NumPy,
+which releases the GIL, so they run on a thread pool. Pure-Python models would
+hold the GIL, so they run on a process pool whose workers load their own copy
+of the models through a picklable loader.
+
+Each pool admits at most ``workers + queue_size`` calls. Further calls are
+rejected immediately with ``ScoringOverloaded`` instead of piling up, and a
+call that exceeds its timeout raises ``ScoringTimeout``. A timed-out call keeps
+its slot until the worker actually finishes, so admission reflects real load.
+"""
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Models loaded inside each process-pool worker
+_worker_models: Dict[str, Any] = {}
+
+
+class ScoringError(Exception):
+    """Base class for scoring executor failures"""
+
+
+class ScoringOverloaded(ScoringError):
+    """Raised when a pool's queue is full"""
+
+
+class ScoringTimeout(ScoringError):
+    """Raised when a call exceeds its timeout"""
+
+
+def _init_worker(loader: Callable[[], Dict[str, Any]]):
+    """Process-pool initializer: load models once per worker process"""
+    global _worker_models
+    _worker_models = loader()
+
+
+def _call_in_worker(model_name: str, method: str, args: tuple, kwargs: dict) -> Any:
+    return getattr(_worker_models[model_name], method)(*args, **kwargs)
+
+
+class _BoundedPool:
+    """An executor with a cap on running plus queued calls"""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], workers: int, queue_size: int):
+        self.name = name
+        self.factory = factory
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+        self.executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                raise ScoringOverloaded(f"{self.name} scoring pool is full ({self.capacity} calls)")
+            self.in_flight += 1
+        try:
+            if self.executor is None:
+                self.executor = self.factory()
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Optional[Future] = None):
+        with self._lock:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class ScoringExecutor:
+    """Thread/process pools for model recommend and predict calls"""
+
+    def __init__(
+        self,
+        models: Dict[str, Any],
+        loader: Optional[Callable[[], Dict[str, Any]]] = None,
+        thread_workers: int = 4,
+        process_workers: int = 2,
+        queue_size: int = 32,
+        timeout: float = 2.0
+    ):
+        self.models = models
+        self.timeout = timeout
+        self.threads = _BoundedPool(
+            "thread",
+            lambda: ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="scoring"),
+            thread_workers,
+            queue_size
+        )
+        # Without a loader the workers would have no models, so everything uses threads
+        self.processes = None
+        if loader is not None and process_workers > 0:
+            self.processes = _BoundedPool(
+                "process",
+                lambda: ProcessPoolExecutor(max_workers=process_workers, initializer=_init_worker, initargs=(loader,)),
+                process_workers,
+                queue_size
+            )
+
+    def _uses_processes(self, model: Any) -> bool:
+        return self.processes is not None and not hasattr(model, "predict_batch")
+
+    async def run(self, model_name: str, method: str, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Call model_name.method(*args, **kwargs) on the appropriate pool"""
+        model = self.models[model_name]
+        timeout = self.timeout if timeout is None else timeout
+        if timeout <= 0:
+            # A spent deadline budget; don't occupy a slot for a result nobody waits for
+            raise ScoringTimeout(f"{model_name}.{method} has no time left")
+        if self._uses_processes(model):
+            future = self.processes.submit(_call_in_worker, model_name, method, args, kwargs)
+        else:
+            future = self.threads.submit(lambda: getattr(model, method)(*args, **kwargs))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise ScoringTimeout(f"{model_name}.{method} exceeded {timeout}s")
+
+    def stats(self) -> Dict[str, int]:
+        """In-flight call counts per pool"""
+        return {
+            "thread": self.threads.in_flight,
+            "process": self.processes.in_flight if self.processes else 0
+        }
+
+    def shutdown(self):
+        """Stop both pools without waiting for running calls"""
+        self.threads.shutdown()
+        if self.processes is not None:
+            self.processes.shutdown()
@@ -0,0 +1,236 @@
+"""Sparse TF-IDF index over movie titles, genres and overviews
+
+Text is turned into hashed unigram and bigram counts, so the vocabulary is
+fixed and a movie added after the index was built can be vectorized the same
+way. Title terms count ``title_weight`` times. Counts are re-weighted with
+sublinear TF and the IDF learned when the index was built. Rows are
+L2-normalized, so a sparse dot product is a cosine similarity.
+
+The index also stores each movie's top-k neighbours. Similar-movie queries
+for indexed movies are then a lookup. A movie missing from the index (such as a
+new release with no ratings) needs one sparse matrix-vector product.
+
+Stored as a single .npz of CSR arrays. Build it from the movies collection:
+    python -m app.ml.text_index --output ml/saved_models/text_index.npz
+"""
+from typing import Iterable, List, Optional, Tuple
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from app.ml.model_store import TEXT_INDEX_FILE
+from app.ml.ranking import top_k, index_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def _vectorizer(n_features: int) -> HashingVectorizer:
+    return HashingVectorizer(
+        n_features=n_features,
+        ngram_range=(1, 2),
+        stop_words="english",
+        alternate_sign=False,
+        norm=None,
+        dtype=np.float32
+    )
+
+
+def _l2_normalize(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sp.csr_matrix(sp.diags(scale.astype(np.float32)) @ matrix)
+
+
+class TextSimilarityIndex:
+    """L2-normalized TF-IDF rows per movie with a precomputed neighbour table"""
+
+    def __init__(
+        self,
+        movie_ids: np.ndarray,
+        matrix: sp.csr_matrix,
+        idf: np.ndarray,
+        neighbours: np.ndarray,
+        neighbour_scores: np.ndarray,
+        title_weight: float = 2.0
+    ):
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.matrix = matrix
+        self.idf = idf
+        self.neighbours = neighbours
+        self.neighbour_scores = neighbour_scores
+        self.title_weight = title_weight
+        self.vectorizer = _vectorizer(matrix.shape[1])
+
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+
+    @staticmethod
+    def _counts(
+        vectorizer: HashingVectorizer,
+        titles: Iterable[str],
+        genres: Iterable[str],
+        overviews: Iterable[str],
+        title_weight: float
+    ) -> sp.csr_matrix:
+        counts = vectorizer.transform([t or "" for t in titles]) * title_weight
+        counts = counts + vectorizer.transform([g or "" for g in genres])
+        counts = counts + vectorizer.transform([o or "" for o in overviews])
+        return sp.csr_matrix(counts)
+
+    @staticmethod
+    def _weigh(counts: sp.csr_matrix, idf: np.ndarray) -> sp.csr_matrix:
+        weighted = counts.copy()
+        weighted.data = (1.0 + np.log(weighted.data)) * idf[weighted.indices]
+        return _l2_normalize(weighted)
+
+    @classmethod
+    def build(
+        cls,
+        movie_ids,
+        titles: List[str],
+        genres: List[str],
+        overviews: List[str],
+        n_neighbours: int = 50,
+        n_features: int = 2 ** 18,
+        title_weight: float = 2.0,
+        block_size: int = 512
+    ) -> "TextSimilarityIndex":
+        """Vectorize every movie, learn IDF and precompute each movie's top-k neighbours"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        order = np.argsort(movie_ids, kind="stable")
+        movie_ids = movie_ids[order]
+        titles, genres, overviews = ([values[i] for i in order] for values in (titles, genres, overviews))
+
+        counts = cls._counts(_vectorizer(n_features), titles, genres, overviews, title_weight)
+        document_frequency = np.bincount(counts.indices, minlength=n_features)
+        # Smoothed IDF; terms never seen get the largest weight
+        idf = (np.log((1 + len(movie_ids)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = cls._weigh(counts, idf)
+
+        n = len(movie_ids)
+        k = min(n_neighbours, max(n - 1, 0))
+        neighbours = np.full((n, k), -1, dtype=np.int32)
+        neighbour_scores = np.zeros((n, k), dtype=np.float32)
+        transposed = matrix.T.tocsc()
+        for start in range(0, n, block_size):
+            end = min(start + block_size, n)
+            similarity = (matrix[start:end] @ transposed).toarray()
+            similarity[np.arange(end - start), np.arange(start, end)] = -np.inf
+            similarity[similarity <= 0] = -np.inf
+            best = top_k(similarity, k)
+            scores = np.take_along_axis(similarity, best, axis=1)
+            valid = np.isfinite(scores)
+            neighbours[start:end] = np.where(valid, best, -1)
+            neighbour_scores[start:end] = np.where(valid, scores, 0)
+
+        logger.info(f"Built text index over {n} movies ({matrix.nnz} terms, {k} neighbours each)")
+        return cls(movie_ids, matrix, idf, neighbours, neighbour_scores, title_weight)
+
+    def vectorize(self, title: str = "", genre: str = "", overview: str = "") -> sp.csr_matrix:
+        """TF-IDF row for a movie, indexed or not"""
+        counts = self._counts(self.vectorizer, [title], [genre], [overview], self.title_weight)
+        return self._weigh(counts, self.idf)
+
+    def neighbours_of(self, movie_id: int, n: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """Precomputed most similar movies, or None if the movie is not indexed"""
+        position = index_lookup(self.movie_ids, movie_id)
+        if position < 0:
+            return None
+        row, scores = self.neighbours[position], self.neighbour_scores[position]
+        valid = row >= 0
+        return [(int(self.movie_ids[i]), float(s)) for i, s in zip(row[valid][:n], scores[valid][:n])]
+
+    def similar_to(self, vector: sp.csr_matrix, n: int = 10, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Most similar indexed movies to a TF-IDF row, in one sparse dot product"""
+        similarity = np.asarray((self.matrix @ vector.T).todense()).ravel()
+        exclude = similarity <= 0
+        if exclude_id is not None:
+            position = index_lookup(self.movie_ids, exclude_id)
+            if position >= 0:
+                exclude[position] = True
+        return [(int(self.movie_ids[i]), float(similarity[i])) for i in top_k(similarity, n, exclude)]
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            movie_ids=self.movie_ids,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            idf=self.idf,
+            neighbours=self.neighbours,
+            neighbour_scores=self.neighbour_scores,
+            title_weight=np.array(self.title_weight)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "TextSimilarityIndex":
+        with np.load(path) as arrays:
+            matrix = sp.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(arrays["shape"])
+            )
+            return cls(
+                arrays["movie_ids"], matrix, arrays["idf"], arrays["neighbours"], arrays["neighbour_scores"],
+                float(arrays["title_weight"])
+            )
+
+
+def load_text_index(models_path: str) -> Optional[TextSimilarityIndex]:
+    """Load the text index from a models directory, if one was built"""
+    path = os.path.join(models_path, TEXT_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        index = TextSimilarityIndex.load(path)
+        logger.info(f"Loaded text index over {len(index)} movies")
+        return index
+    except Exception as e:
+        logger.error(f"Error loading text index {path}: {e}")
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.config import get_settings
+    from app.database import get_database, close_database
+
+    parser = argparse.ArgumentParser(description="Build the TF-IDF movie text index from the movies collection")
+    parser.add_argument("--output", default=os.path.join(get_settings().MODELS_PATH, TEXT_INDEX_FILE))
+    parser.add_argument("--neighbours", type=int, default=50, help="Neighbours precomputed per movie")
+    parser.add_argument("--features", type=int, default=2 ** 18, help="Hashed feature space size")
+    parser.add_argument("--title-weight", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def fetch():
+        try:
+            projection = {"_id": 0, "movie_id": 1, "title": 1, "genre": 1, "overview": 1}
+            return await get_database().movies.find({}, projection).to_list(None)
+        finally:
+            close_database()
+
+    movies = asyncio.run(fetch())
+    if not movies:
+        parser.error("No movies found")
+    index = TextSimilarityIndex.build(
+        [m["movie_id"] for m in movies],
+        [m.get("title") for m in movies],
+        [m.get("genre") for m in movies],
+        [m.get("overview") for m in movies],
+        n_neighbours=args.neighbours,
+        n_features=args.features,
+        title_weight=args.title_weight
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    index.save(args.output)
+    logger.info(f"Saved text index to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+class HomeItem(BaseModel):
+    """Movie entry in a home page section"""
+    movie_id: int = Field(..., description="Movie ID, a key of the response's movies map")
+    score: Optional[float] = Field(None, description="Recommendation or trending score")
+    reason: Optional[str] = Field(None, description="Reason for recommendation")
+    rating: Optional[float] = Field(None, description="The user's rating, for recently rated movies")
+
+class HomeSection(BaseModel):
+    """One row of the home page"""
+    name: str = Field(..., description="Section name (recommendations, popular, trending, recently_rated, genres)")
+    title: str = Field(..., description="Display title")
+    items: List[HomeItem] = Field(..., description="Movies in display order")
+    genre: Optional[str] = Field(None, description="Genre of a genre row")
+    model_used: Optional[str] = Field(None, description="Model used for recommendations")
+    served_by: Optional[str] = Field(None, description="Serving stage of recommendations")
+
+class HomeResponse(BaseModel):
+    """Everything the home page needs, with each movie sent once"""
+    user_id: int = Field(..., description="User ID")
+    sections: List[HomeSection] = Field(..., description="Home page sections")
+    movies: Dict[str, Dict[str, Any]] = Field(..., description="Movies referenced by sections, keyed by movie ID")
+    generated_at: datetime = Field(default_factory=datetime.utcnow, description="Generation timestamp")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "user_id": 1,
+                "sections": [
+                    {
+                        "name": "recommendations",
+                        "title": "Recommended for you",
+                        "items": [{"movie_id": 1, "score": 4.8, "reason": "Recommended by hybrid model"}],
+                        "model_used": "hybrid",
+                        "served_by": "model"
+                    }
+                ],
+                "movies": {"1": {"movie_id": 1, "title": "The Shawshank Redemption", "genre": "Drama"}},
+                "generated_at": "2023-01-01T00:00:00"
+            }
+        }
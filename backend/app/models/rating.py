@@ -36,7 +36,7 @@ class RatingResponse(BaseModel):
     movie_id: int = Field(..., description="Movie ID")
     rating: float = Field(..., description="Rating value")
     timestamp: Optional[int] = Field(None, description="Rating timestamp")
-    created_at: datetime = Field(..., description="Creation timestamp")
+    created_at: datetime = Field(..., description="Creation timestamp; with RATING_WRITE_BEHIND, when the write was accepted")
 
     class Config:
         populate_by_name = True
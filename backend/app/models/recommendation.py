@@ -13,7 +13,7 @@ class MovieRecommendation(BaseModel):
 class RecommendationRequest(BaseModel):
     """Recommendation request model"""
     user_id: int = Field(..., description="User ID")
-    model_type: str = Field("hybrid", description="Model type (popularity, collaborative, content, hybrid)")
+    model_type: str = Field("hybrid", description="Model type (popularity, collaborative, content, hybrid, als)")
     limit: int = Field(10, ge=1, le=50, description="Number of recommendations")
     
     class Config:
@@ -32,6 +32,7 @@ class RecommendationResponse(BaseModel):
     model_used: str = Field(..., description="Model used for recommendations")
     total_count: int = Field(..., description="Total number of recommendations")
     generated_at: datetime = Field(default_factory=datetime.utcnow, description="Generation timestamp")
+    served_by: Optional[str] = Field(None, description="Serving stage (cache, model, fallback, cohort, popularity)")
     
     class Config:
         schema_extra = {
@@ -48,10 +49,29 @@ class RecommendationResponse(BaseModel):
                 ],
                 "model_used": "hybrid",
                 "total_count": 1,
-                "generated_at": "2023-01-01T00:00:00"
+                "generated_at": "2023-01-01T00:00:00",
+                "served_by": "model"
             }
         }
 
+class ModelComparison(BaseModel):
+    """One model's list in a comparison"""
+    model: str = Field(..., description="Model type")
+    recommendations: List[MovieRecommendation] = Field(..., description="The model's recommendations")
+    total_count: int = Field(..., description="Number of recommendations")
+    elapsed_ms: float = Field(..., description="Time spent scoring with this model")
+    error: Optional[str] = Field(None, description="Why the model produced no list, if it failed")
+
+class RecommendationComparisonResponse(BaseModel):
+    """Recommendations from several models for one user"""
+    user_id: int = Field(..., description="User ID")
+    history_count: int = Field(..., description="Number of movies the user has rated")
+    models: List[ModelComparison] = Field(..., description="Per-model results, in the order requested")
+    context_ms: float = Field(..., description="Time spent loading the user's history and seen set")
+    hydrate_ms: float = Field(..., description="Time spent fetching movies for every list")
+    total_ms: float = Field(..., description="Total time")
+    generated_at: datetime = Field(default_factory=datetime.utcnow, description="Generation timestamp")
+
 class SimilarMovieResponse(BaseModel):
     """Similar movies response model"""
     movie_id: int = Field(..., description="Source movie ID")
@@ -0,0 +1,364 @@
+"""Bulk-load MovieLens movies, users and ratings into MongoDB
+
+    python -m app.repositories.load_movielens --movies ../ml/saved_models/movies_data.csv \\
+        --users path/to/u.user --ratings path/to/u.data [--mode upsert] [--drop]
+
+Reads the ml-100k files (u.item or the notebook's movies_data.csv, u.user,
+u.data), the ml-1m ``.dat`` files and the ``.csv`` files of the larger
+variants. Ratings are streamed in chunks, so file size is bounded by disk, not
+memory. Batches are written unordered by several concurrent writers sharing
+one connection pool.
+
+``--mode insert`` (the default) is for seeding: unique key indexes are built
+first and secondary ones after the load, and documents that already exist
+(or repeat a key in the input) are counted and skipped. ``--mode upsert``
+refreshes an existing database in place: documents are matched on their
+natural keys (movie_id, user_id, user_id + movie_id), so re-running it is
+safe. Movies get genres from the one-hot genre flags, joined
+with "|", and vote_count/vote_average from the ratings loaded in the same run.
+
+Every inserted or changed document gets the load time as ``updated_at``, so
+running workers and restored snapshots pick the load up through the change
+feed; an upsert that changes nothing leaves the document untouched. With
+RATING_BUCKETS_ENABLED, run ``app.repositories.migrate_ratings`` afterwards.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from app.ml.datasets import GENRES, GENRE_COLUMNS, MOVIES_COLUMNS, RATINGS_COLUMNS, USERS_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ("movies", "users", "ratings")
+# Natural key of each collection, matched by upserts and unique-indexed
+KEYS = {"movies": ("movie_id",), "users": ("user_id",), "ratings": ("user_id", "movie_id")}
+# ml-1m users.dat occupation codes
+OCCUPATIONS = [
+    "other", "academic/educator", "artist", "clerical/admin", "college/grad student", "customer service",
+    "doctor/health care", "executive/managerial", "farmer", "homemaker", "K-12 student", "lawyer",
+    "programmer", "retired", "sales/marketing", "scientist", "self-employed", "technician/engineer",
+    "tradesman/craftsman", "unemployed", "writer"
+]
+DUPLICATE_KEY = 11000
+
+
+def _kind(path: str) -> str:
+    """'dat' (ml-1m), 'csv' (ml-10m and larger, or movies_data.csv) or '100k'"""
+    extension = os.path.splitext(path)[1].lower()
+    return {".dat": "dat", ".csv": "csv"}.get(extension, "100k")
+
+
+def read_rating_chunks(path: str, chunk_size: int = 200_000) -> Iterator[pd.DataFrame]:
+    """Ratings as user_id, movie_id, rating, timestamp frames of up to chunk_size rows"""
+    kind = _kind(path)
+    if kind == "dat":
+        # UserID::MovieID::Rating::Timestamp; splitting on ':' keeps the fast C parser
+        reader = pd.read_csv(path, sep=":", header=None, usecols=[0, 2, 4, 6], chunksize=chunk_size)
+    elif kind == "csv":
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(path, sep="\t", names=RATINGS_COLUMNS, chunksize=chunk_size)
+    for chunk in reader:
+        chunk.columns = RATINGS_COLUMNS
+        yield chunk.astype({"user_id": "int64", "movie_id": "int64", "rating": "float64", "timestamp": "int64"})
+
+
+def read_movies(path: str) -> pd.DataFrame:
+    """Movies as movie_id, title, genre ("|"-joined), release_date"""
+    kind = _kind(path)
+    if kind == "dat":
+        movies = pd.read_csv(path, sep="::", engine="python", names=["movie_id", "title", "genres"], encoding="latin-1")
+    elif kind == "csv":
+        movies = pd.read_csv(path)
+        movies = movies.rename(columns={"movieId": "movie_id", "movie_title": "title"})
+    else:
+        movies = pd.read_csv(path, sep="|", names=MOVIES_COLUMNS, encoding="latin-1").rename(columns={"movie_title": "title"})
+
+    if "genres" in movies:
+        genre = movies["genres"].fillna("").str.replace("(no genres listed)", "", regex=False)
+    else:
+        flags = movies[GENRE_COLUMNS].fillna(0).to_numpy(dtype=bool)
+        names = np.array(GENRES, dtype=object)
+        genre = pd.Series(["|".join(names[row]) for row in flags], index=movies.index)
+
+    if "release_date" in movies:
+        release_date = pd.to_datetime(movies["release_date"], format="%d-%b-%Y", errors="coerce").dt.strftime("%Y-%m-%d")
+    else:
+        # Later variants only carry the year, in the title
+        release_date = movies["title"].str.extract(r"\((\d{4})\)\s*$", expand=False)
+    return pd.DataFrame({
+        "movie_id": movies["movie_id"].astype("int64"),
+        "title": movies["title"].fillna("").str.strip(),
+        "genre": genre,
+        "release_date": release_date.astype(object).where(release_date.notna(), None)
+    })
+
+
+def read_users(path: str) -> pd.DataFrame:
+    """Users as user_id, age, gender, occupation, zip_code"""
+    if _kind(path) == "dat":
+        users = pd.read_csv(
+            path, sep="::", engine="python", names=["user_id", "gender", "age", "occupation", "zip_code"],
+            dtype={"zip_code": str}
+        )
+        codes = users["occupation"].astype("int64")
+        users["occupation"] = [OCCUPATIONS[code] if 0 <= code < len(OCCUPATIONS) else "other" for code in codes]
+        return users[USERS_COLUMNS]
+    return pd.read_csv(path, sep="|", names=USERS_COLUMNS, dtype={"zip_code": str})
+
+
+def _records(frame: pd.DataFrame, **constants: Any) -> List[Dict[str, Any]]:
+    """Row dicts with native Python values, plus constant fields"""
+    columns = list(frame.columns)
+    values = [frame[column].tolist() for column in columns]
+    return [{**dict(zip(columns, row)), **constants} for row in zip(*values)]
+
+
+class BulkWriter:
+    """Unordered batch writes to one collection from several concurrent writers
+
+    Batches wait in a bounded queue, so reading stops when writers fall
+    behind. Each writer holds its own pooled connection while it writes.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, mode: str = "insert", workers: int = 4, batch_size: int = 5000):
+        self.collection = collection
+        self.mode = mode
+        self.batch_size = batch_size
+        self.keys = KEYS[collection.name]
+        self.counts = {"written": 0, "inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        self.error: Optional[Exception] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        self._writers = [asyncio.create_task(self._run()) for _ in range(workers)]
+
+    async def add(self, documents: Sequence[Dict[str, Any]]):
+        """Queue documents for writing, waiting while the queue is full"""
+        for start in range(0, len(documents), self.batch_size):
+            if self.error is not None:
+                raise self.error
+            await self._queue.put(documents[start:start + self.batch_size])
+
+    async def close(self) -> Dict[str, int]:
+        """Wait for queued batches to be written and return the counts"""
+        for _ in self._writers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._writers)
+        if self.error is not None:
+            raise self.error
+        return self.counts
+
+    async def _run(self):
+        while True:
+            batch = await self._queue.get()
+            if batch is None:
+                return
+            if self.error is not None:
+                # After a failure, batches are drained unwritten so producers do not block
+                continue
+            try:
+                if self.mode == "upsert":
+                    await self._upsert(batch)
+                else:
+                    await self._insert(batch)
+                self.counts["written"] += len(batch)
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} documents to {self.collection.name}: {e}")
+                self.error = e
+
+    async def _insert(self, batch: List[Dict[str, Any]]):
+        try:
+            result = await self.collection.insert_many(batch, ordered=False)
+            self.counts["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            other = [error for error in errors if error.get("code") != DUPLICATE_KEY]
+            if other:
+                raise
+            self.counts["inserted"] += e.details.get("nInserted", 0)
+            self.counts["skipped"] += len(errors)
+
+    async def _upsert(self, batch: List[Dict[str, Any]]):
+        operations = []
+        for document in batch:
+            key = {name: document[name] for name in self.keys}
+            fields = {
+                name: {"$literal": value} for name, value in document.items()
+                if name not in key and name not in ("created_at", "updated_at")
+            }
+            # A pipeline update, so updated_at only moves when a field differs:
+            # unchanged documents are not rewritten and raise no change event
+            changed = {"$or": [
+                # New documents, and documents written before updated_at existed
+                {"$eq": [{"$ifNull": ["$updated_at", None]}, None]},
+                *({"$ne": [f"${name}", value]} for name, value in fields.items())
+            ]}
+            operations.append(UpdateOne(key, [
+                {"$set": {"updated_at": {"$cond": [changed, {"$literal": document["updated_at"]}, "$updated_at"]}}},
+                {"$set": {**fields, "created_at": {"$ifNull": ["$created_at", {"$literal": document["created_at"]}]}}}
+            ], upsert=True))
+        result = await self.collection.bulk_write(operations, ordered=False)
+        self.counts["inserted"] += result.upserted_count
+        self.counts["updated"] += result.modified_count
+        self.counts["unchanged"] += result.matched_count - result.modified_count
+
+
+async def create_indexes(database: AsyncIOMotorDatabase, names: Sequence[str], unique: Optional[bool] = None):
+    """Create the application's declared indexes on the given collections, or only the (non-)unique ones"""
+    from app.database import INDEXES
+
+    for name in names:
+        for keys, options in INDEXES[name]:
+            if unique is None or bool(options.get("unique")) == unique:
+                await database[name].create_index(keys, **options)
+
+
+async def load(
+    database: AsyncIOMotorDatabase,
+    movies_path: Optional[str] = None,
+    users_path: Optional[str] = None,
+    ratings_path: Optional[str] = None,
+    mode: str = "insert",
+    drop: bool = False,
+    workers: int = 4,
+    batch_size: int = 5000,
+    chunk_size: int = 200_000
+) -> Dict[str, Dict[str, int]]:
+    """Load the given files, returning write counts per collection"""
+    paths = {"movies": movies_path, "users": users_path, "ratings": ratings_path}
+    names = [name for name in COLLECTIONS if paths[name]]
+    if drop:
+        for name in names:
+            await database.drop_collection(name)
+    # Unique key indexes come first: upserts look documents up by key, and
+    # inserts rely on them to skip duplicate rows. Inserts build the other
+    # indexes once, after the load
+    await create_indexes(database, names, unique=None if mode == "upsert" else True)
+
+    now = datetime.utcnow()
+    totals: Dict[str, Dict[str, int]] = {}
+    votes: Optional[pd.DataFrame] = None
+
+    if ratings_path:
+        started = time.perf_counter()
+        writer = BulkWriter(database.ratings, mode, workers, batch_size)
+        chunks = read_rating_chunks(ratings_path, chunk_size)
+        sums, counts = pd.Series(dtype="float64"), pd.Series(dtype="int64")
+        rows = 0
+        try:
+            while True:
+                # Parsing runs in a thread so writers keep going meanwhile
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                # Duplicate rows within a chunk would be written twice and counted twice in the votes;
+                # across chunks the unique index skips them (insert) or the later row wins (upsert)
+                chunk = chunk.drop_duplicates(["user_id", "movie_id"], keep="first" if mode == "insert" else "last")
+                grouped = chunk.groupby("movie_id")["rating"]
+                sums = sums.add(grouped.sum(), fill_value=0)
+                counts = counts.add(grouped.count(), fill_value=0)
+                # Rated-at time from the file; datetime64[ms].tolist() gives datetimes
+                created_at = chunk["timestamp"].to_numpy().astype("datetime64[s]").astype("datetime64[ms]").tolist()
+                documents = _records(chunk, updated_at=now)
+                for document, at in zip(documents, created_at):
+                    document["created_at"] = at
+                await writer.add(documents)
+                rows += len(chunk)
+                logger.info(f"ratings: read {rows} rows, wrote {writer.counts['written']}")
+        finally:
+            totals["ratings"] = await writer.close()
+        votes = pd.DataFrame({"vote_count": counts.astype("int64"), "vote_average": (sums / counts * 2).round(1)})
+        _log_rate("ratings", totals["ratings"], started)
+
+    if movies_path:
+        started = time.perf_counter()
+        movies = read_movies(movies_path)
+        if votes is not None:
+            # Average rating on the catalog's 10-point scale
+            joined = movies.join(votes, on="movie_id")
+            movies["vote_count"] = joined["vote_count"].fillna(0).astype("int64")
+            movies["vote_average"] = joined["vote_average"].astype(object).where(joined["vote_average"].notna(), None)
+        writer = BulkWriter(database.movies, mode, workers, batch_size)
+        try:
+            await writer.add(_records(movies, created_at=now, updated_at=now))
+        finally:
+            totals["movies"] = await writer.close()
+        _log_rate("movies", totals["movies"], started)
+
+    if users_path:
+        started = time.perf_counter()
+        users = read_users(users_path)
+        writer = BulkWriter(database.users, mode, workers, batch_size)
+        try:
+            await writer.add(_records(users, created_at=now, updated_at=now))
+        finally:
+            totals["users"] = await writer.close()
+        _log_rate("users", totals["users"], started)
+
+    if mode == "insert":
+        started = time.perf_counter()
+        await create_indexes(database, names, unique=False)
+        logger.info(f"Built indexes on {', '.join(names)} in {time.perf_counter() - started:.1f}s")
+    return totals
+
+
+def _log_rate(name: str, counts: Dict[str, int], started: float):
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"{name}: {counts['written']} documents in {elapsed:.1f}s ({counts['written'] / max(elapsed, 1e-9):.0f}/s; "
+        f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+        f"{counts['skipped']} already present)"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Bulk-load MovieLens movies, users and ratings into MongoDB")
+    parser.add_argument("--movies", help="u.item, movies_data.csv, movies.dat or movies.csv")
+    parser.add_argument("--users", help="u.user or users.dat")
+    parser.add_argument("--ratings", help="u.data, ratings.dat or ratings.csv")
+    parser.add_argument("--url", default=settings.MONGODB_URL)
+    parser.add_argument("--database", default=settings.DATABASE_NAME)
+    parser.add_argument("--mode", choices=("insert", "upsert"), default="insert",
+                        help="insert to seed (existing documents are skipped), upsert to refresh in place")
+    parser.add_argument("--drop", action="store_true", help="Drop the loaded collections first")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent writers (pooled connections)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many/bulk_write")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Rating rows parsed per chunk")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not (args.movies or args.users or args.ratings):
+        parser.error("Nothing to load; pass --movies, --users and/or --ratings")
+
+    async def run():
+        client = AsyncIOMotorClient(args.url, maxPoolSize=args.workers + 2)
+        try:
+            started = time.perf_counter()
+            totals = await load(
+                client[args.database], args.movies, args.users, args.ratings,
+                mode=args.mode, drop=args.drop, workers=args.workers,
+                batch_size=args.batch_size, chunk_size=args.chunk_size
+            )
+            written = sum(counts["written"] for counts in totals.values())
+            logger.info(f"Loaded {written} documents into {args.database} in {time.perf_counter() - started:.1f}s")
+        finally:
+            client.close()
+
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Build per-user rating buckets from the flat ratings collection
+
+    python -m app.repositories.migrate_ratings [--bucket-size N] [--users ID ...]
+
+Safe to re-run: each user's buckets are replaced as a whole. Run it before
+setting RATING_BUCKETS_ENABLED, or again for specific users to repair them.
+Ratings written while it runs may be missed; re-run for the affected users.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import logging
+from app.config import get_settings
+from app.database import get_database, close_database
+from app.repositories.ratings import RatingBuckets
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_PROJECTION = {"_id": 0, "user_id": 1, "movie_id": 1, "rating": 1, "timestamp": 1, "created_at": 1}
+
+
+async def _collection_sizes(database, name: str) -> Optional[Dict[str, int]]:
+    try:
+        stats = await database.command("collStats", name)
+        return {"count": stats["count"], "size": stats["size"], "index_size": stats["totalIndexSize"]}
+    except Exception:
+        return None
+
+
+async def migrate(bucket_size: int, batch_users: int = 500, users: Optional[List[int]] = None) -> Dict[str, int]:
+    """Rebuild buckets for all users (or the given ones), returning counts"""
+    database = get_database()
+    buckets = RatingBuckets(database.rating_buckets, bucket_size)
+    await buckets.create_indexes()
+
+    query: Dict[str, Any] = {"user_id": {"$in": users}} if users else {}
+    # Sorting on the unique (user_id, movie_id) index streams each user's ratings contiguously
+    cursor = database.ratings.find(query, MIGRATION_PROJECTION).sort([("user_id", 1), ("movie_id", 1)])
+
+    totals = {"users": 0, "ratings": 0, "buckets": 0}
+    operations: List[Any] = []
+    pending_users = 0
+    migrated = set()
+    current_user, current_ratings = None, []
+
+    async def add_user(user_id: int, ratings: List[Dict[str, Any]]):
+        nonlocal operations, pending_users
+        migrated.add(user_id)
+        user_operations = buckets.build_operations(user_id, ratings)
+        operations.extend(user_operations)
+        totals["users"] += 1
+        totals["ratings"] += len(ratings)
+        totals["buckets"] += len(user_operations) - 1
+        pending_users += 1
+        if pending_users >= batch_users:
+            await database.rating_buckets.bulk_write(operations, ordered=False)
+            logger.info(f"Migrated {totals['users']} users, {totals['ratings']} ratings")
+            operations, pending_users = [], 0
+
+    async for rating in cursor:
+        if rating["user_id"] != current_user:
+            if current_ratings:
+                await add_user(current_user, current_ratings)
+            current_user, current_ratings = rating["user_id"], []
+        current_ratings.append(rating)
+    if current_ratings:
+        await add_user(current_user, current_ratings)
+
+    # Users named explicitly but without ratings lose their buckets
+    for user_id in set(users or ()) - migrated:
+        operations.extend(buckets.build_operations(user_id, []))
+
+    if operations:
+        await database.rating_buckets.bulk_write(operations, ordered=False)
+    return totals
+
+
+async def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Build per-user rating buckets from the ratings collection")
+    parser.add_argument("--bucket-size", type=int, default=settings.RATING_BUCKET_SIZE)
+    parser.add_argument("--batch-users", type=int, default=500, help="Users per bulk write")
+    parser.add_argument("--users", type=int, nargs="*", help="Only rebuild these users")
+    args = parser.parse_args()
+
+    try:
+        totals = await migrate(args.bucket_size, args.batch_users, args.users)
+        logger.info(
+            f"Built {totals['buckets']} buckets for {totals['users']} users from {totals['ratings']} ratings"
+        )
+        database = get_database()
+        for name in ("ratings", "rating_buckets"):
+            sizes = await _collection_sizes(database, name)
+            if sizes is not None:
+                logger.info(
+                    f"{name}: {sizes['count']} documents, {sizes['size'] // 1024} KiB data, "
+                    f"{sizes['index_size'] // 1024} KiB indexes"
+                )
+    finally:
+        close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,266 @@
+"""Rating storage: the flat ratings collection and optional per-user buckets
+
+The flat layout keeps one document per (user, movie), so reading a user's
+history touches one scattered document per rating. The bucketed layout keeps,
+alongside it, a few ``rating_buckets`` documents per user, each holding up to
+``bucket_size`` ratings as packed little-endian arrays:
+
+    {user_id, seq, rev, count, movie_ids: <i4, ratings: <f4,
+     created_at: <i8 epoch ms, timestamps: <i8 (-1 when unset), updated_at}
+
+A user's full history is then one indexed query returning a handful of
+documents, under a single (user_id, seq) index. Bucket writes are optimistic:
+each bucket carries a ``rev`` and a write that loses a race re-reads and
+re-applies, which is safe because applying the same writes twice is a no-op.
+
+The flat collection stays the source of truth for per-movie reads and
+aggregations; buckets serve per-user history. ``migrate_ratings`` builds the
+buckets from the flat collection.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+from pymongo import DeleteMany, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from app.models.rating import RatingResponse
+from app.utils.serialization import response_projection
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RATING_PROJECTION = response_projection(RatingResponse)
+BUCKET_COLUMNS = {"movie_ids": "<i4", "ratings": "<f4", "created_at": "<i8", "timestamps": "<i8"}
+NO_TIMESTAMP = -1
+MAX_ATTEMPTS = 5
+
+# (operation, movie_id, rating, at, timestamp); operation is "set" or "delete"
+Write = Tuple[str, int, Optional[float], datetime, Optional[int]]
+
+
+def _to_millis(at: datetime) -> int:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return int(at.timestamp() * 1000)
+
+
+def _from_millis(millis: int) -> datetime:
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def unpack_bucket(doc: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Column arrays of a bucket document"""
+    return {name: np.frombuffer(doc[name], dtype=dtype) for name, dtype in BUCKET_COLUMNS.items()}
+
+
+def pack_bucket(rows: Dict[int, Tuple[float, int, int]]) -> Dict[str, Any]:
+    """Packed columns of a bucket from {movie_id: (rating, created_at ms, timestamp)}"""
+    values = list(rows.values())
+    return {
+        "count": len(rows),
+        "movie_ids": np.fromiter(rows.keys(), dtype="<i4", count=len(rows)).tobytes(),
+        "ratings": np.array([v[0] for v in values], dtype="<f4").tobytes(),
+        "created_at": np.array([v[1] for v in values], dtype="<i8").tobytes(),
+        "timestamps": np.array([v[2] for v in values], dtype="<i8").tobytes()
+    }
+
+
+class _Bucket:
+    def __init__(self, seq: int, doc: Optional[Dict[str, Any]] = None):
+        self.seq = seq
+        self.id = doc["_id"] if doc else None
+        self.rev = doc.get("rev", 0) if doc else 0
+        self.rows: Dict[int, Tuple[float, int, int]] = {}
+        if doc:
+            columns = unpack_bucket(doc)
+            for movie_id, rating, created, timestamp in zip(
+                columns["movie_ids"].tolist(), columns["ratings"].tolist(),
+                columns["created_at"].tolist(), columns["timestamps"].tolist()
+            ):
+                self.rows[movie_id] = (rating, created, timestamp)
+
+
+class RatingBuckets:
+    """Per-user bucket documents holding packed rating arrays"""
+
+    def __init__(self, collection: AsyncIOMotorCollection, bucket_size: int = 256):
+        self.collection = collection
+        self.bucket_size = bucket_size
+
+    async def create_indexes(self):
+        await self.collection.create_index([("user_id", 1), ("seq", 1)], unique=True)
+
+    async def _load(self, user_id: int) -> List[Dict[str, Any]]:
+        return await self.collection.find({"user_id": user_id}).sort("seq", 1).to_list(None)
+
+    async def columns(self, user_id: int) -> Dict[str, np.ndarray]:
+        """A user's ratings as column arrays, in bucket order"""
+        buckets = [unpack_bucket(doc) for doc in await self._load(user_id)]
+        if not buckets:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in BUCKET_COLUMNS.items()}
+        return {name: np.concatenate([b[name] for b in buckets]) for name in BUCKET_COLUMNS}
+
+    async def history(self, user_id: int) -> List[Dict[str, Any]]:
+        """A user's ratings as wire-shaped rating documents"""
+        columns = await self.columns(user_id)
+        return [
+            {
+                "user_id": user_id,
+                "movie_id": movie_id,
+                "rating": rating,
+                "timestamp": timestamp if timestamp != NO_TIMESTAMP else None,
+                "created_at": _from_millis(created)
+            }
+            for movie_id, rating, timestamp, created in zip(
+                columns["movie_ids"].tolist(), columns["ratings"].tolist(),
+                columns["timestamps"].tolist(), columns["created_at"].tolist()
+            )
+        ]
+
+    async def apply(self, user_id: int, writes: List[Write]):
+        """Apply rating sets and deletes to a user's buckets"""
+        for _ in range(MAX_ATTEMPTS):
+            buckets = [_Bucket(doc["seq"], doc) for doc in await self._load(user_id)]
+            location = {movie_id: bucket for bucket in buckets for movie_id in bucket.rows}
+            dirty = []
+
+            for operation, movie_id, rating, at, timestamp in writes:
+                bucket = location.get(movie_id)
+                if operation == "delete":
+                    if bucket is not None:
+                        del bucket.rows[movie_id]
+                        del location[movie_id]
+                        dirty.append(bucket)
+                    continue
+                if bucket is not None:
+                    # Keep the original creation time and source timestamp
+                    _, created, old_timestamp = bucket.rows[movie_id]
+                    bucket.rows[movie_id] = (rating, created, old_timestamp)
+                else:
+                    if not buckets or len(buckets[-1].rows) >= self.bucket_size:
+                        buckets.append(_Bucket(buckets[-1].seq + 1 if buckets else 0))
+                    bucket = buckets[-1]
+                    bucket.rows[movie_id] = (
+                        rating, _to_millis(at), NO_TIMESTAMP if timestamp is None else timestamp
+                    )
+                    location[movie_id] = bucket
+                dirty.append(bucket)
+
+            if await self._save(user_id, {id(b): b for b in dirty}.values()):
+                return
+        raise RuntimeError(f"Rating buckets for user {user_id} kept changing under concurrent writes")
+
+    async def _save(self, user_id: int, buckets: Iterable[_Bucket]) -> bool:
+        """Write changed buckets; False if another writer got there first"""
+        now = datetime.utcnow()
+        for bucket in buckets:
+            if bucket.id is None:
+                try:
+                    await self.collection.insert_one(
+                        {"user_id": user_id, "seq": bucket.seq, "rev": 0, **pack_bucket(bucket.rows), "updated_at": now}
+                    )
+                except DuplicateKeyError:
+                    return False
+                continue
+            current = {"_id": bucket.id, "rev": bucket.rev}
+            if not bucket.rows:
+                result = await self.collection.delete_one(current)
+                if result.deleted_count == 0:
+                    return False
+                continue
+            result = await self.collection.update_one(
+                current, {"$set": {**pack_bucket(bucket.rows), "updated_at": now}, "$inc": {"rev": 1}}
+            )
+            if result.matched_count == 0:
+                return False
+        return True
+
+    def build_operations(self, user_id: int, ratings: List[Dict[str, Any]]) -> List[Any]:
+        """Bulk operations replacing all of a user's buckets with ones built from flat rating documents"""
+        operations = []
+        now = datetime.utcnow()
+        n_buckets = 0
+        for start in range(0, len(ratings), self.bucket_size):
+            rows = {
+                r["movie_id"]: (
+                    r["rating"],
+                    _to_millis(r.get("created_at") or now),
+                    NO_TIMESTAMP if r.get("timestamp") is None else r["timestamp"]
+                )
+                for r in ratings[start:start + self.bucket_size]
+            }
+            operations.append(ReplaceOne(
+                {"user_id": user_id, "seq": n_buckets},
+                {"user_id": user_id, "seq": n_buckets, "rev": 0, **pack_bucket(rows), "updated_at": now},
+                upsert=True
+            ))
+            n_buckets += 1
+        operations.append(DeleteMany({"user_id": user_id, "seq": {"$gte": n_buckets}}))
+        return operations
+
+
+class RatingRepository:
+    """Rating reads and writes, keeping buckets in step with the flat collection when enabled"""
+
+    def __init__(self, database: AsyncIOMotorDatabase, bucketed: bool = False, bucket_size: int = 256):
+        self.collection: AsyncIOMotorCollection = database.ratings
+        self.buckets: Optional[RatingBuckets] = None
+        if bucketed:
+            self.buckets = RatingBuckets(database.rating_buckets, bucket_size)
+
+    async def user_history(self, user_id: int) -> List[Dict[str, Any]]:
+        """All of a user's ratings as wire-shaped rating documents"""
+        if self.buckets is not None:
+            return await self.buckets.history(user_id)
+        return await self.collection.find({"user_id": user_id}, RATING_PROJECTION).to_list(None)
+
+    async def user_ratings(self, user_id: int, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """A page of a user's ratings"""
+        if self.buckets is not None:
+            return (await self.buckets.history(user_id))[skip:skip + limit]
+        cursor = self.collection.find({"user_id": user_id}, RATING_PROJECTION).skip(skip).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def user_rating_values(self, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """A user's (movie_ids, ratings) arrays"""
+        if self.buckets is not None:
+            columns = await self.buckets.columns(user_id)
+            return columns["movie_ids"].astype(np.int64), columns["ratings"].astype(np.float64)
+        ratings = await self.collection.find({"user_id": user_id}, {"_id": 0, "movie_id": 1, "rating": 1}).to_list(None)
+        return (
+            np.fromiter((r["movie_id"] for r in ratings), dtype=np.int64, count=len(ratings)),
+            np.fromiter((r["rating"] for r in ratings), dtype=np.float64, count=len(ratings))
+        )
+
+    async def find(self, user_id: int, movie_id: int) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"user_id": user_id, "movie_id": movie_id})
+
+    async def upsert(self, user_id: int, movie_id: int, rating: float, at: datetime) -> Dict[str, Any]:
+        """Create or update a rating, returning the stored document"""
+        document = await self.collection.find_one_and_update(
+            {"user_id": user_id, "movie_id": movie_id},
+            {"$set": {"rating": rating, "updated_at": at}, "$setOnInsert": {"created_at": at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if self.buckets is not None:
+            await self.buckets.apply(user_id, [("set", movie_id, rating, at, document.get("timestamp"))])
+        return document
+
+    async def delete(self, user_id: int, movie_id: int) -> bool:
+        result = await self.collection.delete_one({"user_id": user_id, "movie_id": movie_id})
+        if result.deleted_count > 0 and self.buckets is not None:
+            await self.buckets.apply(user_id, [("delete", movie_id, None, datetime.utcnow(), None)])
+        return result.deleted_count > 0
+
+    async def apply_flushed(self, records: List[Dict[str, Any]]):
+        """Bring buckets up to date with write-buffer records already written to the flat collection"""
+        if self.buckets is None:
+            return
+        by_user: Dict[int, List[Write]] = {}
+        for record in records:
+            by_user.setdefault(record["user_id"], []).append(
+                (record["op"], record["movie_id"], record.get("rating"), datetime.fromisoformat(record["at"]), None)
+            )
+        for user_id, writes in by_user.items():
+            await self.buckets.apply(user_id, writes)
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Query, Path, Depends, Header
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.container import Container, get_container
+from app.utils.profiling import ProfileStore
+from app.utils.serialization import ORJSONResponse
+import hmac
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+def get_profile_store(
+    x_profile_token: Optional[str] = Header(None),
+    container: Container = Depends(get_container)
+) -> ProfileStore:
+    """Profile store, for callers holding the profile token; hidden when no token is configured"""
+    token = container.settings.PROFILE_TOKEN
+    if not token or not x_profile_token or not hmac.compare_digest(x_profile_token, token):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return container.profiles
+
+@router.get("/profiles")
+async def list_profiles(
+    limit: int = Query(50, ge=1, le=500, description="Number of profiles to return"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """List saved request profiles, newest first"""
+    try:
+        return ORJSONResponse(store.list(limit))
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_stacks(
+    profile_id: str = Path(..., description="Profile ID"),
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """Sampled stacks of a profile in folded format (flamegraph.pl, speedscope)"""
+    folded = store.folded(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile stacks not found")
+    return PlainTextResponse(folded)
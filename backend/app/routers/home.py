@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Query, Path, Depends
+from typing import Optional
+from app.models.home import HomeResponse
+from app.services.home_service import HomeService, HOME_SECTIONS
+from app.container import get_home_service
+from app.utils.serialization import ORJSONResponse
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+def _split(value: Optional[str]):
+    return [part.strip() for part in value.split(",") if part.strip()] if value else None
+
+@router.get("/{user_id}", response_model=HomeResponse)
+async def get_home(
+    user_id: int = Path(..., description="User ID"),
+    limit: int = Query(10, ge=1, le=50, description="Number of movies per section"),
+    sections: Optional[str] = Query(None, description=f"Comma-separated sections to include ({', '.join(HOME_SECTIONS)})"),
+    fields: Optional[str] = Query(None, description="Comma-separated movie fields to include (movie_id is always included)"),
+    model_type: str = Query("hybrid", description="Model type for recommendations"),
+    home_service: HomeService = Depends(get_home_service)
+):
+    """Get every home page section for a user in one request"""
+    selected = _split(sections)
+    unknown = sorted(set(selected or ()) - set(HOME_SECTIONS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    try:
+        home = await home_service.get_home(
+            user_id,
+            limit=limit,
+            sections=selected,
+            fields=_split(fields),
+            model_type=model_type
+        )
+        return ORJSONResponse(home)
+    except Exception as e:
+        logger.error(f"Error getting home page for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,16 +1,15 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path, Depends
 from typing import List, Optional
 from app.models.movie import Movie, MovieResponse
 from app.services.movie_service import MovieService
+from app.container import get_movie_service
 from app.database import get_movies_collection
+from app.utils.serialization import ORJSONResponse
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize movie service
-movie_service = MovieService()
-
 @router.get("/", response_model=List[MovieResponse])
 async def get_movies(
     skip: int = Query(0, ge=0, description="Number of movies to skip"),
@@ -18,7 +17,8 @@ async def get_movies(
     genre: Optional[str] = Query(None, description="Filter by genre"),
     search: Optional[str] = Query(None, description="Search in movie titles"),
     sort_by: str = Query("title", description="Sort by field"),
-    sort_order: str = Query("asc", pattern="^(asc|desc)$", description="Sort order")
+    sort_order: str = Query("asc", pattern="^(asc|desc)$", description="Sort order"),
+    movie_service: MovieService = Depends(get_movie_service)
 ):
     """Get movies with filtering and pagination"""
     try:
@@ -30,14 +30,15 @@ async def get_movies(
             sort_by=sort_by,
             sort_order=sort_order
         )
-        return movies
+        return ORJSONResponse(movies)
     except Exception as e:
         logger.error(f"Error getting movies: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/{movie_id}", response_model=MovieResponse)
 async def get_movie(
-    movie_id: int = Path(..., description="Movie ID")
+    movie_id: int = Path(..., description="Movie ID"),
+    movie_service: MovieService = Depends(get_movie_service)
 ):
     """Get a specific movie by ID"""
     try:
@@ -53,25 +54,40 @@ async def get_movie(
 
 @router.get("/popular/", response_model=List[MovieResponse])
 async def get_popular_movies(
-    limit: int = Query(20, ge=1, le=100, description="Number of movies to return")
+    limit: int = Query(20, ge=1, le=100, description="Number of movies to return"),
+    movie_service: MovieService = Depends(get_movie_service)
 ):
     """Get popular movies based on ratings"""
     try:
         movies = await movie_service.get_popular_movies(limit)
-        return movies
+        return ORJSONResponse(movies)
     except Exception as e:
         logger.error(f"Error getting popular movies: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/trending/", response_model=List[MovieResponse])
+async def get_trending_movies(
+    limit: int = Query(20, ge=1, le=100, description="Number of movies to return"),
+    movie_service: MovieService = Depends(get_movie_service)
+):
+    """Get movies trending by recent rating activity"""
+    try:
+        movies = await movie_service.get_trending_movies(limit)
+        return ORJSONResponse(movies)
+    except Exception as e:
+        logger.error(f"Error getting trending movies: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/genre/{genre}", response_model=List[MovieResponse])
 async def get_movies_by_genre(
     genre: str = Path(..., description="Movie genre"),
-    limit: int = Query(20, ge=1, le=100, description="Number of movies to return")
+    limit: int = Query(20, ge=1, le=100, description="Number of movies to return"),
+    movie_service: MovieService = Depends(get_movie_service)
 ):
     """Get movies by genre"""
     try:
         movies = await movie_service.get_movies_by_genre(genre, limit)
-        return movies
+        return ORJSONResponse(movies)
     except Exception as e:
         logger.error(f"Error getting movies by genre {genre}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -79,12 +95,13 @@ async def get_movies_by_genre(
 @router.get("/search/", response_model=List[MovieResponse])
 async def search_movies(
     q: str = Query(..., description="Search query"),
-    limit: int = Query(20, ge=1, le=100, description="Number of movies to return")
+    limit: int = Query(20, ge=1, le=100, description="Number of movies to return"),
+    movie_service: MovieService = Depends(get_movie_service)
 ):
     """Search movies by title"""
     try:
         movies = await movie_service.search_movies(q, limit)
-        return movies
+        return ORJSONResponse(movies)
     except Exception as e:
         logger.error(f"Error searching movies with query '{q}': {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -2,17 +2,17 @@ from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import List
 from app.models.rating import RatingRequest, RatingResponse
 from app.services.rating_service import RatingService
+from app.container import get_rating_service
+from app.utils.serialization import ORJSONResponse
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize rating service
-rating_service = RatingService()
-
 @router.post("/", response_model=RatingResponse)
 async def create_rating(
-    request: RatingRequest
+    request: RatingRequest,
+    rating_service: RatingService = Depends(get_rating_service)
 ):
     """Create or update a rating"""
     try:
@@ -30,12 +30,13 @@ async def create_rating(
 async def get_user_ratings(
     user_id: int,
     skip: int = Query(0, ge=0, description="Number of ratings to skip"),
-    limit: int = Query(100, ge=1, le=1000, description="Number of ratings to return")
+    limit: int = Query(100, ge=1, le=1000, description="Number of ratings to return"),
+    rating_service: RatingService = Depends(get_rating_service)
 ):
     """Get ratings for a specific user"""
     try:
         ratings = await rating_service.get_user_ratings(user_id, skip, limit)
-        return ratings
+        return ORJSONResponse(ratings)
     except Exception as e:
         logger.error(f"Error getting ratings for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -44,12 +45,13 @@ async def get_user_ratings(
 async def get_movie_ratings(
     movie_id: int,
     skip: int = Query(0, ge=0, description="Number of ratings to skip"),
-    limit: int = Query(100, ge=1, le=1000, description="Number of ratings to return")
+    limit: int = Query(100, ge=1, le=1000, description="Number of ratings to return"),
+    rating_service: RatingService = Depends(get_rating_service)
 ):
     """Get ratings for a specific movie"""
     try:
         ratings = await rating_service.get_movie_ratings(movie_id, skip, limit)
-        return ratings
+        return ORJSONResponse(ratings)
     except Exception as e:
         logger.error(f"Error getting ratings for movie {movie_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -57,12 +59,13 @@ async def get_movie_ratings(
 @router.get("/", response_model=List[RatingResponse])
 async def get_all_ratings(
     skip: int = Query(0, ge=0, description="Number of ratings to skip"),
-    limit: int = Query(100, ge=1, le=1000, description="Number of ratings to return")
+    limit: int = Query(100, ge=1, le=1000, description="Number of ratings to return"),
+    rating_service: RatingService = Depends(get_rating_service)
 ):
     """Get all ratings with pagination"""
     try:
         ratings = await rating_service.get_all_ratings(skip, limit)
-        return ratings
+        return ORJSONResponse(ratings)
     except Exception as e:
         logger.error(f"Error getting all ratings: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -70,7 +73,8 @@ async def get_all_ratings(
 @router.delete("/{user_id}/{movie_id}")
 async def delete_rating(
     user_id: int,
-    movie_id: int
+    movie_id: int,
+    rating_service: RatingService = Depends(get_rating_service)
 ):
     """Delete a specific rating"""
     try:
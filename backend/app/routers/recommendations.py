@@ -1,18 +1,17 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import List, Optional
-from app.models.recommendation import RecommendationRequest, RecommendationResponse
+from app.models.recommendation import RecommendationRequest, RecommendationResponse, RecommendationComparisonResponse
 from app.services.recommendation_service import RecommendationService
+from app.container import get_recommendation_service
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize recommendation service
-recommendation_service = RecommendationService()
-
 @router.post("/", response_model=RecommendationResponse)
 async def get_recommendations(
-    request: RecommendationRequest
+    request: RecommendationRequest,
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get movie recommendations for a user"""
     try:
@@ -29,8 +28,9 @@ async def get_recommendations(
 @router.get("/", response_model=RecommendationResponse)
 async def get_recommendations_by_params(
     user_id: int = Query(..., description="User ID"),
-    model_type: str = Query("hybrid", description="Model type (popularity, collaborative, content, hybrid)"),
-    limit: int = Query(10, ge=1, le=50, description="Number of recommendations")
+    model_type: str = Query("hybrid", description="Model type (popularity, collaborative, content, hybrid, als)"),
+    limit: int = Query(10, ge=1, le=50, description="Number of recommendations"),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get movie recommendations using query parameters"""
     try:
@@ -44,10 +44,29 @@ async def get_recommendations_by_params(
         logger.error(f"Error getting recommendations for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/compare", response_model=RecommendationComparisonResponse)
+async def compare_recommendations(
+    user_id: int = Query(..., description="User ID"),
+    models: Optional[str] = Query(None, description="Comma-separated model types (default: every loaded model)"),
+    limit: int = Query(10, ge=1, le=50, description="Number of recommendations per model"),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
+):
+    """Recommendations from several models for one user, with per-model timings"""
+    selected = [part.strip() for part in models.split(",") if part.strip()] if models else None
+    unknown = sorted(set(selected or ()) - set(recommendation_service.models))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown or unloaded models: {', '.join(unknown)}")
+    try:
+        return await recommendation_service.compare_models(user_id, selected, limit)
+    except Exception as e:
+        logger.error(f"Error comparing recommendations for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.post("/predict-rating")
 async def predict_rating(
     user_id: int = Query(..., description="User ID"),
-    movie_id: int = Query(..., description="Movie ID")
+    movie_id: int = Query(..., description="Movie ID"),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Predict rating for a user-movie pair"""
     try:
@@ -60,7 +79,8 @@ async def predict_rating(
 @router.get("/similar/{movie_id}")
 async def get_similar_movies(
     movie_id: int,
-    limit: int = Query(10, ge=1, le=50, description="Number of similar movies")
+    limit: int = Query(10, ge=1, le=50, description="Number of similar movies"),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get movies similar to a given movie"""
     try:
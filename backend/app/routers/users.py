@@ -1,31 +1,32 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path, Depends
 from typing import List
 from app.models.user import UserResponse
 from app.services.user_service import UserService
+from app.container import get_user_service
+from app.utils.serialization import ORJSONResponse
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize user service
-user_service = UserService()
-
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
     skip: int = Query(0, ge=0, description="Number of users to skip"),
-    limit: int = Query(100, ge=1, le=1000, description="Number of users to return")
+    limit: int = Query(100, ge=1, le=1000, description="Number of users to return"),
+    user_service: UserService = Depends(get_user_service)
 ):
     """Get users with pagination"""
     try:
         users = await user_service.get_users(skip, limit)
-        return users
+        return ORJSONResponse(users)
     except Exception as e:
         logger.error(f"Error getting users: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
-    user_id: int = Path(..., description="User ID")
+    user_id: int = Path(..., description="User ID"),
+    user_service: UserService = Depends(get_user_service)
 ):
     """Get a specific user by ID"""
     try:
@@ -41,7 +42,8 @@ async def get_user(
 
 @router.get("/{user_id}/stats")
 async def get_user_stats(
-    user_id: int = Path(..., description="User ID")
+    user_id: int = Path(..., description="User ID"),
+    user_service: UserService = Depends(get_user_service)
 ):
     """Get user statistics"""
     try:
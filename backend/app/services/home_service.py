@@ -0,0 +1,198 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from datetime import datetime
+from app.indexes.catalog import CatalogIndex
+from app.indexes.trending import TrendingIndex
+from app.repositories.ratings import RatingRepository
+from app.services.movie_service import MovieService, MOVIE_PROJECTION, MOVIE_TEMPLATE
+from app.services.recommendation_service import RecommendationService
+from app.utils.serialization import shape_documents
+from collections import Counter
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+HOME_SECTIONS = ("recommendations", "popular", "trending", "recently_rated", "genres")
+SECTION_TITLES = {
+    "recommendations": "Recommended for you",
+    "popular": "Popular",
+    "trending": "Trending now",
+    "recently_rated": "Recently rated"
+}
+# Sections built from the user's rating history
+HISTORY_SECTIONS = {"recommendations", "recently_rated", "genres"}
+
+class HomeService:
+    """Builds the home page bundle: every section concurrently, one history read, one movie hydration"""
+
+    def __init__(
+        self,
+        movies: MovieService,
+        recommendations: RecommendationService,
+        repository: RatingRepository,
+        catalog: Optional[CatalogIndex] = None,
+        trending: Optional[TrendingIndex] = None
+    ):
+        self.movies = movies
+        self.recommendations = recommendations
+        self.repository = repository
+        self.catalog = catalog
+        self.trending = trending
+
+    @property
+    def snapshot(self):
+        return self.catalog.snapshot if self.catalog is not None else None
+
+    async def get_home(
+        self,
+        user_id: int,
+        limit: int = 10,
+        sections: Optional[Sequence[str]] = None,
+        fields: Optional[Sequence[str]] = None,
+        model_type: str = "hybrid",
+        n_genres: int = 3
+    ) -> Dict[str, Any]:
+        """Home page sections for a user, with the movies they reference sent once
+
+        `sections` selects sections (default all); `fields` selects movie fields
+        (movie_id is always included). A failing section is left out rather
+        than failing the page.
+        """
+        try:
+            names = [name for name in HOME_SECTIONS if sections is None or name in sections]
+            # Read once, shared by every section that needs it, and only if one does
+            history = None
+            if HISTORY_SECTIONS.intersection(names):
+                history = asyncio.ensure_future(self.repository.user_history(user_id))
+            # Movie documents already at hand, so hydration does not fetch them again
+            known: Dict[int, Dict[str, Any]] = {}
+            builders = {
+                "recommendations": lambda: self._recommendations(user_id, limit, model_type, history),
+                "popular": lambda: self._popular(limit, known),
+                "trending": lambda: self._trending(limit),
+                "recently_rated": lambda: self._recently_rated(limit, history),
+                "genres": lambda: self._genre_rows(limit, n_genres, history, known)
+            }
+            try:
+                results = await asyncio.gather(*(builders[name]() for name in names), return_exceptions=True)
+            finally:
+                if history is not None:
+                    history.cancel()
+
+            built = []
+            for name, result in zip(names, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Home section {name} failed for user {user_id}: {result}")
+                    continue
+                built.extend(result if isinstance(result, list) else [result])
+
+            movie_ids = {item["movie_id"] for section in built for item in section["items"]}
+            movies = await self._hydrate(movie_ids, known, fields)
+            # Model rankings can name movies missing from the catalog
+            for section in built:
+                section["items"] = [item for item in section["items"] if item["movie_id"] in movies]
+            return {
+                "user_id": user_id,
+                "sections": built,
+                "movies": {str(movie_id): movie for movie_id, movie in movies.items()},
+                "generated_at": datetime.utcnow()
+            }
+
+        except Exception as e:
+            logger.error(f"Error building home page for user {user_id}: {e}")
+            raise
+
+    @staticmethod
+    def _section(name: str, items: List[Dict[str, Any]], **extra: Any) -> Dict[str, Any]:
+        return {"name": name, "title": extra.pop("title", SECTION_TITLES.get(name, name)), "items": items, **extra}
+
+    async def _recommendations(self, user_id: int, limit: int, model_type: str, history: asyncio.Future):
+        ratings = await history
+        rated = [r["movie_id"] for r in sorted(ratings, key=lambda r: r["rating"], reverse=True)]
+        response = await self.recommendations.recommend(user_id, model_type, limit, history=rated)
+        items = [
+            {"movie_id": r.movie_id, "score": r.score, "reason": r.reason}
+            for r in response.recommendations
+        ]
+        return self._section(
+            "recommendations", items, model_used=response.model_used, served_by=response.served_by
+        )
+
+    async def _popular(self, limit: int, known: Dict[int, Dict[str, Any]]):
+        ranking = self.recommendations.popular_ranking
+        if ranking:
+            items = [{"movie_id": movie_id, "score": round(score, 4)} for movie_id, score in ranking[:limit]]
+        else:
+            movies = await self.movies.get_popular_movies(limit)
+            known.update((movie["movie_id"], movie) for movie in movies)
+            items = [{"movie_id": movie["movie_id"]} for movie in movies]
+        return self._section("popular", items)
+
+    async def _trending(self, limit: int):
+        if self.trending is None:
+            return self._section("trending", [])
+        items = [{"movie_id": movie_id, "score": round(score, 4)} for movie_id, score in self.trending.counters.top(limit)]
+        return self._section("trending", items)
+
+    async def _recently_rated(self, limit: int, history: asyncio.Future):
+        ratings = sorted(await history, key=lambda r: r.get("created_at") or datetime.min, reverse=True)[:limit]
+        items = [{"movie_id": r["movie_id"], "rating": r["rating"]} for r in ratings]
+        return self._section("recently_rated", items)
+
+    async def _genre_rows(self, limit: int, n_genres: int, history: asyncio.Future, known: Dict[int, Dict[str, Any]]):
+        """Most-voted unseen movies in the user's most rated genres"""
+        ratings = await history
+        rated = {r["movie_id"] for r in ratings}
+        rated_movies = await self._hydrate(rated, known)
+        genres = Counter(
+            genre.strip()
+            for movie in rated_movies.values()
+            for genre in re.split(r"[|,]", movie.get("genre") or "")
+            if genre.strip()
+        )
+
+        rows = []
+        for genre, _ in genres.most_common(n_genres):
+            pattern = re.escape(genre)
+            snapshot = self.snapshot
+            if snapshot is not None:
+                movies = snapshot.query(limit=limit + len(rated), genre=pattern, sort_by="vote_count", sort_order="desc")
+            else:
+                movies = await self.movies.get_movies(
+                    limit=limit + len(rated), genre=pattern, sort_by="vote_count", sort_order="desc"
+                )
+            unseen = [movie for movie in movies if movie["movie_id"] not in rated][:limit]
+            known.update((movie["movie_id"], movie) for movie in unseen)
+            rows.append(self._section(
+                "genres", [{"movie_id": movie["movie_id"]} for movie in unseen], title=genre, genre=genre
+            ))
+        return rows
+
+    async def _hydrate(
+        self,
+        movie_ids: Iterable[int],
+        known: Dict[int, Dict[str, Any]],
+        fields: Optional[Sequence[str]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """Movie documents by id from the catalog snapshot, documents at hand, or one $in query"""
+        movies: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        snapshot = self.snapshot
+        for movie_id in movie_ids:
+            movie = snapshot.get(movie_id) if snapshot is not None else known.get(movie_id)
+            if movie is not None:
+                movies[movie_id] = movie
+            else:
+                missing.append(movie_id)
+
+        if missing and snapshot is None:
+            cursor = self.movies.movies_collection.find({"movie_id": {"$in": missing}}, MOVIE_PROJECTION)
+            for movie in shape_documents(await cursor.to_list(None), MOVIE_TEMPLATE):
+                movies[movie["movie_id"]] = movie
+                known[movie["movie_id"]] = movie
+
+        if fields:
+            keep = set(fields) | {"movie_id"}
+            movies = {movie_id: {k: v for k, v in movie.items() if k in keep} for movie_id, movie in movies.items()}
+        return movies
@@ -1,19 +1,46 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.movie import MovieResponse, MovieStats
-from app.database import get_movies_collection, get_ratings_collection
-from motor.motor_asyncio import AsyncIOMotorCollection
+from app.database import get_database
+from app.config import Settings, get_settings
+from app.cache import TieredCache, get_cache
+from app.indexes.catalog import CatalogIndex, MovieCatalog
+from app.indexes.trending import TrendingIndex
+from app.utils.singleflight import SingleFlight, coalesce
+from app.utils.serialization import response_projection, response_template, shape_documents
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+MOVIE_PROJECTION = response_projection(MovieResponse)
+MOVIE_TEMPLATE = response_template(MovieResponse, title="", genre="")
+
 class MovieService:
     """Service for movie operations"""
     
-    def __init__(self):
-        self.movies_collection = get_movies_collection()
-        self.ratings_collection = get_ratings_collection()
+    def __init__(
+        self,
+        database: Optional[AsyncIOMotorDatabase] = None,
+        cache: Optional[TieredCache] = None,
+        settings: Optional[Settings] = None,
+        catalog: Optional[CatalogIndex] = None,
+        trending: Optional[TrendingIndex] = None
+    ):
+        database = get_database() if database is None else database
+        self.movies_collection: AsyncIOMotorCollection = database.movies
+        self.ratings_collection: AsyncIOMotorCollection = database.ratings
+        self.flights = SingleFlight(ttl=(settings or get_settings()).SINGLE_FLIGHT_TTL_SECONDS)
+        self.cache = get_cache() if cache is None else cache
+        self.catalog = catalog
+        self.trending = trending
+    
+    @property
+    def snapshot(self) -> Optional[MovieCatalog]:
+        """Current in-memory catalog, or None to query MongoDB"""
+        return self.catalog.snapshot if self.catalog is not None else None
     
+    @coalesce
     async def get_movies(
         self,
         skip: int = 0,
@@ -22,9 +49,12 @@ class MovieService:
         search: Optional[str] = None,
         sort_by: str = "title",
         sort_order: str = "asc"
-    ) -> List[MovieResponse]:
+    ) -> List[Dict[str, Any]]:
         """Get movies with filtering and pagination"""
         try:
+            if self.snapshot is not None:
+                return self.snapshot.query(skip, limit, genre, search, sort_by, sort_order)
+            
             # Build query
             query = {}
             
@@ -39,53 +69,43 @@ class MovieService:
             sort_criteria = [(sort_by, sort_direction)]
             
             # Execute query
-            cursor = self.movies_collection.find(query).sort(sort_criteria).skip(skip).limit(limit)
-            movies = []
-            
-            async for doc in cursor:
-                movie = MovieResponse(
-                    movie_id=doc.get("movie_id", doc.get("_id")),
-                    title=doc.get("title", ""),
-                    genre=doc.get("genre", ""),
-                    release_date=doc.get("release_date"),
-                    overview=doc.get("overview"),
-                    poster_path=doc.get("poster_path"),
-                    vote_average=doc.get("vote_average"),
-                    vote_count=doc.get("vote_count")
-                )
-                movies.append(movie)
-            
-            return movies
+            cursor = self.movies_collection.find(query, MOVIE_PROJECTION).sort(sort_criteria).skip(skip).limit(limit)
+            return shape_documents(await cursor.to_list(length=limit), MOVIE_TEMPLATE)
             
         except Exception as e:
             logger.error(f"Error getting movies: {e}")
             raise
     
+    @coalesce
     async def get_movie_by_id(self, movie_id: int) -> Optional[MovieResponse]:
         """Get movie by ID"""
         try:
-            doc = await self.movies_collection.find_one({"movie_id": movie_id})
+            # Movies added since the last snapshot fall through to the cache and MongoDB
+            doc = self.snapshot.get(movie_id) if self.snapshot is not None else None
+            if doc:
+                return MovieResponse(**doc)
+            
+            doc = await self.cache.get_or_set("movie", movie_id, lambda: self._find_movie(movie_id))
             
             if not doc:
                 return None
             
-            return MovieResponse(
-                movie_id=doc.get("movie_id", doc.get("_id")),
-                title=doc.get("title", ""),
-                genre=doc.get("genre", ""),
-                release_date=doc.get("release_date"),
-                overview=doc.get("overview"),
-                poster_path=doc.get("poster_path"),
-                vote_average=doc.get("vote_average"),
-                vote_count=doc.get("vote_count")
-            )
+            return MovieResponse(**doc)
             
         except Exception as e:
             logger.error(f"Error getting movie {movie_id}: {e}")
             raise
     
-    async def get_popular_movies(self, limit: int = 20) -> List[MovieResponse]:
+    async def _find_movie(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        doc = await self.movies_collection.find_one({"movie_id": movie_id}, MOVIE_PROJECTION)
+        return shape_documents([doc], MOVIE_TEMPLATE)[0] if doc else None
+    
+    @coalesce
+    async def get_popular_movies(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get popular movies based on ratings"""
+        return await self.cache.get_or_set("popular_movies", limit, lambda: self._aggregate_popular_movies(limit))
+    
+    async def _aggregate_popular_movies(self, limit: int) -> List[Dict[str, Any]]:
         try:
             # Aggregate to get movies with highest average ratings
             pipeline = [
@@ -113,78 +133,70 @@ class MovieService:
                 },
                 {
                     "$limit": limit
+                },
+                {
+                    "$project": {
+                        **MOVIE_PROJECTION,
+                        "vote_average": "$avg_rating",
+                        "vote_count": "$rating_count"
+                    }
                 }
             ]
             
             cursor = self.movies_collection.aggregate(pipeline)
-            movies = []
-            
-            async for doc in cursor:
-                movie = MovieResponse(
-                    movie_id=doc.get("movie_id", doc.get("_id")),
-                    title=doc.get("title", ""),
-                    genre=doc.get("genre", ""),
-                    release_date=doc.get("release_date"),
-                    overview=doc.get("overview"),
-                    poster_path=doc.get("poster_path"),
-                    vote_average=doc.get("avg_rating", doc.get("vote_average")),
-                    vote_count=doc.get("rating_count", doc.get("vote_count"))
-                )
-                movies.append(movie)
-            
-            return movies
+            return shape_documents(await cursor.to_list(length=limit), MOVIE_TEMPLATE)
             
         except Exception as e:
             logger.error(f"Error getting popular movies: {e}")
             raise
     
-    async def get_movies_by_genre(self, genre: str, limit: int = 20) -> List[MovieResponse]:
+    async def get_trending_movies(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get movies with the most recent rating activity, from memory"""
+        movie_ids = self.trending.top_ids(limit) if self.trending is not None else []
+        if not movie_ids:
+            return await self.get_popular_movies(limit)
+        try:
+            snapshot = self.snapshot
+            if snapshot is not None:
+                movies = [snapshot.get(movie_id) for movie_id in movie_ids]
+                return [movie for movie in movies if movie is not None]
+            docs = await self.movies_collection.find({"movie_id": {"$in": movie_ids}}, MOVIE_PROJECTION).to_list(None)
+            by_id = {doc["movie_id"]: doc for doc in shape_documents(docs, MOVIE_TEMPLATE)}
+            return [by_id[movie_id] for movie_id in movie_ids if movie_id in by_id]
+            
+        except Exception as e:
+            logger.error(f"Error getting trending movies: {e}")
+            raise
+    
+    @coalesce
+    async def get_movies_by_genre(self, genre: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Get movies by genre"""
+        if self.snapshot is not None:
+            return self.snapshot.query(limit=limit, genre=genre, sort_by=None)
+        return await self.cache.get_or_set(
+            "genre_movies", f"{genre.lower()}:{limit}", lambda: self._find_movies_by_genre(genre, limit)
+        )
+    
+    async def _find_movies_by_genre(self, genre: str, limit: int) -> List[Dict[str, Any]]:
         try:
             query = {"genre": {"$regex": genre, "$options": "i"}}
-            cursor = self.movies_collection.find(query).limit(limit)
-            movies = []
-            
-            async for doc in cursor:
-                movie = MovieResponse(
-                    movie_id=doc.get("movie_id", doc.get("_id")),
-                    title=doc.get("title", ""),
-                    genre=doc.get("genre", ""),
-                    release_date=doc.get("release_date"),
-                    overview=doc.get("overview"),
-                    poster_path=doc.get("poster_path"),
-                    vote_average=doc.get("vote_average"),
-                    vote_count=doc.get("vote_count")
-                )
-                movies.append(movie)
-            
-            return movies
+            cursor = self.movies_collection.find(query, MOVIE_PROJECTION).limit(limit)
+            return shape_documents(await cursor.to_list(length=limit), MOVIE_TEMPLATE)
             
         except Exception as e:
             logger.error(f"Error getting movies by genre {genre}: {e}")
             raise
     
-    async def search_movies(self, query: str, limit: int = 20) -> List[MovieResponse]:
+    @coalesce
+    async def search_movies(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Search movies by title"""
         try:
+            if self.snapshot is not None:
+                return self.snapshot.query(limit=limit, search=query, sort_by=None)
+            
             search_query = {"title": {"$regex": query, "$options": "i"}}
-            cursor = self.movies_collection.find(search_query).limit(limit)
-            movies = []
-            
-            async for doc in cursor:
-                movie = MovieResponse(
-                    movie_id=doc.get("movie_id", doc.get("_id")),
-                    title=doc.get("title", ""),
-                    genre=doc.get("genre", ""),
-                    release_date=doc.get("release_date"),
-                    overview=doc.get("overview"),
-                    poster_path=doc.get("poster_path"),
-                    vote_average=doc.get("vote_average"),
-                    vote_count=doc.get("vote_count")
-                )
-                movies.append(movie)
-            
-            return movies
+            cursor = self.movies_collection.find(search_query, MOVIE_PROJECTION).limit(limit)
+            return shape_documents(await cursor.to_list(length=limit), MOVIE_TEMPLATE)
             
         except Exception as e:
             logger.error(f"Error searching movies with query '{query}': {e}")
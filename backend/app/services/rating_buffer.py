@@ -0,0 +1,222 @@
+"""Write-behind buffer for rating writes
+
+Ratings are appended to a local log and acknowledged immediately; repeated
+writes to the same (user, movie) are coalesced in memory and flushed to MongoDB
+as one unordered bulk_write when the batch is full or the flush interval ends.
+
+Each worker appends to its own log file and holds an exclusive lock on it. On
+startup, log files whose lock is free (left behind by a stopped worker) are
+replayed and flushed. A log file is deleted only after everything written to it
+has reached MongoDB. Set fsync to survive power loss as well as process crashes.
+
+A flushed rating keeps the time it was accepted as ``created_at`` but gets the
+flush time as ``updated_at``: readers that follow ``updated_at`` (change feed
+polling, snapshot catch-up) may already have read past the accept time. The
+flush that creates a rating also sets ``inserted_at``, so a polled document
+whose ``inserted_at`` equals its ``updated_at`` is a new rating.
+"""
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+from pymongo import DeleteOne, UpdateOne
+from motor.motor_asyncio import AsyncIOMotorCollection
+import asyncio
+import fcntl
+import glob
+import logging
+import os
+import time
+import orjson
+
+logger = logging.getLogger(__name__)
+
+LOG_PATTERN = "ratings-*.log"
+
+
+class _LogFile:
+    """An append-only, exclusively locked log file"""
+
+    def __init__(self, path: str, handle):
+        self.path = path
+        self.handle = handle
+
+    @classmethod
+    def open(cls, path: str) -> Optional["_LogFile"]:
+        """Open and lock a log file, or None if another process holds it"""
+        handle = open(path, "ab+")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+        return cls(path, handle)
+
+    def append(self, record: dict):
+        self.handle.write(orjson.dumps(record) + b"\n")
+        self.handle.flush()
+
+    def read(self) -> List[dict]:
+        self.handle.seek(0)
+        records = []
+        for line in self.handle:
+            try:
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # Torn final line from a crash mid-write
+                logger.warning(f"Skipping unreadable line in {self.path}")
+        return records
+
+    def fsync(self):
+        try:
+            os.fsync(self.handle.fileno())
+        except (OSError, ValueError):
+            # Already flushed and closed by a concurrent flush
+            pass
+
+    def delete(self):
+        os.remove(self.path)
+        self.handle.close()
+
+
+class RatingWriteBuffer:
+    """Coalescing write-behind buffer for the ratings collection"""
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        log_dir: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        fsync: bool = False
+    ):
+        self.collection = collection
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        # Called with each flushed batch once it is in MongoDB; records carry
+        # "inserted", True when their write created the rating
+        self.on_flush: Optional[Callable[[List[dict]], Awaitable[None]]] = None
+        self.pending: Dict[Tuple[int, int], dict] = {}
+        self._log: Optional[_LogFile] = None
+        # Logs whose records are not all in MongoDB yet
+        self._unflushed: List[_LogFile] = []
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._size_flush: Optional[asyncio.Task] = None
+        self._sequence = 0
+
+    def _new_log(self) -> _LogFile:
+        self._sequence += 1
+        path = os.path.join(self.log_dir, f"ratings-{time.time_ns()}-{os.getpid()}-{self._sequence}.log")
+        return _LogFile.open(path)
+
+    async def start(self):
+        """Replay logs left by stopped workers, then start the flush timer"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        recovered = []
+        for path in sorted(glob.glob(os.path.join(self.log_dir, LOG_PATTERN))):
+            log = _LogFile.open(path)
+            if log is None:
+                continue  # Owned by a running worker
+            records = log.read()
+            recovered.extend(records)
+            self._unflushed.append(log)
+            logger.info(f"Recovered {len(records)} buffered rating writes from {path}")
+        # Logs of several workers interleave, so the latest write to a rating is the one accepted last
+        for record in sorted(recovered, key=lambda r: datetime.fromisoformat(r["at"])):
+            self._stage(record)
+        self._log = self._new_log()
+        if self.pending:
+            await self.flush()
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    def _stage(self, record: dict):
+        self.pending[(record["user_id"], record["movie_id"])] = record
+
+    async def _write(self, record: dict):
+        log = self._log
+        log.append(record)
+        self._stage(record)
+        if self.fsync:
+            await asyncio.to_thread(log.fsync)
+        if len(self.pending) >= self.batch_size and (self._size_flush is None or self._size_flush.done()):
+            self._size_flush = asyncio.create_task(self.flush())
+
+    async def put(self, user_id: int, movie_id: int, rating: float, at: datetime):
+        """Accept a rating create or update"""
+        await self._write({"op": "set", "user_id": user_id, "movie_id": movie_id, "rating": rating, "at": at.isoformat()})
+
+    async def delete(self, user_id: int, movie_id: int, at: datetime):
+        """Accept a rating deletion"""
+        await self._write({"op": "delete", "user_id": user_id, "movie_id": movie_id, "at": at.isoformat()})
+
+    def get(self, user_id: int, movie_id: int) -> Optional[dict]:
+        """Latest unflushed write for a (user, movie), if any"""
+        return self.pending.get((user_id, movie_id))
+
+    async def flush(self):
+        """Write all pending ratings to MongoDB in one unordered bulk_write"""
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            # Swap batch and log together so later writes land in the next batch
+            batch, self.pending = self.pending, {}
+            self._unflushed.append(self._log)
+            self._log = self._new_log()
+            done = list(self._unflushed)
+
+            records = list(batch.values())
+            flushed_at = datetime.utcnow()
+            try:
+                result = await self.collection.bulk_write(
+                    [self._to_operation(r, flushed_at) for r in records], ordered=False
+                )
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} buffered ratings: {e}")
+                # Requeue without overwriting newer writes; logs stay until a flush succeeds
+                for key, record in batch.items():
+                    self.pending.setdefault(key, record)
+                return
+
+            for log in done:
+                log.delete()
+                self._unflushed.remove(log)
+
+        # Upserts that created a rating, as opposed to changing an existing one
+        inserted = set(result.upserted_ids)
+        flushed = [{**record, "inserted": i in inserted} for i, record in enumerate(records)]
+        if self.on_flush is not None:
+            try:
+                await self.on_flush(flushed)
+            except Exception as e:
+                logger.error(f"Error applying flushed ratings: {e}")
+
+    @staticmethod
+    def _to_operation(record: dict, flushed_at: datetime):
+        key = {"user_id": record["user_id"], "movie_id": record["movie_id"]}
+        if record["op"] == "delete":
+            return DeleteOne(key)
+        at = datetime.fromisoformat(record["at"])
+        return UpdateOne(
+            key,
+            {
+                "$set": {"rating": record["rating"], "updated_at": flushed_at},
+                "$setOnInsert": {"created_at": at, "inserted_at": flushed_at}
+            },
+            upsert=True
+        )
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """Stop the timer and flush what is left"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        if self._log is not None and not self.pending:
+            self._log.delete()
+            self._log = None
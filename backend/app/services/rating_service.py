@@ -1,17 +1,44 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.rating import RatingResponse
-from app.database import get_ratings_collection
+from app.database import get_database
+from app.cache import TieredCache, get_cache
+from app.indexes.seen import SeenIndex
+from app.indexes.trending import TrendingIndex
+from app.services.rating_buffer import RatingWriteBuffer
+from app.repositories.ratings import RatingRepository
+from app.utils.serialization import response_projection, response_template, shape_documents
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.collection import Collection
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+RATING_PROJECTION = response_projection(RatingResponse)
+
 class RatingService:
     """Service for rating operations"""
     
-    def __init__(self):
-        self.ratings_collection: Collection = get_ratings_collection()
+    def __init__(
+        self,
+        database: Optional[AsyncIOMotorDatabase] = None,
+        cache: Optional[TieredCache] = None,
+        seen: Optional[SeenIndex] = None,
+        buffer: Optional[RatingWriteBuffer] = None,
+        repository: Optional[RatingRepository] = None,
+        trending: Optional[TrendingIndex] = None
+    ):
+        database = get_database() if database is None else database
+        self.ratings_collection: Collection = database.ratings
+        self.repository = repository or RatingRepository(database)
+        self.cache = get_cache() if cache is None else cache
+        self.seen = seen
+        # Only set when no change feed counts new ratings for us
+        self.trending = trending
+        # Optional write-behind mode: writes are acknowledged once logged locally
+        self.buffer = buffer
+        if buffer is not None:
+            buffer.on_flush = self._apply_flushed
     
     async def create_or_update_rating(
         self, 
@@ -21,38 +48,29 @@ class RatingService:
     ) -> RatingResponse:
         """Create or update a rating"""
         try:
-            # Check if rating already exists
-            existing_rating = await self.ratings_collection.find_one({
-                "user_id": user_id,
-                "movie_id": movie_id
-            })
+            if self.buffer is not None:
+                # Whether this creates the rating is only known once flushed, so
+                # created_at is the time the write was accepted, even for updates
+                now = datetime.utcnow()
+                await self.buffer.put(user_id, movie_id, rating, now)
+                if self.seen is not None:
+                    self.seen.add(user_id, movie_id)
+                return RatingResponse(user_id=user_id, movie_id=movie_id, rating=rating, created_at=now)
             
-            rating_data = {
-                "user_id": user_id,
-                "movie_id": movie_id,
-                "rating": rating,
-                "updated_at": datetime.utcnow()
-            }
+            stored = await self.repository.upsert(user_id, movie_id, rating, datetime.utcnow())
             
-            if existing_rating:
-                # Update existing rating
-                await self.ratings_collection.update_one(
-                    {"user_id": user_id, "movie_id": movie_id},
-                    {"$set": rating_data}
-                )
-                created_at = existing_rating.get("created_at", datetime.utcnow())
-            else:
-                # Create new rating
-                rating_data["created_at"] = datetime.utcnow()
-                await self.ratings_collection.insert_one(rating_data)
-                created_at = rating_data["created_at"]
+            if self.seen is not None:
+                self.seen.add(user_id, movie_id)
+            if self.trending is not None and stored.get("created_at") == stored["updated_at"]:
+                self.trending.record(movie_id, stored["updated_at"])
+            await self._invalidate_user(user_id)
             
             return RatingResponse(
                 user_id=user_id,
                 movie_id=movie_id,
                 rating=rating,
-                timestamp=existing_rating.get("timestamp") if existing_rating else None,
-                created_at=created_at
+                timestamp=stored.get("timestamp"),
+                created_at=stored.get("created_at") or stored["updated_at"]
             )
             
         except Exception as e:
@@ -64,23 +82,12 @@ class RatingService:
         user_id: int, 
         skip: int = 0, 
         limit: int = 100
-    ) -> List[RatingResponse]:
+    ) -> List[Dict[str, Any]]:
         """Get ratings for a specific user"""
         try:
-            cursor = self.ratings_collection.find({"user_id": user_id}).skip(skip).limit(limit)
-            ratings = []
-            
-            async for doc in cursor:
-                rating = RatingResponse(
-                    user_id=doc["user_id"],
-                    movie_id=doc["movie_id"],
-                    rating=doc["rating"],
-                    timestamp=doc.get("timestamp"),
-                    created_at=doc.get("created_at", datetime.utcnow())
-                )
-                ratings.append(rating)
-            
-            return ratings
+            ratings = await self.repository.user_ratings(user_id, skip, limit)
+            template = response_template(RatingResponse, created_at=datetime.utcnow())
+            return shape_documents(ratings, template)
             
         except Exception as e:
             logger.error(f"Error getting ratings for user {user_id}: {e}")
@@ -91,23 +98,12 @@ class RatingService:
         movie_id: int, 
         skip: int = 0, 
         limit: int = 100
-    ) -> List[RatingResponse]:
+    ) -> List[Dict[str, Any]]:
         """Get ratings for a specific movie"""
         try:
-            cursor = self.ratings_collection.find({"movie_id": movie_id}).skip(skip).limit(limit)
-            ratings = []
-            
-            async for doc in cursor:
-                rating = RatingResponse(
-                    user_id=doc["user_id"],
-                    movie_id=doc["movie_id"],
-                    rating=doc["rating"],
-                    timestamp=doc.get("timestamp"),
-                    created_at=doc.get("created_at", datetime.utcnow())
-                )
-                ratings.append(rating)
-            
-            return ratings
+            cursor = self.ratings_collection.find({"movie_id": movie_id}, RATING_PROJECTION).skip(skip).limit(limit)
+            template = response_template(RatingResponse, created_at=datetime.utcnow())
+            return shape_documents(await cursor.to_list(length=limit), template)
             
         except Exception as e:
             logger.error(f"Error getting ratings for movie {movie_id}: {e}")
@@ -117,23 +113,12 @@ class RatingService:
         self, 
         skip: int = 0, 
         limit: int = 100
-    ) -> List[RatingResponse]:
+    ) -> List[Dict[str, Any]]:
         """Get all ratings with pagination"""
         try:
-            cursor = self.ratings_collection.find().skip(skip).limit(limit)
-            ratings = []
-            
-            async for doc in cursor:
-                rating = RatingResponse(
-                    user_id=doc["user_id"],
-                    movie_id=doc["movie_id"],
-                    rating=doc["rating"],
-                    timestamp=doc.get("timestamp"),
-                    created_at=doc.get("created_at", datetime.utcnow())
-                )
-                ratings.append(rating)
-            
-            return ratings
+            cursor = self.ratings_collection.find({}, RATING_PROJECTION).skip(skip).limit(limit)
+            template = response_template(RatingResponse, created_at=datetime.utcnow())
+            return shape_documents(await cursor.to_list(length=limit), template)
             
         except Exception as e:
             logger.error(f"Error getting all ratings: {e}")
@@ -142,13 +127,48 @@ class RatingService:
     async def delete_rating(self, user_id: int, movie_id: int) -> bool:
         """Delete a specific rating"""
         try:
-            result = await self.ratings_collection.delete_one({
-                "user_id": user_id,
-                "movie_id": movie_id
-            })
+            if self.buffer is not None:
+                return await self._buffer_delete(user_id, movie_id)
+            
+            deleted = await self.repository.delete(user_id, movie_id)
+            
+            if deleted:
+                if self.seen is not None:
+                    self.seen.remove(user_id, movie_id)
+                await self._invalidate_user(user_id)
             
-            return result.deleted_count > 0
+            return deleted
             
         except Exception as e:
             logger.error(f"Error deleting rating: {e}")
             raise
+    
+    async def _invalidate_user(self, user_id: int):
+        """Orphan cached recommendations for a user whose ratings changed"""
+        await self.cache.bump_generation("recommendations", user_id)
+    
+    async def _buffer_delete(self, user_id: int, movie_id: int) -> bool:
+        """Delete through the write buffer; the rating must exist in the buffer or MongoDB"""
+        pending = self.buffer.get(user_id, movie_id)
+        if pending is not None:
+            exists = pending["op"] == "set"
+        else:
+            exists = await self.repository.find(user_id, movie_id) is not None
+        
+        if exists:
+            await self.buffer.delete(user_id, movie_id, datetime.utcnow())
+            if self.seen is not None:
+                self.seen.remove(user_id, movie_id)
+        return exists
+    
+    async def _apply_flushed(self, records: List[Dict[str, Any]]):
+        """Update derived state once per flushed batch"""
+        await self.repository.apply_flushed(records)
+        if self.trending is not None:
+            # Only new ratings count towards trending, as on the unbuffered path
+            for record in records:
+                if record.get("inserted"):
+                    self.trending.record(record["movie_id"], datetime.fromisoformat(record["at"]))
+        for user_id in {record["user_id"] for record in records}:
+            await self._invalidate_user(user_id)
+        await self.cache.invalidate("popular_movies")
@@ -1,166 +1,413 @@
-from typing import List, Optional
-from app.models.recommendation import RecommendationResponse, MovieRecommendation
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from app.models.recommendation import (
+    RecommendationResponse, MovieRecommendation, ModelComparison, RecommendationComparisonResponse
+)
 from app.models.rating import RatingPrediction
-from app.database import get_movies_collection, get_ratings_collection
+from app.database import get_database
+from app.config import Settings, get_settings
+from app.cache import TieredCache, get_cache
+from app.indexes.catalog import CatalogIndex
+from app.indexes.seen import SeenIndex
+from app.indexes.trending import TrendingIndex
+from app.indexes.cohorts import CohortIndex, cohort_label
+from app.repositories.ratings import RatingRepository
+from app.ml.model_store import load_serving_models
+from app.ml.pipeline import RecommendationPipeline
+from app.ml.scoring import ScoringExecutor
+from app.ml.text_index import TextSimilarityIndex, load_text_index
+from app.utils.singleflight import SingleFlight, coalesce
+from app.utils.deadline import Deadline, DeadlineExceeded
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.collection import Collection
-import pickle
 import numpy as np
-import pandas as pd
 from datetime import datetime
+from functools import partial
+import asyncio
 import logging
-import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Cheap models tried when the requested one fails or runs out of time
+FALLBACK_MODELS = ("content", "collaborative")
+# Precomputed popularity list served as the last cascade stage
+POPULAR_LIST_SIZE = 500
+# Share of the remaining budget each stage may use before it is cancelled
+CACHE_STAGE_SHARE = 0.2
+HISTORY_STAGE_SHARE = 0.3
+MODEL_STAGE_SHARE = 0.7
+
 class RecommendationService:
     """Service for recommendation operations"""
     
-    def __init__(self):
-        self.movies_collection: Collection = get_movies_collection()
-        self.ratings_collection: Collection = get_ratings_collection()
+    def __init__(
+        self,
+        database: Optional[AsyncIOMotorDatabase] = None,
+        cache: Optional[TieredCache] = None,
+        settings: Optional[Settings] = None,
+        catalog: Optional[CatalogIndex] = None,
+        seen: Optional[SeenIndex] = None,
+        repository: Optional[RatingRepository] = None,
+        trending: Optional[TrendingIndex] = None,
+        cohorts: Optional[CohortIndex] = None
+    ):
+        database = get_database() if database is None else database
+        self.settings = settings or get_settings()
+        self.catalog = catalog
+        self.seen = seen
+        self.trending = trending
+        self.cohorts = cohorts
+        self.movies_collection: Collection = database.movies
+        self.ratings_collection: Collection = database.ratings
+        self.ratings = repository or RatingRepository(database)
         self.models = {}
+        self.popular_ranking = []
+        self.popular_ids = np.empty(0, dtype=np.int64)
+        self.scoring: Optional[ScoringExecutor] = None
+        self.text_index: Optional[TextSimilarityIndex] = None
+        self.flights = SingleFlight(ttl=self.settings.SINGLE_FLIGHT_TTL_SECONDS)
+        self.cache = get_cache() if cache is None else cache
         self.load_models()
     
     def load_models(self):
         """Load ML models from files"""
         try:
-            models_path = "ml_models"
-            if os.path.exists(models_path):
-                # Load saved models if they exist
-                model_files = [
-                    "popularity_model.pkl",
-                    "user_cf_model.pkl",
-                    "item_cf_model.pkl",
-                    "svd_model.pkl",
-                    "content_model.pkl",
-                    "hybrid_model.pkl"
-                ]
-                
-                for model_file in model_files:
-                    model_path = os.path.join(models_path, model_file)
-                    if os.path.exists(model_path):
-                        with open(model_path, 'rb') as f:
-                            model_name = model_file.replace('.pkl', '')
-                            self.models[model_name] = pickle.load(f)
-                            logger.info(f"Loaded model: {model_name}")
-                
+            settings = self.settings
+            loader = partial(
+                load_serving_models,
+                settings.MODELS_PATH,
+                {"svd": settings.HYBRID_SVD_WEIGHT, "content": settings.HYBRID_CONTENT_WEIGHT},
+                settings.HYBRID_CANDIDATES_PER_SOURCE,
+                precision=settings.MODEL_PRECISION
+            )
+            self.models = loader()
+            self.scoring = ScoringExecutor(
+                self.models,
+                loader=loader,
+                thread_workers=settings.SCORING_THREAD_WORKERS,
+                process_workers=settings.SCORING_PROCESS_WORKERS,
+                queue_size=settings.SCORING_QUEUE_SIZE,
+                timeout=settings.SCORING_TIMEOUT_SECONDS
+            )
+
+            if "popularity" in self.models:
+                self.popular_ranking = self.models["popularity"].recommend(None, POPULAR_LIST_SIZE)
+                self.popular_ids = np.array([movie_id for movie_id, _ in self.popular_ranking], dtype=np.int64)
+
+            self.text_index = load_text_index(settings.MODELS_PATH)
+
+            if self.models:
                 logger.info(f"Loaded {len(self.models)} models")
             else:
-                logger.warning("Models directory not found, using mock recommendations")
-                
+                logger.warning("No models loaded, serving popular movies")
+
         except Exception as e:
             logger.error(f"Error loading models: {e}")
-            # Continue without models - will use mock data
+            # Continue without models - will serve popular movies
     
+    @coalesce
     async def get_recommendations(
         self, 
         user_id: int, 
         model_type: str = "hybrid", 
-        limit: int = 10
+        limit: int = 10,
+        budget: Optional[float] = None
+    ) -> RecommendationResponse:
+        """Get movie recommendations for a user within a latency budget (seconds)
+
+        Stages are tried in order until one returns a list: cached result, the
+        requested model, a cheap fallback model, the list for the user's
+        demographic cohort, then the precomputed popularity list. Model stages are cancelled when their share of the budget runs out.
+        """
+        return await self.recommend(user_id, model_type, limit, budget)
+    
+    async def recommend(
+        self,
+        user_id: int,
+        model_type: str = "hybrid",
+        limit: int = 10,
+        budget: Optional[float] = None,
+        history: Optional[List[int]] = None
     ) -> RecommendationResponse:
-        """Get movie recommendations for a user"""
+        """get_recommendations for callers that already hold the user's rated movie ids"""
         try:
-            # If models are loaded, use them
-            if model_type in self.models:
-                recommendations = await self._get_model_recommendations(
-                    user_id, model_type, limit
+            deadline = Deadline(budget if budget is not None else self.settings.RECOMMENDATION_BUDGET_MS / 1000)
+            try:
+                cache_key, cached = await deadline.run(
+                    lambda: self._cached_recommendations(user_id, model_type, limit), CACHE_STAGE_SHARE
                 )
-            else:
-                # Fall back to mock recommendations
-                recommendations = await self._get_mock_recommendations(user_id, limit)
+            except DeadlineExceeded:
+                cache_key, cached = None, None
+            if cached is not None:
+                return RecommendationResponse.model_validate({**cached, "served_by": "cache"})
             
-            return RecommendationResponse(
+            recommendations, model_used, served_by = await self._run_cascade(
+                user_id, model_type, limit, deadline, history
+            )
+            response = RecommendationResponse(
                 user_id=user_id,
                 recommendations=recommendations,
-                model_used=model_type,
+                model_used=model_used,
                 total_count=len(recommendations),
-                generated_at=datetime.utcnow()
+                generated_at=datetime.utcnow(),
+                served_by=served_by
             )
             
+            # Only the requested model's results are cached, so a degraded list
+            # does not outlive the slowdown that caused it
+            if served_by == "model" and cache_key is not None:
+                await self.cache.set("recommendations", cache_key, response.model_dump(mode="json"))
+            
+            return response
+            
         except Exception as e:
             logger.error(f"Error getting recommendations for user {user_id}: {e}")
             raise
     
+    async def _cached_recommendations(self, user_id: int, model_type: str, limit: int):
+        """Cache key of a user's recommendations under their current generation, and the cached value"""
+        generation = await self.cache.generation("recommendations", user_id)
+        cache_key = f"{user_id}:{generation}:{model_type}:{limit}"
+        return cache_key, await self.cache.get("recommendations", cache_key)
+    
+    async def _run_cascade(
+        self,
+        user_id: int,
+        model_type: str,
+        limit: int,
+        deadline: Deadline,
+        history: Optional[List[int]] = None
+    ):
+        """Return (recommendations, model used, stage) from the first stage that succeeds"""
+        stages = []
+        if model_type in self.models:
+            stages.append(("model", model_type, MODEL_STAGE_SHARE))
+        fallback = next(
+            (name for name in FALLBACK_MODELS if name in self.models and self.models[name] is not self.models.get(model_type)),
+            None
+        )
+        if fallback is not None:
+            stages.append(("fallback", fallback, 1.0))
+        
+        history_known = history is not None
+        if stages and history is None:
+            try:
+                history = await deadline.run(lambda: self._get_user_history(user_id), HISTORY_STAGE_SHARE)
+                history_known = True
+            except DeadlineExceeded as e:
+                logger.warning(f"History read timed out for user {user_id} ({e}), scoring without it")
+            except Exception as e:
+                logger.warning(f"Could not load history for user {user_id}, scoring without it: {e}")
+            if not history_known:
+                # Models still know the user; the seen index, when loaded, stands in for the history
+                history = list(self.seen.get(user_id)) if self.seen is not None and self.seen.loaded else []
+        
+        # Users known to have no ratings go straight to the precomputed lists
+        if stages and (history or not history_known):
+            for stage, name, share in stages:
+                try:
+                    recommendations = await deadline.run(
+                        lambda: self._get_model_recommendations(user_id, name, limit, history, deadline),
+                        share
+                    )
+                except Exception as e:
+                    logger.warning(f"{stage} stage ({name}) failed for user {user_id}: {e}")
+                    continue
+                if recommendations:
+                    return recommendations, name, stage
+        
+        # Last resorts have no deadline: they are precomputed lists
+        recommendations = await self._get_cohort_recommendations(limit, user_id)
+        if recommendations:
+            return recommendations, "cohort", "cohort"
+        return await self._get_popular_recommendations(limit, user_id), "popularity", "popularity"
+    
+    async def _get_user_history(self, user_id: int) -> List[int]:
+        """User's rated movie ids, highest rated first"""
+        movie_ids, ratings = await self.ratings.user_rating_values(user_id)
+        return movie_ids[np.argsort(-ratings, kind="stable")].tolist()
+    
     async def _get_model_recommendations(
         self, 
         user_id: int, 
         model_type: str, 
-        limit: int
+        limit: int,
+        history: List[int],
+        deadline: Deadline
     ) -> List[MovieRecommendation]:
         """Get recommendations using loaded ML models"""
         try:
-            model = self.models[model_type]
-            
-            # Get user's ratings
-            user_ratings = await self.ratings_collection.find({"user_id": user_id}).to_list(None)
-            
-            if not user_ratings:
-                # If user has no ratings, use popularity-based recommendations
-                return await self._get_popular_recommendations(limit)
-            
-            # Create user-item matrix (simplified version)
-            # In a real implementation, you'd use the exact same preprocessing as in training
-            user_item_matrix = await self._create_user_item_matrix()
-            
-            # Get recommendations from model
-            if hasattr(model, 'recommend'):
-                movie_ids = model.recommend(user_id, limit)
-            else:
-                # Fallback to popular movies
-                return await self._get_popular_recommendations(limit)
-            
-            # Convert to MovieRecommendation objects
-            recommendations = []
-            for movie_id in movie_ids:
-                movie = await self.movies_collection.find_one({"movie_id": movie_id})
-                if movie:
-                    recommendation = MovieRecommendation(
-                        movie_id=movie_id,
-                        title=movie.get("title", ""),
-                        genre=movie.get("genre", ""),
-                        score=4.0,  # Default score
-                        reason=f"Recommended by {model_type} model"
-                    )
-                    recommendations.append(recommendation)
-            
-            return recommendations[:limit]
+            scored = await self._score_model(
+                model_type, user_id, limit, self._user_context(user_id, history), timeout=deadline.remaining()
+            )
+            return await self._hydrate(scored, f"Recommended by {model_type} model", limit)
             
         except Exception as e:
             logger.error(f"Error getting model recommendations: {e}")
-            return await self._get_mock_recommendations(user_id, limit)
+            raise
     
-    async def _get_mock_recommendations(
-        self, 
-        user_id: int, 
-        limit: int
+    def _user_context(self, user_id: int, history: List[int]) -> Dict[str, Any]:
+        """What every model call for a user shares: rated movies and the movies to exclude"""
+        # Rated movies are masked out inside the model's top-k step
+        seen = self.seen.get(user_id) if self.seen is not None and self.seen.loaded else history
+        return {"history": history, "seen": seen}
+    
+    async def _score_model(
+        self,
+        model_type: str,
+        user_id: int,
+        limit: int,
+        context: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> List:
+        """(movie_id, score) pairs from one model, computed on the scoring pool"""
+        model = self.models[model_type]
+        seen = context["seen"]
+        
+        # History-based candidate generators need the user's rated movies
+        if isinstance(model, RecommendationPipeline):
+            if "trending" not in context:
+                context["trending"] = (
+                    self.trending.top_ids(self.settings.HYBRID_CANDIDATES_PER_SOURCE, seen)
+                    if self.trending is not None else []
+                )
+            return await self.scoring.run(
+                model_type, "recommend", user_id, limit,
+                exclude_seen=seen, history=context["history"], extra_candidates=context["trending"], timeout=timeout
+            )
+        if hasattr(model, 'recommend'):
+            return await self.scoring.run(model_type, "recommend", user_id, limit, exclude_seen=seen, timeout=timeout)
+        return []
+    
+    async def _lookup_movies(self, movie_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Movie documents by id from the catalog snapshot, or one $in query"""
+        snapshot = self.catalog.snapshot if self.catalog is not None else None
+        if snapshot is not None:
+            return {movie_id: snapshot.get(movie_id) for movie_id in movie_ids}
+        movies = {}
+        async for movie in self.movies_collection.find({"movie_id": {"$in": list(movie_ids)}}):
+            movies[movie["movie_id"]] = movie
+        return movies
+    
+    async def _hydrate(
+        self,
+        scored,
+        reason: str,
+        limit: int,
+        movies: Optional[Dict[int, Dict[str, Any]]] = None
     ) -> List[MovieRecommendation]:
-        """Get mock recommendations when models are not available"""
-        try:
-            # Get top-rated movies as recommendations
-            cursor = self.movies_collection.find().limit(limit)
-            recommendations = []
-            
-            async for movie in cursor:
-                recommendation = MovieRecommendation(
-                    movie_id=movie.get("movie_id", movie.get("_id")),
+        """Attach titles and genres to (movie_id, score) pairs, keeping their order"""
+        scores = {int(movie_id): float(score) for movie_id, score in scored}
+        if movies is None:
+            movies = await self._lookup_movies(scores)
+        
+        recommendations = []
+        for movie_id, score in scores.items():
+            movie = movies.get(movie_id)
+            if movie:
+                recommendations.append(MovieRecommendation(
+                    movie_id=movie_id,
                     title=movie.get("title", ""),
                     genre=movie.get("genre", ""),
-                    score=4.0,
-                    reason="Popular movie recommendation"
-                )
-                recommendations.append(recommendation)
+                    score=round(score, 4),
+                    reason=reason
+                ))
+        
+        return recommendations[:limit]
+    
+    async def compare_models(
+        self,
+        user_id: int,
+        model_types: Optional[Sequence[str]] = None,
+        limit: int = 10
+    ) -> RecommendationComparisonResponse:
+        """Recommendations from several models for one user, with each model's scoring time
+
+        The user's history, seen set and trending candidates are loaded once,
+        the models run concurrently on the scoring pool (a model served under
+        several names runs once), and the movies of every list are hydrated
+        together. Nothing is cached and nothing falls back, so each list is the
+        model's own; a model that fails reports its error instead.
+        """
+        try:
+            started = time.perf_counter()
+            names = list(dict.fromkeys(model_types)) if model_types else list(self.models)
+            history = await self._get_user_history(user_id)
+            context = self._user_context(user_id, history)
+            context_ms = (time.perf_counter() - started) * 1000
+            
+            async def timed(name: str):
+                model_started = time.perf_counter()
+                try:
+                    scored = await self._score_model(name, user_id, limit, context)
+                    return scored, (time.perf_counter() - model_started) * 1000, None
+                except Exception as e:
+                    logger.warning(f"Model {name} failed in comparison for user {user_id}: {e!r}")
+                    return [], (time.perf_counter() - model_started) * 1000, str(e) or type(e).__name__
+            
+            runs: Dict[int, str] = {}
+            for name in names:
+                runs.setdefault(id(self.models[name]), name)
+            results = dict(zip(runs, await asyncio.gather(*(timed(name) for name in runs.values()))))
+            
+            hydrate_started = time.perf_counter()
+            movie_ids = {int(movie_id) for scored, _, _ in results.values() for movie_id, _ in scored}
+            movies = await self._lookup_movies(movie_ids)
+            comparisons = []
+            for name in names:
+                scored, elapsed_ms, error = results[id(self.models[name])]
+                recommendations = await self._hydrate(scored, f"Recommended by {name} model", limit, movies)
+                comparisons.append(ModelComparison(
+                    model=name,
+                    recommendations=recommendations,
+                    total_count=len(recommendations),
+                    elapsed_ms=round(elapsed_ms, 3),
+                    error=error
+                ))
+            hydrate_ms = (time.perf_counter() - hydrate_started) * 1000
+            
+            return RecommendationComparisonResponse(
+                user_id=user_id,
+                history_count=len(history),
+                models=comparisons,
+                context_ms=round(context_ms, 3),
+                hydrate_ms=round(hydrate_ms, 3),
+                total_ms=round((time.perf_counter() - started) * 1000, 3),
+                generated_at=datetime.utcnow()
+            )
             
-            return recommendations
+        except Exception as e:
+            logger.error(f"Error comparing models for user {user_id}: {e}")
+            raise
+    
+    async def _get_cohort_recommendations(self, limit: int, user_id: int) -> List[MovieRecommendation]:
+        """Top movies of the user's demographic cohort, without movies the user has rated"""
+        if self.cohorts is None:
+            return []
+        try:
+            key = await self.cohorts.cohort_of(user_id)
+            if key is None:
+                return []
+            seen = self.seen.get(user_id) if self.seen is not None and self.seen.loaded else None
+            ranking = self.cohorts.top(key, limit, seen)
+            return await self._hydrate(ranking, f"Popular with similar viewers ({cohort_label(key)})", limit)
             
         except Exception as e:
-            logger.error(f"Error getting mock recommendations: {e}")
+            logger.error(f"Error getting cohort recommendations for user {user_id}: {e}")
             return []
     
-    async def _get_popular_recommendations(self, limit: int) -> List[MovieRecommendation]:
-        """Get popular movie recommendations"""
+    async def _get_popular_recommendations(self, limit: int, user_id: Optional[int] = None) -> List[MovieRecommendation]:
+        """Get popular movie recommendations, without movies the user has rated"""
         try:
-            # Simple popularity based on rating count
-            cursor = self.movies_collection.find().limit(limit)
+            if self.popular_ranking:
+                ranking = self.popular_ranking
+                if user_id is not None and self.seen is not None and self.seen.loaded:
+                    unseen = ~self.seen.get(user_id).mask(self.popular_ids)
+                    ranking = [pair for pair, keep in zip(ranking, unseen) if keep]
+                return await self._hydrate(ranking, "Popular movie", limit)
+            
+            # No popularity model: most-voted movies
+            cursor = self.movies_collection.find().sort("vote_count", -1).limit(limit)
             recommendations = []
             
             async for movie in cursor:
@@ -168,7 +415,7 @@ class RecommendationService:
                     movie_id=movie.get("movie_id", movie.get("_id")),
                     title=movie.get("title", ""),
                     genre=movie.get("genre", ""),
-                    score=movie.get("vote_average", 4.0),
+                    score=movie.get("vote_average") or 4.0,
                     reason="Popular movie"
                 )
                 recommendations.append(recommendation)
@@ -179,37 +426,6 @@ class RecommendationService:
             logger.error(f"Error getting popular recommendations: {e}")
             return []
     
-    async def _create_user_item_matrix(self) -> pd.DataFrame:
-        """Create user-item matrix from ratings"""
-        try:
-            # Get all ratings
-            cursor = self.ratings_collection.find()
-            ratings_data = []
-            
-            async for rating in cursor:
-                ratings_data.append({
-                    'user_id': rating['user_id'],
-                    'movie_id': rating['movie_id'],
-                    'rating': rating['rating']
-                })
-            
-            # Create DataFrame
-            df = pd.DataFrame(ratings_data)
-            
-            # Pivot to create user-item matrix
-            user_item_matrix = df.pivot_table(
-                index='user_id', 
-                columns='movie_id', 
-                values='rating',
-                fill_value=0
-            )
-            
-            return user_item_matrix
-            
-        except Exception as e:
-            logger.error(f"Error creating user-item matrix: {e}")
-            return pd.DataFrame()
-    
     async def predict_rating(self, user_id: int, movie_id: int) -> RatingPrediction:
         """Predict rating for a user-movie pair"""
         try:
@@ -217,10 +433,10 @@ class RecommendationService:
             # In practice, you'd use your trained models
             
             # Get user's average rating
-            user_ratings = await self.ratings_collection.find({"user_id": user_id}).to_list(None)
+            _, user_ratings = await self.ratings.user_rating_values(user_id)
             
-            if user_ratings:
-                user_avg = sum(r['rating'] for r in user_ratings) / len(user_ratings)
+            if len(user_ratings):
+                user_avg = float(user_ratings.mean())
             else:
                 user_avg = 3.0  # Default
             
@@ -247,15 +463,62 @@ class RecommendationService:
             logger.error(f"Error predicting rating: {e}")
             raise
     
-    async def get_similar_movies(self, movie_id: int, limit: int = 10) -> List[MovieRecommendation]:
-        """Get movies similar to a given movie"""
+    @coalesce
+    async def get_similar_movies(
+        self,
+        movie_id: int,
+        limit: int = 10,
+        budget: Optional[float] = None
+    ) -> List[MovieRecommendation]:
+        """Get movies similar to a given movie, or popular movies if the budget runs out"""
+        deadline = Deadline(budget if budget is not None else self.settings.SIMILAR_MOVIES_BUDGET_MS / 1000)
+        try:
+            cached = await deadline.run(lambda: self.cache.get("similar_movies", f"{movie_id}:{limit}"), CACHE_STAGE_SHARE)
+        except DeadlineExceeded:
+            cached = None
+        if cached is not None:
+            return [MovieRecommendation.model_validate(movie) for movie in cached]
+        
+        try:
+            similar_movies = await deadline.run(lambda: self._find_similar_movies(movie_id, limit))
+        except DeadlineExceeded as e:
+            logger.warning(f"Similar movies for {movie_id} fell back to popular movies: {e}")
+            return await self._get_popular_recommendations(limit)
+        except Exception as e:
+            logger.error(f"Error getting similar movies: {e}")
+            return []
+        await self.cache.set(
+            "similar_movies", f"{movie_id}:{limit}", [movie.model_dump(mode="json") for movie in similar_movies]
+        )
+        return similar_movies
+    
+    async def _find_similar_movies(self, movie_id: int, limit: int) -> List[MovieRecommendation]:
         try:
+            text_index = self.text_index
+            if text_index is not None:
+                # Indexed movies have precomputed neighbours; a lookup, no query
+                neighbours = text_index.neighbours_of(movie_id, limit)
+                if neighbours is not None:
+                    return await self._hydrate(neighbours, "Similar title and overview", limit)
+            
             # Get the target movie
-            target_movie = await self.movies_collection.find_one({"movie_id": movie_id})
+            snapshot = self.catalog.snapshot if self.catalog is not None else None
+            target_movie = snapshot.get(movie_id) if snapshot is not None else None
+            if target_movie is None:
+                target_movie = await self.movies_collection.find_one({"movie_id": movie_id})
             
             if not target_movie:
                 return []
             
+            if text_index is not None:
+                # Movies added after the index was built: one sparse dot product
+                vector = text_index.vectorize(
+                    target_movie.get("title") or "", target_movie.get("genre") or "", target_movie.get("overview") or ""
+                )
+                scored = text_index.similar_to(vector, limit, exclude_id=movie_id)
+                if scored:
+                    return await self._hydrate(scored, "Similar title and overview", limit)
+            
             # Find movies with the same genre
             genre = target_movie.get("genre", "")
             cursor = self.movies_collection.find({
@@ -277,5 +540,5 @@ class RecommendationService:
             return similar_movies
             
         except Exception as e:
-            logger.error(f"Error getting similar movies: {e}")
-            return []
+            logger.error(f"Error finding movies similar to {movie_id}: {e}")
+            raise
@@ -1,35 +1,35 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.user import UserResponse, UserStats
-from app.database import get_users_collection, get_ratings_collection
+from app.database import get_database
+from app.repositories.ratings import RatingRepository
+from app.utils.serialization import response_projection, response_template, shape_documents
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.collection import Collection
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+USER_PROJECTION = response_projection(UserResponse)
+USER_TEMPLATE = response_template(UserResponse)
+
 class UserService:
     """Service for user operations"""
     
-    def __init__(self):
-        self.users_collection: Collection = get_users_collection()
-        self.ratings_collection: Collection = get_ratings_collection()
+    def __init__(
+        self,
+        database: Optional[AsyncIOMotorDatabase] = None,
+        repository: Optional[RatingRepository] = None
+    ):
+        database = get_database() if database is None else database
+        self.users_collection: Collection = database.users
+        self.ratings = repository or RatingRepository(database)
     
-    async def get_users(self, skip: int = 0, limit: int = 100) -> List[UserResponse]:
+    async def get_users(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Get users with pagination"""
         try:
-            cursor = self.users_collection.find().skip(skip).limit(limit)
-            users = []
-            
-            async for doc in cursor:
-                user = UserResponse(
-                    user_id=doc.get("user_id", doc.get("_id")),
-                    age=doc.get("age"),
-                    gender=doc.get("gender"),
-                    occupation=doc.get("occupation"),
-                    zip_code=doc.get("zip_code")
-                )
-                users.append(user)
-            
-            return users
+            cursor = self.users_collection.find({}, USER_PROJECTION).skip(skip).limit(limit)
+            return shape_documents(await cursor.to_list(length=limit), USER_TEMPLATE)
             
         except Exception as e:
             logger.error(f"Error getting users: {e}")
@@ -59,13 +59,9 @@ class UserService:
         """Get user statistics"""
         try:
             # Get user's ratings
-            ratings_cursor = self.ratings_collection.find({"user_id": user_id})
-            ratings = []
-            
-            async for rating in ratings_cursor:
-                ratings.append(rating)
+            _, ratings = await self.ratings.user_rating_values(user_id)
             
-            if not ratings:
+            if not len(ratings):
                 return {
                     "user_id": user_id,
                     "total_ratings": 0,
@@ -76,13 +72,11 @@ class UserService:
             
             # Calculate statistics
             total_ratings = len(ratings)
-            average_rating = sum(r["rating"] for r in ratings) / total_ratings
+            average_rating = float(ratings.mean())
             
             # Rating distribution
-            rating_distribution = {}
-            for rating in ratings:
-                rating_value = str(int(rating["rating"]))
-                rating_distribution[rating_value] = rating_distribution.get(rating_value, 0) + 1
+            values, counts = np.unique(ratings.astype(np.int64), return_counts=True)
+            rating_distribution = {str(value): int(count) for value, count in zip(values.tolist(), counts.tolist())}
             
             # Get genre preferences (requires joining with movies)
             # This is a simplified version - in practice, you'd join with movies collection
@@ -0,0 +1,263 @@
+"""Admission control for expensive endpoints
+
+Recommendation, popular-movie and user-stats requests share the worker with
+cheap lookups. An ``AdmissionGate`` per route group lets at most
+``concurrency`` of its requests run at a time; the rest wait in a bounded
+queue. Each gate keeps a moving average of how long its requests hold a slot.
+A request is turned away at once with 503 and ``Retry-After`` when:
+- the queue is full, or
+- the wait predicted from its place in the queue exceeds the group's
+  budget.
+
+It is also turned away if it is still queued when the budget runs out.
+Routes outside every group are never limited, so a burst of recommendations
+cannot starve movie lookups.
+
+Requests whose result is already in this worker's L1 cache skip the queue:
+answering them costs a dictionary lookup, and serving them keeps most of the
+API useful while the expensive paths are saturated.
+"""
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Pattern, Tuple
+from collections import deque
+from urllib.parse import parse_qsl
+import asyncio
+import logging
+import math
+import re
+import time
+import orjson
+from app.cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest request in the moving average of service time
+SERVICE_TIME_ALPHA = 0.2
+# Sheds are logged at most this often per gate
+SHED_LOG_INTERVAL_SECONDS = 10.0
+
+CacheProbe = Callable[[TieredCache, Dict[str, str], Dict[str, str]], Optional[Tuple[str, Any]]]
+
+
+class Overloaded(Exception):
+    """Raised when a request would wait longer than its gate's budget"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"overloaded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded FIFO wait queue and a wait budget"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, max_wait_seconds: float):
+        self.name = name
+        self.concurrency = max(concurrency, 1)
+        self.queue_size = max(queue_size, 0)
+        self.max_wait_seconds = max_wait_seconds
+        self.active = 0
+        self.service_time: Optional[float] = None
+        self.admitted = 0
+        self.shed = 0
+        self.cache_hits = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_shed_log = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until the request at this queue position gets a slot"""
+        if self.service_time is None:
+            return 0.0
+        # Slots free up about one service time apart in batches of `concurrency`
+        return (position // self.concurrency + 1) * self.service_time
+
+    def _overloaded(self, wait: float) -> Overloaded:
+        self.shed += 1
+        now = time.monotonic()
+        if now - self._last_shed_log >= SHED_LOG_INTERVAL_SECONDS:
+            self._last_shed_log = now
+            logger.warning(
+                f"Shedding {self.name} requests: {self.active} running, {self.queued} queued; "
+                f"{self.admitted} admitted, {self.cache_hits} served from cache, {self.shed} shed so far"
+            )
+        return Overloaded(wait if wait > 0 else self.max_wait_seconds)
+
+    async def acquire(self):
+        """Wait for a slot, or raise Overloaded if it would take longer than the budget"""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        position = len(self._waiters)
+        wait = self.estimated_wait(position)
+        if position >= self.queue_size or wait > self.max_wait_seconds:
+            raise self._overloaded(wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait((future,), timeout=self.max_wait_seconds)
+        except asyncio.CancelledError:
+            if future.done():
+                self.release()
+            else:
+                self._waiters.remove(future)
+                future.cancel()
+            raise
+        # The slot may have been handed over after the timeout fired
+        if not future.done():
+            self._waiters.remove(future)
+            future.cancel()
+            raise self._overloaded(self.estimated_wait(len(self._waiters)))
+        self.admitted += 1
+
+    def release(self, duration: Optional[float] = None):
+        """Free a slot, handing it straight to the longest waiter"""
+        if duration is not None:
+            self.service_time = duration if self.service_time is None else (
+                SERVICE_TIME_ALPHA * duration + (1 - SERVICE_TIME_ALPHA) * self.service_time
+            )
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionRoute(NamedTuple):
+    """Requests one gate admits: a method set, a path regex and an optional cache probe"""
+    gate: AdmissionGate
+    methods: Tuple[str, ...]
+    path: Pattern
+    probe: Optional[CacheProbe] = None
+
+
+def _int_param(params: Dict[str, str], name: str, default: int) -> Optional[int]:
+    try:
+        return int(params.get(name, default))
+    except ValueError:
+        return None
+
+
+def recommendations_probe(
+    cache: TieredCache, path_params: Dict[str, str], query: Dict[str, str]
+) -> Optional[Tuple[str, Any]]:
+    """Cache key of GET /recommendations/ (the key RecommendationService.recommend uses)"""
+    user_id = _int_param(query, "user_id", -1)
+    limit = _int_param(query, "limit", 10)
+    if user_id is None or user_id < 0 or limit is None:
+        return None
+    generation = cache.local_generation("recommendations", user_id)
+    if generation is None:
+        return None
+    return "recommendations", f"{user_id}:{generation}:{query.get('model_type', 'hybrid')}:{limit}"
+
+
+def popular_movies_probe(
+    cache: TieredCache, path_params: Dict[str, str], query: Dict[str, str]
+) -> Optional[Tuple[str, Any]]:
+    """Cache key of GET /movies/popular/ (the key MovieService.get_popular_movies uses)"""
+    limit = _int_param(query, "limit", 20)
+    return ("popular_movies", limit) if limit is not None else None
+
+
+def default_routes(settings) -> List[AdmissionRoute]:
+    """Gates for the expensive endpoints, sized from settings"""
+    recommendations = AdmissionGate(
+        "recommendations",
+        settings.ADMISSION_RECOMMENDATIONS_CONCURRENCY,
+        settings.ADMISSION_RECOMMENDATIONS_QUEUE_SIZE,
+        settings.ADMISSION_RECOMMENDATIONS_MAX_WAIT_MS / 1000
+    )
+    popular = AdmissionGate(
+        "popular_movies",
+        settings.ADMISSION_POPULAR_CONCURRENCY,
+        settings.ADMISSION_POPULAR_QUEUE_SIZE,
+        settings.ADMISSION_POPULAR_MAX_WAIT_MS / 1000
+    )
+    user_stats = AdmissionGate(
+        "user_stats",
+        settings.ADMISSION_USER_STATS_CONCURRENCY,
+        settings.ADMISSION_USER_STATS_QUEUE_SIZE,
+        settings.ADMISSION_USER_STATS_MAX_WAIT_MS / 1000
+    )
+    return [
+        AdmissionRoute(recommendations, ("GET",), re.compile(r"/recommendations/?"), recommendations_probe),
+        # Home pages score the same models, so they share the recommendation slots
+        AdmissionRoute(recommendations, ("GET", "POST"), re.compile(r"/(recommendations|home)/.*")),
+        AdmissionRoute(popular, ("GET",), re.compile(r"/movies/popular/?"), popular_movies_probe),
+        AdmissionRoute(user_stats, ("GET",), re.compile(r"/users/(?P<user_id>[^/]+)/stats/?"))
+    ]
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that limits concurrency per route group and sheds load with 503"""
+
+    def __init__(self, app, routes: List[AdmissionRoute]):
+        self.app = app
+        self.routes = routes
+
+    def _match(self, scope) -> Optional[Tuple[AdmissionRoute, Dict[str, str]]]:
+        for route in self.routes:
+            if scope["method"] in route.methods:
+                match = route.path.fullmatch(scope["path"])
+                if match is not None:
+                    return route, match.groupdict()
+        return None
+
+    def _cached(self, scope, route: AdmissionRoute, path_params: Dict[str, str]) -> bool:
+        """Whether this worker's L1 cache already holds the response's data"""
+        if route.probe is None:
+            return False
+        container = getattr(scope["app"].state, "container", None) if "app" in scope else None
+        if container is None:
+            return False
+        query = dict(parse_qsl(scope.get("query_string", b"").decode(errors="replace")))
+        cache = container.cache
+        target = route.probe(cache, path_params, query)
+        if target is None:
+            return False
+        return cache.l1.get(cache.key(*target)) is not None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        matched = self._match(scope)
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        route, path_params = matched
+        gate = route.gate
+        if self._cached(scope, route, path_params):
+            gate.cache_hits += 1
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await gate.acquire()
+        except Overloaded as e:
+            await self._reject(send, e.retry_after)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - started)
+
+    async def _reject(self, send, retry_after: float):
+        body = orjson.dumps({"detail": "Service overloaded, please retry later"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
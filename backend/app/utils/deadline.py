@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable
+import asyncio
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage does not finish within the request's budget"""
+
+
+class Deadline:
+    """Latency budget shared by the stages of one request"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], share: float = 1.0) -> Any:
+        """Await fn() for at most `share` of the remaining budget, cancelling it on expiry"""
+        timeout = self.remaining() * share
+        if timeout <= 0:
+            raise DeadlineExceeded("budget already spent")
+        try:
+            return await asyncio.wait_for(fn(), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"stage exceeded {timeout * 1000:.0f}ms")
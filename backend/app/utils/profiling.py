@@ -0,0 +1,284 @@
+"""Per-request profiling: sampled stacks, MongoDB command timelines and slow-request capture
+
+``ProfilingMiddleware`` profiles a request when it carries the profile token
+header or is picked by the sampling rate. A background thread samples every
+thread's stack at a fixed interval while the request runs, so event-loop
+time, scoring threads and driver threads all show up. The event loop is
+shared, so a profile also contains whatever else the loop ran meanwhile.
+Stacks are written in the folded format read by flamegraph.pl and speedscope.
+
+Every request also records the MongoDB commands it issued, through a
+driver-level command listener and a context variable. Motor runs commands on
+executor threads with the caller's context copied. Requests slower than the
+threshold are saved with that timeline, whether or not they were profiled.
+Profiles go to the container's ``ProfileStore``, the one /debug/profiles
+reads, unless the middleware is given its own.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pymongo import monitoring
+import asyncio
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import orjson
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+# Folded stacks deeper than this are truncated at the root end
+MAX_STACK_DEPTH = 128
+
+_timeline: ContextVar[Optional["RequestTimeline"]] = ContextVar("request_timeline", default=None)
+
+
+class RequestTimeline:
+    """MongoDB commands issued while handling one request, as offsets from its start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.commands: List[Dict[str, Any]] = []
+
+    def add(self, name: str, collection: Optional[str], started: float, duration_ms: float, ok: bool):
+        self.commands.append({
+            "command": name,
+            "collection": collection,
+            "offset_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(duration_ms, 3),
+            "ok": ok
+        })
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(command["duration_ms"] for command in self.commands), 3)
+
+
+class CommandTimeline(monitoring.CommandListener):
+    """Command listener that appends each command to the timeline of the request that issued it"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[RequestTimeline, str, Optional[str], float]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        timeline = _timeline.get()
+        if timeline is not None:
+            target = event.command.get(event.command_name)
+            collection = target if isinstance(target, str) else None
+            self._pending[(event.connection_id, event.request_id)] = (
+                timeline, event.command_name, collection, time.perf_counter()
+            )
+
+    def _finish(self, event, ok: bool):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            timeline, name, collection, started = pending
+            timeline.add(name, collection, started, event.duration_micros / 1000, ok)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, True)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, False)
+
+
+command_timeline = CommandTimeline()
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack on an interval and counts folded stacks"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Stacks in folded format, root first, one 'frame;frame;... count' line each"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Profiles saved to a directory as <id>.json metadata plus an optional <id>.folded stack file"""
+
+    def __init__(self, directory: str, max_profiles: int = 200):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, meta: Dict[str, Any], folded: Optional[str] = None):
+        os.makedirs(self.directory, exist_ok=True)
+        if folded is not None:
+            with open(os.path.join(self.directory, f"{meta['id']}.folded"), "w") as f:
+                f.write(folded)
+        with open(os.path.join(self.directory, f"{meta['id']}.json"), "wb") as f:
+            f.write(orjson.dumps(meta))
+        self._prune()
+
+    def _prune(self):
+        metas = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in metas[:max(len(metas) - self.max_profiles, 0)]:
+            stem = name[:-len(".json")]
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, stem + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Saved profile metadata, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted((name for name in os.listdir(self.directory) if name.endswith(".json")), reverse=True)
+        profiles = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    profiles.append(orjson.loads(f.read()))
+            except (OSError, orjson.JSONDecodeError):
+                continue
+        return profiles
+
+    def folded(self, profile_id: str) -> Optional[str]:
+        """Folded stacks of a profile, or None if it has none"""
+        if not re.fullmatch(r"[\w-]+", profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.folded")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requested or sampled requests and saves slow ones"""
+
+    def __init__(
+        self,
+        app,
+        store: Optional[ProfileStore] = None,
+        token: str = "",
+        sample_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        interval_ms: float = 5.0
+    ):
+        self.app = app
+        self.store = store
+        self.token = token
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        # Samples cover the whole process, so one profile runs at a time
+        self._profiling = False
+
+    def _wants_profile(self, scope) -> Optional[str]:
+        if self._profiling:
+            return None
+        if self.token:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER.encode() and hmac.compare_digest(value, self.token.encode()):
+                    return "requested"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def _store(self, scope) -> Optional[ProfileStore]:
+        if self.store is not None:
+            return self.store
+        container = getattr(scope["app"].state, "container", None) if "app" in scope else None
+        return container.profiles if container is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+
+        reason = self._wants_profile(scope)
+        if reason is None and self.slow_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if reason is not None:
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = None
+        if reason is not None:
+            self._profiling = True
+            profiler = SamplingProfiler(self.interval)
+            profiler.start()
+        timeline = RequestTimeline()
+        token = _timeline.set(timeline)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _timeline.reset(token)
+            duration_ms = (time.perf_counter() - timeline.started) * 1000
+            if profiler is not None:
+                profiler.stop()
+                self._profiling = False
+            if reason is None and duration_ms >= self.slow_ms:
+                reason = "slow"
+            store = self._store(scope)
+            if reason is not None and store is None:
+                logger.warning(f"No profile store to save {reason} profile {profile_id} to")
+            elif reason is not None:
+                meta = {
+                    "id": profile_id,
+                    "reason": reason,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode(errors="replace"),
+                    "status": status["code"],
+                    "duration_ms": round(duration_ms, 3),
+                    "mongo_ms": timeline.total_ms,
+                    "mongo_commands": timeline.commands,
+                    "samples": profiler.samples if profiler is not None else 0,
+                    "has_stacks": profiler is not None,
+                    "created_at": datetime.utcnow().isoformat()
+                }
+                try:
+                    await asyncio.to_thread(store.save, meta, profiler.folded() if profiler is not None else None)
+                    logger.info(f"Saved {reason} profile {profile_id} for {scope['method']} {scope['path']} ({duration_ms:.0f} ms)")
+                except Exception as e:
+                    logger.warning(f"Error saving profile {profile_id}: {e}")
@@ -0,0 +1,339 @@
+"""Query-plan checks for every MongoDB access path, and a slow-query log
+
+``main`` seeds a scratch database on a MongoDB server with synthetic movies,
+users and ratings. It creates the indexes declared in ``app.database.INDEXES``
+and explains each query shape the services issue. A shape expected to use an
+index fails when its plan has a COLLSCAN, or when it examines more documents
+than ``--max-ratio`` times those it returns. The exit status is non-zero on
+any failure:
+    python -m app.utils.query_plans --url mongodb://localhost:27017
+
+The same checks run as ``tests/test_query_plans.py``, one test per shape,
+which CI runs against a MongoDB service so a new COLLSCAN fails the build.
+
+Shapes that cannot use an index (such as unanchored case-insensitive regexes,
+which the catalog snapshot serves, and whole-collection loads) are listed
+with ``expect="scan"``. Their plans are reported but do not fail the run.
+
+``SlowQueryLog`` is a command listener for the application client. It logs
+commands slower than a threshold with their filter shape and the planner's
+chosen plan. The plan comes from an ``explain`` run on a background thread, at
+most once per shape per ``explain_interval`` seconds.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import MongoClient, monitoring
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+INDEX_STAGES = {"IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "EXPRESS_IDHACK", "COUNT_SCAN", "DISTINCT_SCAN"}
+
+
+def _winning_plans(explain: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Winning plan trees of a find or aggregate explain, one per $cursor stage or shard"""
+    plans = []
+    if "queryPlanner" in explain:
+        plans.append(explain["queryPlanner"]["winningPlan"])
+    for stage in explain.get("stages", ()):
+        if "$cursor" in stage:
+            plans.extend(_winning_plans(stage["$cursor"]))
+    for shard in explain.get("shards", {}).values():
+        plans.extend(_winning_plans(shard))
+    return plans
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[Tuple[str, Optional[str]]]:
+    """(stage, index name) pairs of a plan tree, root first"""
+    # Slot-based engine plans carry the classic tree under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages = [(plan.get("stage", "?"), plan.get("indexName"))]
+    children = list(plan.get("inputStages", ()))
+    if "inputStage" in plan:
+        children.append(plan["inputStage"])
+    for child in children:
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def _execution_stats(explain: Dict[str, Any]) -> Dict[str, int]:
+    stats = {"docs_examined": 0, "keys_examined": 0, "returned": 0}
+    sources = [explain] + [stage["$cursor"] for stage in explain.get("stages", ()) if "$cursor" in stage]
+    for source in sources:
+        execution = source.get("executionStats")
+        if execution:
+            stats["docs_examined"] += execution.get("totalDocsExamined", 0)
+            stats["keys_examined"] += execution.get("totalKeysExamined", 0)
+            stats["returned"] += execution.get("nReturned", 0)
+    return stats
+
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Stages, indexes and execution counts of an explain result"""
+    stages = [stage for plan in _winning_plans(explain) for stage in plan_stages(plan)]
+    names = [name for name, _ in stages]
+    pipeline = [next(iter(stage)) for stage in explain.get("stages", ()) if "$cursor" not in stage]
+    return {
+        "stages": names + pipeline,
+        "indexes": sorted({index for _, index in stages if index}),
+        "collscan": "COLLSCAN" in names,
+        "uses_index": any(name in INDEX_STAGES for name in names),
+        **_execution_stats(explain)
+    }
+
+
+def plan_summary(explain: Dict[str, Any]) -> str:
+    """One-line plan description, such as 'FETCH < IXSCAN(user_id_1)'"""
+    parts = []
+    for plan in _winning_plans(explain):
+        parts.append(" < ".join(f"{name}({index})" if index else name for name, index in plan_stages(plan)))
+    parts.extend(next(iter(stage)) for stage in explain.get("stages", ()) if "$cursor" not in stage)
+    return "; ".join(parts) or "no plan"
+
+
+def filter_shape(value: Any) -> Any:
+    """A filter with its values replaced, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(value[0])] if value and isinstance(value[0], dict) else "?"
+    return "?"
+
+
+def _explainable(command: Dict[str, Any]) -> Dict[str, Any]:
+    """A command as sent, without the session and cluster fields the driver adds"""
+    return {key: value for key, value in command.items() if not key.startswith("$") and key not in ("lsid", "txnNumber")}
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Logs commands slower than threshold_ms with their filter shape and plan"""
+
+    def __init__(self, threshold_ms: float = 100.0, explain_interval: float = 60.0):
+        self.threshold_ms = threshold_ms
+        self.explain_interval = explain_interval
+        # Set to the synchronous client behind the application's Motor client
+        self.client: Optional[MongoClient] = None
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+        self._explained: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        database, command = pending
+        name = event.command_name
+        collection = command.get(name)
+        shape = filter_shape(command.get("filter", command.get("query", command.get("pipeline", command.get("updates", command.get("deletes"))))))
+        description = f"Slow {name} on {database}.{collection}: {duration_ms:.0f} ms, shape {shape}"
+
+        key = f"{database}.{collection}:{name}:{shape}"
+        now = time.monotonic()
+        with self._lock:
+            explain = self.client is not None and now - self._explained.get(key, -self.explain_interval) >= self.explain_interval
+            if explain:
+                self._explained[key] = now
+        if explain:
+            self._executor.submit(self._explain, database, command, description)
+        else:
+            logger.warning(description)
+
+    def _explain(self, database: str, command: Dict[str, Any], description: str):
+        try:
+            explain = self.client[database].command("explain", _explainable(command), verbosity="queryPlanner")
+            logger.warning(f"{description}, plan {plan_summary(explain)}")
+        except Exception as e:
+            logger.warning(f"{description} (explain failed: {e})")
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class QueryShape(NamedTuple):
+    """A query the services issue, as an explainable command"""
+    name: str
+    command: Dict[str, Any]
+    expect: str = "index"
+    note: str = ""
+
+
+def query_shapes(n_movies: int, n_users: int, since: datetime) -> List[QueryShape]:
+    """Every query shape issued by the services and indexes, with values present in the seeded data"""
+    from app.services.movie_service import MOVIE_PROJECTION
+    from app.services.rating_service import RATING_PROJECTION
+
+    movie_id, user_id = n_movies // 2, n_users // 2
+    movie_ids = list(range(1, min(n_movies, 50) + 1))
+    shapes = [
+        QueryShape("movie by id", {"find": "movies", "filter": {"movie_id": movie_id}, "projection": MOVIE_PROJECTION, "limit": 1}),
+        QueryShape("movies by ids", {"find": "movies", "filter": {"movie_id": {"$in": movie_ids}}, "projection": MOVIE_PROJECTION}),
+        QueryShape("similar by genre", {"find": "movies", "filter": {"genre": "Drama", "movie_id": {"$ne": movie_id}}, "limit": 10}),
+        QueryShape("most voted", {"find": "movies", "filter": {}, "sort": {"vote_count": -1}, "limit": 20}),
+        QueryShape(
+            "genre regex", {"find": "movies", "filter": {"genre": {"$regex": "drama", "$options": "i"}}, "limit": 20},
+            "scan", "unanchored case-insensitive regex; served from the catalog snapshot"
+        ),
+        QueryShape(
+            "title search", {"find": "movies", "filter": {"title": {"$regex": "love", "$options": "i"}}, "limit": 20},
+            "scan", "unanchored case-insensitive regex; served from the catalog snapshot"
+        ),
+        QueryShape(
+            "popular movies", {
+                "aggregate": "movies",
+                "pipeline": [
+                    {"$lookup": {"from": "ratings", "localField": "movie_id", "foreignField": "movie_id", "as": "ratings"}},
+                    {"$match": {"ratings.10": {"$exists": True}}},
+                    {"$limit": 20}
+                ],
+                "cursor": {}
+            },
+            "scan", "whole-catalog aggregation, cached; $lookup probes ratings by movie_id"
+        ),
+        QueryShape("catalog load", {"find": "movies", "filter": {}, "projection": MOVIE_PROJECTION}, "scan", "loads every movie"),
+        QueryShape("movies changed since", {
+            "find": "movies", "filter": {"updated_at": {"$gte": since}}, "sort": {"updated_at": 1, "_id": 1}, "limit": 1000
+        }),
+        QueryShape("user history", {"find": "ratings", "filter": {"user_id": user_id}, "projection": RATING_PROJECTION}),
+        QueryShape("user rating", {"find": "ratings", "filter": {"user_id": user_id, "movie_id": movie_id}, "limit": 1}),
+        QueryShape("movie ratings", {"find": "ratings", "filter": {"movie_id": movie_id}, "projection": RATING_PROJECTION, "limit": 100}),
+        QueryShape("recent ratings", {"find": "ratings", "filter": {"created_at": {"$gte": since}}, "projection": {"_id": 0, "movie_id": 1, "created_at": 1}}),
+        QueryShape("ratings changed since", {
+            "find": "ratings", "filter": {"updated_at": {"$gte": since}}, "sort": {"updated_at": 1, "_id": 1}, "limit": 1000
+        }),
+        QueryShape("ratings page", {"find": "ratings", "filter": {}, "projection": RATING_PROJECTION, "limit": 100}, "scan", "unfiltered page"),
+        QueryShape("all ratings", {"find": "ratings", "filter": {}, "projection": {"_id": 0, "user_id": 1, "movie_id": 1}}, "scan", "seen sets and cohort lists load every rating"),
+        QueryShape("user buckets", {"find": "rating_buckets", "filter": {"user_id": user_id}, "sort": {"seq": 1}}),
+        QueryShape("user by id", {"find": "users", "filter": {"user_id": user_id}, "limit": 1}),
+        QueryShape("users page", {"find": "users", "filter": {}, "limit": 100}, "scan", "unfiltered page"),
+        QueryShape("trending state", {"find": "trending", "filter": {"_id": "rating_counters"}, "limit": 1})
+    ]
+    # GET /movies sorts on any of these, in either direction
+    for field in ("title", "vote_average", "vote_count", "release_date"):
+        shapes.append(QueryShape(f"movies sorted by {field}", {"find": "movies", "filter": {}, "sort": {field: -1}, "limit": 20}))
+    return shapes
+
+
+def seed(database, n_movies: int, n_users: int, n_ratings: int, seed: int = 0):
+    """Replace the scratch database's collections with synthetic data and the declared indexes"""
+    from app.database import INDEXES
+    from app.indexes.trending import STATE_ID
+
+    rng = random.Random(seed)
+    genres = ["Drama", "Comedy", "Action", "Thriller", "Romance", "Documentary", "Horror", "Sci-Fi"]
+    words = ["love", "war", "night", "city", "last", "star", "king", "dark", "road", "house"]
+    now = datetime.utcnow()
+    for name in list(INDEXES) + ["trending"]:
+        database.drop_collection(name)
+
+    database.movies.insert_many([{
+        "movie_id": movie_id,
+        "title": " ".join(rng.sample(words, 3)).title(),
+        "genre": "|".join(rng.sample(genres, rng.randint(1, 3))),
+        "release_date": f"{rng.randint(1930, 2024)}-{rng.randint(1, 12):02d}-01",
+        "vote_average": round(rng.uniform(1, 10), 1),
+        "vote_count": rng.randint(0, 100000),
+        "created_at": now - timedelta(days=rng.randint(0, 3650)),
+        "updated_at": now - timedelta(days=rng.randint(0, 3650))
+    } for movie_id in range(1, n_movies + 1)])
+    database.users.insert_many([{
+        "user_id": user_id,
+        "age": rng.randint(12, 80),
+        "gender": rng.choice("MF"),
+        "occupation": rng.choice(["student", "engineer", "artist", "writer", "other"]),
+        "zip_code": f"{rng.randint(10000, 99999)}"
+    } for user_id in range(1, n_users + 1)])
+
+    pairs = set()
+    while len(pairs) < min(n_ratings, n_users * n_movies):
+        pairs.add((rng.randint(1, n_users), rng.randint(1, n_movies)))
+    ratings = []
+    for user_id, movie_id in pairs:
+        at = now - timedelta(seconds=rng.randint(0, 86400 * 365))
+        ratings.append({
+            "user_id": user_id, "movie_id": movie_id, "rating": float(rng.randint(1, 5)),
+            "timestamp": int(at.timestamp()), "created_at": at, "updated_at": at
+        })
+    database.ratings.insert_many(ratings, ordered=False)
+    database.rating_buckets.insert_many([
+        {"user_id": user_id, "seq": seq, "rev": 0} for user_id in range(1, n_users + 1) for seq in range(2)
+    ])
+    database.trending.insert_one({"_id": STATE_ID})
+
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            database[collection].create_index(keys, **options)
+
+
+def check_shape(database, shape: QueryShape, max_ratio: float) -> Tuple[bool, Dict[str, Any]]:
+    """Explain a shape and judge its plan against the expectation"""
+    explain = database.command("explain", shape.command, verbosity="executionStats")
+    summary = summarize_plan(explain)
+    summary["plan"] = plan_summary(explain)
+    if shape.expect == "scan":
+        return True, summary
+    ratio = summary["docs_examined"] / max(summary["returned"], 1)
+    summary["ratio"] = round(ratio, 2)
+    return summary["uses_index"] and not summary["collscan"] and ratio <= max_ratio, summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Explain every service query shape against seeded data and check index use")
+    parser.add_argument("--url", default=settings.MONGODB_URL, help="MongoDB server to seed and explain against")
+    parser.add_argument("--database", default="mvrs_query_plans", help="Scratch database, dropped and reseeded")
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--ratings", type=int, default=100000)
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="Largest docs examined per doc returned for indexed shapes")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.database == settings.DATABASE_NAME:
+        parser.error("Refusing to reseed the application database; choose a scratch --database")
+
+    client = MongoClient(args.url)
+    database = client[args.database]
+    try:
+        seed(database, args.movies, args.users, args.ratings)
+        since = datetime.utcnow() - timedelta(days=1)
+        shapes = query_shapes(args.movies, args.users, since)
+        failures = 0
+        for shape in shapes:
+            ok, summary = check_shape(database, shape, args.max_ratio)
+            failures += not ok
+            status = "ok" if ok else "FAIL"
+            detail = f"ratio {summary['ratio']}" if "ratio" in summary else f"scan allowed: {shape.note}"
+            print(f"{status:4}  {shape.name:28} {summary['plan']}  "
+                  f"(docs {summary['docs_examined']}, keys {summary['keys_examined']}, returned {summary['returned']}; {detail})")
+        print(f"{failures} of {len(shapes)} shapes failed")
+        return 1 if failures else 0
+    finally:
+        if not args.keep:
+            client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
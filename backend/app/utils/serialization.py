@@ -0,0 +1,43 @@
+from typing import Any, Dict, Iterable, List, Type
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+import functools
+
+__all__ = ["ORJSONResponse", "response_projection", "response_template", "shape_documents"]
+
+
+def _wire_name(name: str, field) -> str:
+    """JSON key of a field; responses are serialized by alias"""
+    return field.alias or name
+
+
+@functools.lru_cache(maxsize=None)
+def _projection(model: Type[BaseModel]) -> Dict[str, int]:
+    projection = {"_id": 0}
+    for name, field in model.model_fields.items():
+        projection[_wire_name(name, field)] = 1
+    return projection
+
+
+def response_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning exactly the wire fields of a response model"""
+    return dict(_projection(model))
+
+
+def response_template(model: Type[BaseModel], **defaults: Any) -> Dict[str, Any]:
+    """Wire-shaped dict of field defaults, used to fill fields missing from a document"""
+    template = {}
+    for name, field in model.model_fields.items():
+        key = _wire_name(name, field)
+        template[key] = defaults.get(key, None if field.is_required() else field.get_default(call_default_factory=True))
+    return template
+
+
+def shape_documents(docs: Iterable[Dict[str, Any]], template: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Merge trusted, projected documents over a response template
+
+    Documents that come from our own collections through response_projection
+    already have the right keys and types, so they skip Pydantic validation and
+    go straight to ORJSONResponse. Merging keeps the template's key order.
+    """
+    return [{**template, **doc} for doc in docs]
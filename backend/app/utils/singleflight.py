@@ -0,0 +1,73 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from collections import OrderedDict
+import asyncio
+import functools
+import inspect
+import time
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one in-flight awaitable
+
+    The first caller for a key starts the work as a task; callers arriving while
+    it runs await the same task. With a ttl, the result is also reused for that
+    many seconds after it completes. Failures are shared but never cached.
+    Every caller receives the same result object, so results must be treated as
+    read-only.
+    """
+
+    def __init__(self, ttl: float = 0.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing it with concurrent callers of the same key"""
+        if self.ttl > 0:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    return cached[1]
+                del self._results[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._complete, key))
+
+        # Shield so one caller's cancellation does not cancel the shared work
+        return await asyncio.shield(task)
+
+    def _complete(self, key: Hashable, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if self.ttl > 0 and not task.cancelled() and task.exception() is None:
+            self._results[key] = (time.monotonic() + self.ttl, task.result())
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def forget(self, key: Hashable = None):
+        """Drop reusable results for one key, or all keys"""
+        if key is None:
+            self._results.clear()
+        else:
+            self._results.pop(key, None)
+
+
+def coalesce(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Route an async service method through the instance's SingleFlight (self.flights)
+
+    The key is the method name plus its fully bound arguments, so positional
+    and keyword spellings of the same call coalesce together.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(bound.arguments.items())[1:]
+        return await self.flights.do(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,11 @@
+import pytest
+from app.config import Settings
+
+
+@pytest.fixture
+def settings(tmp_path) -> Settings:
+    """Settings without models, snapshots or a change feed, writing under tmp_path"""
+    return Settings(
+        MONGODB_URL="mongodb://unused", SECRET_KEY="test", MODELS_PATH=str(tmp_path / "models"),
+        SNAPSHOT_ENABLED=False, CHANGE_FEED_ENABLED=False, PROFILE_DIR=str(tmp_path / "profiles")
+    )
@@ -0,0 +1,161 @@
+import asyncio
+import re
+from types import SimpleNamespace
+import pytest
+from app.cache import MemoryCache, TieredCache
+from app.utils.admission import (
+    AdmissionGate, AdmissionMiddleware, AdmissionRoute, Overloaded, popular_movies_probe, recommendations_probe
+)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_full_queue_sheds_at_once():
+    gate = AdmissionGate("test", concurrency=1, queue_size=1, max_wait_seconds=5.0)
+    await gate.acquire()
+    waiter = asyncio.create_task(gate.acquire())
+    await settle()
+    assert gate.queued == 1
+    with pytest.raises(Overloaded) as shed:
+        await gate.acquire()
+    assert shed.value.retry_after == 5.0 and gate.shed == 1
+
+    gate.release()
+    await waiter
+    assert (gate.active, gate.queued, gate.admitted) == (1, 0, 2)
+
+
+async def test_release_hands_the_slot_to_the_longest_waiter():
+    gate = AdmissionGate("test", concurrency=1, queue_size=5, max_wait_seconds=5.0)
+    order = []
+    await gate.acquire()
+
+    async def wait(name):
+        await gate.acquire()
+        order.append(name)
+
+    waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+    await settle()
+    gate.release(0.1)
+    await settle()
+    assert order == ["first"] and gate.active == 1
+    gate.release(0.3)
+    await asyncio.gather(*waiters)
+    assert order == ["first", "second"]
+    gate.release()
+    assert gate.active == 0
+    # Moving average of the hold times
+    assert gate.service_time == pytest.approx(0.2 * 0.3 + 0.8 * 0.1)
+
+
+async def test_waiters_are_shed_when_the_budget_runs_out():
+    gate = AdmissionGate("test", concurrency=1, queue_size=5, max_wait_seconds=0.05)
+    await gate.acquire()
+    with pytest.raises(Overloaded):
+        await gate.acquire()
+    assert gate.queued == 0 and gate.shed == 1
+    # A slot released later goes back to the pool rather than to the departed waiter
+    gate.release()
+    assert gate.active == 0
+
+
+async def test_predicted_wait_over_budget_sheds_without_queueing():
+    gate = AdmissionGate("test", concurrency=2, queue_size=10, max_wait_seconds=1.0)
+    gate.service_time = 0.6
+    await gate.acquire()
+    await gate.acquire()
+    # First in line waits about one service time
+    first = asyncio.create_task(gate.acquire())
+    await settle()
+    assert gate.queued == 1
+    # Waits are predicted in batches of `concurrency`: position 2 waits two service times
+    second = asyncio.create_task(gate.acquire())
+    await settle()
+    with pytest.raises(Overloaded) as shed:
+        await gate.acquire()
+    assert shed.value.retry_after == pytest.approx(1.2)
+    assert gate.queued == 2
+    gate.release()
+    gate.release()
+    await asyncio.gather(first, second)
+
+
+async def test_cancelled_waiters_leave_the_queue():
+    gate = AdmissionGate("test", concurrency=1, queue_size=5, max_wait_seconds=5.0)
+    await gate.acquire()
+    waiter = asyncio.create_task(gate.acquire())
+    await settle()
+    waiter.cancel()
+    await settle()
+    assert gate.queued == 0
+    gate.release()
+    assert gate.active == 0
+
+
+def test_probes_build_the_services_cache_keys():
+    cache = TieredCache(MemoryCache())
+    assert recommendations_probe(cache, {}, {"user_id": "5", "limit": "3"}) == ("recommendations", "5:0:hybrid:3")
+    assert recommendations_probe(cache, {}, {"user_id": "x"}) is None
+    assert recommendations_probe(cache, {}, {}) is None
+    assert popular_movies_probe(cache, {}, {}) == ("popular_movies", 20)
+    assert popular_movies_probe(cache, {}, {"limit": "many"}) is None
+
+
+class Endpoint:
+    """ASGI app that holds each request until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def request(middleware, path, query=b"", cache=None):
+    app = SimpleNamespace(state=SimpleNamespace(container=SimpleNamespace(cache=cache) if cache else None))
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query, "headers": [], "app": app}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, None, send)
+    return messages[0]["status"], dict(messages[0]["headers"]), messages[1]["body"]
+
+
+async def test_middleware_sheds_with_503_and_lets_cache_hits_and_other_routes_through():
+    endpoint = Endpoint()
+    gate = AdmissionGate("recommendations", concurrency=1, queue_size=0, max_wait_seconds=2.5)
+    middleware = AdmissionMiddleware(endpoint, [
+        AdmissionRoute(gate, ("GET",), re.compile(r"/recommendations/?"), recommendations_probe)
+    ])
+    cache = TieredCache(MemoryCache())
+    cache.l1.set(cache.key("recommendations", "5:0:hybrid:10"), {"user_id": 5})
+
+    running = asyncio.create_task(request(middleware, "/recommendations/", b"user_id=1", cache))
+    await settle()
+    assert gate.active == 1
+
+    status, headers, body = await request(middleware, "/recommendations/", b"user_id=2", cache)
+    assert status == 503
+    assert headers[b"retry-after"] == b"3" and headers[b"content-type"] == b"application/json"
+    assert body == b'{"detail":"Service overloaded, please retry later"}'
+
+    # Requests answered from L1, and routes outside every gate, run while the gate is full
+    bypassed = [
+        asyncio.create_task(request(middleware, "/recommendations/", b"user_id=5", cache)),
+        asyncio.create_task(request(middleware, "/movies/1", cache=cache))
+    ]
+    await settle()
+    assert endpoint.calls == 3 and gate.active == 1
+
+    endpoint.release.set()
+    assert [status for status, _, _ in await asyncio.gather(running, *bypassed)] == [200, 200, 200]
+    assert (gate.admitted, gate.cache_hits, gate.shed, gate.active) == (1, 1, 1, 0)
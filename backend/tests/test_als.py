@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+import numpy as np
+from app.ml.als import ImplicitALS
+from app.ml.model_store import load_models
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cli_trained_model_is_served(tmp_path):
+    rng = np.random.default_rng(0)
+    ratings = tmp_path / "u.data"
+    rows = {(int(u), int(m)) for u, m in zip(rng.integers(1, 31, 600), rng.integers(1, 61, 600))}
+    ratings.write_text("".join(f"{u}\t{m}\t{rng.integers(1, 6)}\t0\n" for u, m in sorted(rows)))
+    models_path = tmp_path / "models"
+
+    subprocess.run(
+        [sys.executable, "-m", "app.ml.als", "--ratings", str(ratings), "--output", str(models_path / "als_model.pkl"),
+         "--factors", "8", "--epochs", "3", "--jobs", "1"],
+        cwd=BACKEND_DIR, check=True, capture_output=True
+    )
+    models = load_models(str(models_path))
+
+    assert isinstance(models["als"], ImplicitALS)
+    seen = {m for u, m in rows if u == 1}
+    recommendations = models["als"].recommend(1, 5, exclude_seen=seen)
+    assert len(recommendations) == 5
+    assert not {movie_id for movie_id, _ in recommendations} & seen
@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+import app.cache as cache_module
+from app.cache import MemoryCache, RedisCache, TieredCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def server() -> FakeServer:
+    return FakeServer()
+
+
+def make_cache(server: FakeServer = None, **kwargs) -> TieredCache:
+    l2 = RedisCache(FakeRedis(server=server)) if server is not None else None
+    return TieredCache(MemoryCache(max_items=100, ttl=30.0), l2, prefix="test", version="v1", **kwargs)
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def test_memory_cache_expires_entries(clock):
+    l1 = MemoryCache(max_items=10, ttl=30.0)
+    l1.set("a", 1)
+    l1.set("b", 2, ttl=5.0)
+    clock.now += 10
+    assert l1.get("a") == 1
+    assert l1.get("b") is None
+    clock.now += 30
+    assert l1.get("a") is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    l1 = MemoryCache(max_items=2, ttl=30.0)
+    l1.set("a", 1)
+    l1.set("b", 2)
+    l1.get("a")
+    l1.set("c", 3)
+    assert l1.get("a") == 1
+    assert l1.get("b") is None
+    assert l1.get("c") == 3
+
+
+async def test_get_set_l1_only():
+    cache = make_cache()
+    assert await cache.get("movie", 1) is None
+    await cache.set("movie", 1, {"title": "Toy Story"})
+    assert await cache.get("movie", 1) == {"title": "Toy Story"}
+    assert await cache.get_many("movie", [1, 2]) == [{"title": "Toy Story"}, None]
+
+
+async def test_l2_fills_l1_of_other_workers(server):
+    writer, reader = make_cache(server), make_cache(server)
+    await writer.set_many("movie", {1: {"title": "Toy Story"}, 2: {"title": "GoldenEye"}})
+    assert reader.l1.get(reader.key("movie", 1)) is None
+    assert await reader.get_many("movie", [1, 2, 3]) == [{"title": "Toy Story"}, {"title": "GoldenEye"}, None]
+    assert reader.l1.get(reader.key("movie", 2)) == {"title": "GoldenEye"}
+
+
+async def test_l2_entries_expire(server):
+    cache = make_cache(server, ttl=300.0)
+    await cache.set("movie", 1, "x", ttl=0.05)
+    client = cache.l2.client
+    assert 0 < await client.pttl(cache.key("movie", 1)) <= 50
+    await cache.set("movie", 2, "y")
+    assert 290_000 < await client.pttl(cache.key("movie", 2)) <= 300_000
+    await asyncio.sleep(0.1)
+    assert (await cache.l2.get_many([cache.key("movie", 1)])) == [None]
+
+
+async def test_get_or_set_computes_once():
+    cache = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return [1, 2, 3]
+
+    assert await cache.get_or_set("popular_movies", 3, compute) == [1, 2, 3]
+    assert await cache.get_or_set("popular_movies", 3, compute) == [1, 2, 3]
+    assert len(calls) == 1
+
+
+async def test_redis_errors_are_misses():
+    class BrokenRedis(FakeRedis):
+        async def mget(self, *args, **kwargs):
+            raise cache_module.RedisError("down")
+
+    cache = TieredCache(MemoryCache(), RedisCache(BrokenRedis()), prefix="test", version="v1")
+    assert await cache.get("movie", 1) is None
+
+
+async def test_invalidate_reaches_other_workers(server):
+    first, second = make_cache(server), make_cache(server)
+    await second.start()
+    try:
+        await first.set("popular_movies", 10, [1, 2])
+        assert await second.get("popular_movies", 10) == [1, 2]
+        # Let the listener subscribe before publishing
+        await asyncio.sleep(0.05)
+        await first.invalidate("popular_movies")
+        await wait_for(lambda: second.l1.get(second.key("popular_movies", 10)) is None)
+        assert await second.get("popular_movies", 10) is None
+    finally:
+        await second.close()
+        await first.close()
+
+
+async def test_generation_bump_orphans_group_without_scan():
+    cache = make_cache()
+    assert await cache.generation("recommendations", 5) == 0
+    await cache.bump_generation("recommendations", 5)
+    assert await cache.generation("recommendations", 5) == 1
+    assert await cache.generation("recommendations", 6) == 0
+    cache.bump_local_generation("recommendations", 6)
+    assert await cache.generation("recommendations", 6) == 2
+
+
+async def test_local_generations_never_repeat_after_overflow():
+    cache = TieredCache(MemoryCache(max_items=2), prefix="test", version="v1")
+    await cache.bump_generation("recommendations", 1)
+    seen = {await cache.generation("recommendations", 1)}
+    for user_id in range(2, 5):
+        await cache.bump_generation("recommendations", user_id)
+    # The table was cleared; user 1 must not go back to a generation it had
+    assert await cache.generation("recommendations", 1) not in seen | {0}
+
+
+async def test_generation_bump_reaches_other_workers(server):
+    first, second = make_cache(server), make_cache(server)
+    await second.start()
+    try:
+        assert await second.generation("recommendations", 5) == 0
+        await asyncio.sleep(0.05)
+        await first.bump_generation("recommendations", 5)
+        assert await first.generation("recommendations", 5) == 1
+        await wait_for(lambda: second.local_generation("recommendations", 5) == 1)
+        assert await first.l2.client.get(first.key("generations", "recommendations:5")) == b"1"
+    finally:
+        await second.close()
+        await first.close()
+
+
+async def test_bump_local_generation_rereads_redis(server):
+    first, second = make_cache(server), make_cache(server)
+    assert await second.generation("recommendations", 5) == 0
+    await first.bump_generation("recommendations", 5)
+    # Without the listener the copy is stale until dropped, e.g. by a change feed event
+    assert await second.generation("recommendations", 5) == 0
+    second.bump_local_generation("recommendations", 5)
+    assert await second.generation("recommendations", 5) == 1
@@ -0,0 +1,74 @@
+import re
+import numpy as np
+import pytest
+from app.indexes.catalog import MovieCatalog
+from app.indexes.snapshots import SnapshotStore
+
+GENRES = ["Drama", "Action|Sci-Fi", "Comedy|Drama|Romance", "Children's|Animation", "", "Sci-Fi", "Film-Noir|Crime"]
+
+
+@pytest.fixture
+def catalog() -> MovieCatalog:
+    return MovieCatalog([
+        {
+            "movie_id": i, "title": f"Movie {i}", "genre": GENRES[i % len(GENRES)],
+            "vote_average": float(i % 5), "vote_count": i, "release_date": f"{1950 + i}-01-01"
+        }
+        for i in range(1, 50)
+    ])
+
+
+def regex_mask(catalog: MovieCatalog, genre: str) -> np.ndarray:
+    pattern = re.compile(genre, re.IGNORECASE)
+    return np.array([pattern.search(doc["genre"]) is not None for doc in catalog.records])
+
+
+@pytest.mark.parametrize("genre", ["Drama", "drama", "sci-fi", "Fi", "children's", "noir", "a", "Western", "Drama|Crime", "^Dr", "ma$"])
+def test_genre_mask_matches_regex_semantics(catalog, genre):
+    np.testing.assert_array_equal(catalog.genre_mask(genre), regex_mask(catalog, genre))
+
+
+def test_literal_genres_use_token_bitmasks(catalog):
+    assert catalog.genre_bits is not None and catalog.genre_bits.dtype == np.uint64
+    catalog.genre_mask("Drama")
+    assert catalog._genre_matches == {}
+    catalog.genre_mask("^Dr")
+    assert list(catalog._genre_matches) == ["^Dr"]
+
+
+def test_unknown_sort_fields_keep_id_order_without_caching(catalog):
+    for field in ("nope", "x" * 100, "_id"):
+        rows = catalog.query(limit=5, sort_by=field)
+        assert [doc["movie_id"] for doc in rows] == [1, 2, 3, 4, 5]
+        rows = catalog.query(limit=3, sort_by=field, sort_order="desc")
+        assert [doc["movie_id"] for doc in rows] == [1, 2, 3]
+    assert catalog._sort_keys == {}
+
+
+def test_known_sort_fields_follow_values_with_id_tiebreak(catalog):
+    rows = catalog.query(limit=4, sort_by="vote_average", sort_order="desc")
+    assert [doc["movie_id"] for doc in rows] == [4, 9, 14, 19]
+    assert set(catalog._sort_keys) == {"vote_average"}
+
+
+def test_columns_round_trip_through_snapshot_files(tmp_path):
+    original = MovieCatalog([
+        {"movie_id": 3, "title": "Amélie", "genre": "Comedy|Romance", "vote_average": 7.5, "vote_count": 0,
+         "release_date": "2001-04-25", "overview": "Paris", "poster_path": None},
+        {"movie_id": 1, "title": "", "genre": None, "vote_average": None, "vote_count": None},
+        {"movie_id": 2, "title": "Heat", "genre": "Action|Crime", "vote_average": 8.0, "vote_count": 12,
+         "release_date": None, "overview": "", "poster_path": "/heat.jpg"}
+    ])
+    store = SnapshotStore(str(tmp_path))
+    store.write({f"catalog_{key}": array for key, array in original.columns().items()}, {"created_at": 0})
+    _, arrays = store.latest()
+    restored = MovieCatalog.from_columns({key[len("catalog_"):]: array for key, array in arrays.items()})
+
+    assert restored.records == original.records
+    assert [list(doc) for doc in restored.records] == [list(doc) for doc in original.records]
+    for name in ("movie_ids", "vote_count", "release_year", "genre_codes", "genre_bits"):
+        np.testing.assert_array_equal(getattr(restored, name), getattr(original, name))
+    np.testing.assert_array_equal(restored.vote_average, original.vote_average)
+    assert restored.genres.tolist() == original.genres.tolist()
+    assert restored.titles == original.titles
+    assert [doc["movie_id"] for doc in restored.query(genre="crime", sort_by="vote_average")] == [2]
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import OperationFailure
+from app.indexes.change_feed import ChangeFeed, Position, POSITION_INDEX
+
+
+class FakeStream:
+    """Change stream yielding the given events, then waiting like an idle stream"""
+
+    def __init__(self, events, error=None):
+        self.events = list(events)
+        self.error = error
+        self.alive = True
+
+    async def __aenter__(self):
+        # Motor opens the stream lazily, so server errors surface here
+        if self.error is not None:
+            raise self.error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def next(self):
+        if self.events:
+            return self.events.pop(0)
+        await asyncio.Event().wait()
+
+    async def try_next(self):
+        return self.events.pop(0) if self.events else None
+
+
+class PreSixCollection:
+    """Collection of a MongoDB 5.0 server: watch rejects fullDocumentBeforeChange"""
+
+    def __init__(self, events, fail_on_open: bool):
+        self.events = events
+        self.fail_on_open = fail_on_open
+        self.watch_calls = []
+        self.indexes = []
+
+    def watch(self, **kwargs):
+        self.watch_calls.append(kwargs)
+        if "full_document_before_change" in kwargs:
+            error = OperationFailure(
+                "BSON field '$changeStream.fullDocumentBeforeChange' is an unknown field.", code=40415
+            )
+            if not self.fail_on_open:
+                raise error
+            return FakeStream([], error)
+        return FakeStream(self.events)
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append(keys)
+
+
+async def collect(feed: ChangeFeed, name: str, count: int, timeout: float = 2.0):
+    received = []
+    done = asyncio.Event()
+
+    async def handler(changes):
+        received.extend(changes)
+        if len(received) >= count:
+            done.set()
+
+    feed.subscribe(name, handler)
+    await feed.start()
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    finally:
+        await feed.close()
+    return received
+
+
+@pytest.mark.parametrize("fail_on_open", [True, False])
+async def test_watch_retries_without_pre_images_on_old_servers(fail_on_open):
+    now = datetime.utcnow()
+    collection = PreSixCollection([
+        {"_id": {"_data": "1"}, "operationType": "update", "fullDocument": {"movie_id": 1, "updated_at": now}}
+    ], fail_on_open)
+    feed = ChangeFeed({"movies": collection}, poll_interval=0.01)
+    received = await collect(feed, "movies", 1)
+    assert [change.document["movie_id"] for change in received] == [1]
+    assert feed.without_pre_images == {"movies"}
+    assert feed.modes["movies"] == "change_stream"
+    assert "full_document_before_change" not in collection.watch_calls[-1]
+    assert feed.resume_tokens["movies"] == {"_data": "1"}
+
+
+async def test_polling_creates_position_index_and_reads_in_order():
+    database = AsyncMongoMockClient()["change_feed_test"]
+    start = datetime.utcnow()
+    await database.ratings.insert_many([
+        {"user_id": 1, "movie_id": i, "rating": 4.0, "updated_at": start + timedelta(seconds=i % 2)} for i in range(5)
+    ])
+    feed = ChangeFeed(database, poll_interval=0.01)
+    feed.resume("ratings", Position(start))
+    received = await collect(feed, "ratings", 5)
+    assert feed.modes["ratings"] == "polling"
+    assert sorted(change.document["movie_id"] for change in received) == [0, 1, 2, 3, 4]
+    assert [change.document["movie_id"] for change in received[:3]] == [0, 2, 4]
+    index_keys = [info["key"] for info in (await database.ratings.index_information()).values()]
+    assert POSITION_INDEX in index_keys
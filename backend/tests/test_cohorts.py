@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from app.indexes.cohorts import CohortIndex, build_cohort_lists, cohort_keys, cohort_label, user_attributes
+
+ENGINEER = "age_band=25-34|gender=M|occupation=engineer"
+WRITER = "age_band=25-34|gender=M|occupation=writer"
+MEN_25_34 = "age_band=25-34|gender=M"
+
+USERS = [
+    {"user_id": 1, "age": 30, "gender": "M", "occupation": "engineer"},
+    {"user_id": 2, "age": 28, "gender": "m", "occupation": "Engineer"},
+    {"user_id": 3, "age": 33, "gender": "M", "occupation": "engineer "},
+    {"user_id": 4, "age": 26, "gender": "M", "occupation": "writer"},
+    {"user_id": 5, "age": 60, "gender": "F", "occupation": ""}
+]
+# (user, movie, rating)
+RATINGS = np.array([
+    (1, 10, 5), (2, 10, 5), (3, 10, 4),
+    (1, 20, 2), (2, 20, 3),
+    (4, 30, 5), (5, 30, 1), (5, 10, 1), (5, 20, 5)
+], dtype=np.int64)
+
+
+def build(**kwargs):
+    return build_cohort_lists(USERS, RATINGS[:, 0], RATINGS[:, 1], RATINGS[:, 2].astype(np.float64), **kwargs)
+
+
+def test_user_attributes_are_normalised_and_keys_run_most_specific_first():
+    assert user_attributes(USERS[1]) == {"age_band": "25-34", "gender": "M", "occupation": "engineer"}
+    assert cohort_keys(user_attributes(USERS[4])) == ["age_band=56+|gender=F", "age_band=56+", "gender=F"]
+    assert cohort_label(ENGINEER) == "25-34, M, engineer"
+
+
+def test_scores_are_cohort_averages_smoothed_towards_overall_averages():
+    w = 2.0
+    lists = build(prior_weight=w, min_users=3)
+    global_mean = RATINGS[:, 2].mean()
+    movie_ids, scores = lists[ENGINEER]
+    assert movie_ids.tolist() == [10, 20]
+
+    prior = (5 + 5 + 4 + 1 + w * global_mean) / (4 + w)
+    assert scores[0] == pytest.approx((5 + 5 + 4 + w * prior) / (3 + w))
+    prior = (2 + 3 + 5 + w * global_mean) / (3 + w)
+    assert scores[1] == pytest.approx((2 + 3 + w * prior) / (2 + w))
+
+
+def test_small_cohorts_fall_back_to_a_coarser_level():
+    lists = build(min_users=3)
+    # One writer is too few for a list; the writer's ratings still count one level down
+    assert WRITER not in lists
+    assert 30 in lists[MEN_25_34][0].tolist()
+    assert "age_band=56+|gender=F" not in lists and "gender=F" not in lists
+    assert set(build(min_users=1)) >= {WRITER, "age_band=56+|gender=F", "gender=F"}
+
+
+def test_lists_are_truncated_and_empty_inputs_give_no_lists():
+    assert all(len(movie_ids) <= 1 for movie_ids, _ in build(min_users=1, list_size=1).values())
+    assert build_cohort_lists([], RATINGS[:, 0], RATINGS[:, 1], RATINGS[:, 2]) == {}
+    assert build_cohort_lists(USERS, np.empty(0), np.empty(0), np.empty(0)) == {}
+
+
+async def test_index_serves_each_user_the_most_specific_cohort_with_a_list():
+    database = AsyncMongoMockClient()["cohort_test"]
+    await database.users.insert_many([dict(user) for user in USERS])
+    await database.ratings.insert_many([
+        {"user_id": int(u), "movie_id": int(m), "rating": float(r)} for u, m, r in RATINGS
+    ])
+    cohorts = CohortIndex(database.users, database.ratings, min_users=3, refresh_seconds=0)
+    await cohorts.refresh()
+
+    assert await cohorts.cohort_of(1) == ENGINEER
+    assert await cohorts.cohort_of(4) == MEN_25_34
+    assert await cohorts.cohort_of(5) is None
+    # Users added since the refresh are looked up once
+    await database.users.insert_one({"user_id": 6, "age": 31, "gender": "M", "occupation": "writer"})
+    assert await cohorts.cohort_of(6) == MEN_25_34
+    assert [movie_id for movie_id, _ in cohorts.top(ENGINEER, 5, exclude=[10])] == [20]
+
+    restored = CohortIndex(database.users, database.ratings, min_users=3)
+    restored.restore(cohorts.export())
+    assert await restored.cohort_of(4) == MEN_25_34
+    assert restored.top(ENGINEER, 5) == cohorts.top(ENGINEER, 5)
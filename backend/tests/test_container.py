@@ -0,0 +1,27 @@
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from mongomock_motor import AsyncMongoMockClient
+from app.cache import MemoryCache, RedisCache, TieredCache
+from app.container import Container
+
+
+class TrackedRedisCache(RedisCache):
+    closed = 0
+
+    async def close(self):
+        self.closed += 1
+        await super().close()
+
+
+async def test_close_leaves_a_passed_in_cache_to_its_owner(settings):
+    l2 = TrackedRedisCache(FakeRedis(server=FakeServer()))
+    cache = TieredCache(MemoryCache(), l2, prefix="test")
+    container = Container(settings, database=AsyncMongoMockClient()["container_test"], cache=cache)
+    await container.start()
+    assert cache._listener is None
+    await container.close()
+
+    assert l2.closed == 0
+    await cache.set("movie", 1, {"title": "Heat"})
+    cache.l1.clear()
+    assert await cache.get("movie", 1) == {"title": "Heat"}
@@ -0,0 +1,51 @@
+from datetime import datetime
+from types import SimpleNamespace
+from app.indexes.catalog import MovieCatalog
+from app.services.home_service import HomeService
+
+
+class Repository:
+    def __init__(self, history):
+        self.history = history
+        self.reads = 0
+
+    async def user_history(self, user_id):
+        self.reads += 1
+        return self.history
+
+
+def make_service(history):
+    catalog = SimpleNamespace(snapshot=MovieCatalog([
+        {"movie_id": i, "title": f"Movie {i}", "genre": "Drama" if i % 2 else "Comedy", "vote_count": i}
+        for i in range(1, 21)
+    ]))
+    recommendations = SimpleNamespace(popular_ranking=[(i, 1.0 / i) for i in range(1, 21)])
+    repository = Repository(history)
+    return HomeService(SimpleNamespace(), recommendations, repository, catalog=catalog), repository
+
+
+async def test_history_is_not_read_for_sections_that_do_not_use_it():
+    service, repository = make_service([])
+    home = await service.get_home(1, limit=3, sections=["popular", "trending"])
+    assert repository.reads == 0
+    assert [s["name"] for s in home["sections"]] == ["popular", "trending"]
+    assert [item["movie_id"] for item in home["sections"][0]["items"]] == [1, 2, 3]
+
+
+async def test_history_is_read_once_for_every_section_using_it():
+    service, repository = make_service([{"movie_id": 1, "rating": 5.0, "created_at": datetime(2024, 1, 1)}])
+    home = await service.get_home(1, limit=3, sections=["recently_rated", "genres"])
+    assert repository.reads == 1
+    assert [s["name"] for s in home["sections"]] == ["recently_rated", "genres"]
+    assert home["sections"][1]["genre"] == "Drama"
+    assert 1 not in [item["movie_id"] for item in home["sections"][1]["items"]]
+
+
+async def test_recently_rated_keeps_ratings_without_created_at():
+    service, _ = make_service([
+        {"movie_id": 1, "rating": 4.0},
+        {"movie_id": 2, "rating": 3.0, "created_at": datetime(2024, 1, 2)},
+        {"movie_id": 3, "rating": 5.0, "created_at": None}
+    ])
+    home = await service.get_home(1, sections=["recently_rated"])
+    assert [item["movie_id"] for item in home["sections"][0]["items"]] == [2, 1, 3]
@@ -0,0 +1,45 @@
+from mongomock_motor import AsyncMongoMockClient
+from app.repositories.load_movielens import load
+
+USERS = "1|24|M|technician|85711\n2|53|F|other|94043\n"
+# Tab-separated u.data rows; the last one repeats the first user/movie pair
+RATINGS = "1\t10\t4\t881250949\n1\t20\t3\t881250950\n2\t10\t5\t881250951\n1\t10\t2\t881250952\n"
+
+
+def write_files(tmp_path):
+    users, ratings = tmp_path / "u.user", tmp_path / "u.data"
+    users.write_text(USERS)
+    ratings.write_text(RATINGS)
+    return str(users), str(ratings)
+
+
+async def test_insert_skips_duplicate_rows_across_chunks(tmp_path):
+    database = AsyncMongoMockClient()["load_test"]
+    users, ratings = write_files(tmp_path)
+    totals = await load(database, users_path=users, ratings_path=ratings, chunk_size=2, batch_size=2)
+    assert totals["ratings"]["inserted"] == 3
+    assert totals["ratings"]["skipped"] == 1
+    assert (await database.ratings.find_one({"user_id": 1, "movie_id": 10}))["rating"] == 4.0
+    assert "user_id_1_movie_id_1" in await database.ratings.index_information()
+
+
+async def test_upsert_leaves_unchanged_documents_alone(tmp_path):
+    database = AsyncMongoMockClient()["load_test"]
+    users, ratings = write_files(tmp_path)
+    await load(database, users_path=users, ratings_path=ratings, mode="upsert")
+    before = {doc["user_id"]: doc["updated_at"] for doc in await database.users.find().to_list(None)}
+
+    totals = await load(database, users_path=users, ratings_path=ratings, mode="upsert")
+    assert totals["users"]["updated"] == 0
+    assert totals["users"]["unchanged"] == 2
+    assert totals["ratings"]["updated"] == 0
+    after = {doc["user_id"]: doc["updated_at"] for doc in await database.users.find().to_list(None)}
+    assert after == before
+
+    (tmp_path / "u.user").write_text(USERS.replace("technician", "writer"))
+    totals = await load(database, users_path=users, mode="upsert")
+    assert (totals["users"]["updated"], totals["users"]["unchanged"]) == (1, 1)
+    changed = await database.users.find_one({"user_id": 1})
+    assert changed["occupation"] == "writer"
+    assert changed["updated_at"] > before[1]
+    assert changed["created_at"] == (await database.users.find_one({"user_id": 2}))["created_at"]
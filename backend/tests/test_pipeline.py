@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from app.ml.pipeline import FactorANNCandidates
+from app.ml.quantization import QuantizedMatrix, quantize_model
+from app.ml.recommenders import MatrixFactorizationSVD
+
+
+@pytest.fixture
+def svd_model() -> MatrixFactorizationSVD:
+    rng = np.random.default_rng(0)
+    model = MatrixFactorizationSVD(n_factors=16)
+    model.user_ids = np.arange(1, 51)
+    model.item_ids = np.arange(100, 500)
+    model.user_factors = rng.normal(size=(50, 16))
+    model.item_factors = rng.normal(size=(400, 16))
+    model.user_bias = np.zeros(50)
+    model.item_bias = rng.normal(scale=0.1, size=400)
+    return model
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_factor_ann_scores_from_the_quantized_model(svd_model, precision):
+    ann = FactorANNCandidates(svd_model, n_probe=20)
+    full = {user_id: set(ann.generate(user_id, [], 20).tolist()) for user_id in range(1, 51)}
+
+    quantize_model(svd_model, precision)
+    assert isinstance(svd_model.item_factors, QuantizedMatrix)
+    assert not any(
+        isinstance(value, np.ndarray) and value.shape == svd_model.item_factors.shape
+        for value in vars(ann).values()
+    )
+    overlap = np.mean([len(full[u] & set(ann.generate(u, [], 20).tolist())) / 20 for u in range(1, 51)])
+    assert overlap > 0.9
+
+
+def test_factor_ann_builds_over_an_already_quantized_model(svd_model):
+    quantize_model(svd_model, "int8")
+    ann = FactorANNCandidates(svd_model)
+    candidates = ann.generate(1, [], 10)
+    assert len(candidates) == 10 and set(candidates.tolist()) <= set(svd_model.item_ids.tolist())
+    assert len(ann.generate(999, [], 10)) == 0
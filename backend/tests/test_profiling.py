@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+import pytest
+from app.utils.profiling import PROFILE_HEADER, ProfileStore, ProfilingMiddleware
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def call(middleware, headers=(), container=None):
+    app = SimpleNamespace(state=SimpleNamespace(container=container))
+    scope = {"type": "http", "method": "GET", "path": "/movies/", "query_string": b"", "headers": list(headers), "app": app}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, None, send)
+    return dict(messages[0]["headers"])
+
+
+async def test_profiles_are_saved_to_the_container_store(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(ok_app, token="secret", interval_ms=1)
+    headers = await call(middleware, [(PROFILE_HEADER.encode(), b"secret")], SimpleNamespace(profiles=store))
+    profiles = store.list()
+    assert [p["id"] for p in profiles] == [headers[b"x-profile-id"].decode()]
+    assert profiles[0]["reason"] == "requested"
+
+
+@pytest.mark.parametrize("value", [b"wrong", b"secre", b"secret2", b""])
+async def test_only_the_exact_token_requests_a_profile(tmp_path, value):
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(ok_app, token="secret")
+    headers = await call(middleware, [(PROFILE_HEADER.encode(), value)], SimpleNamespace(profiles=store))
+    assert b"x-profile-id" not in headers
+    assert store.list() == []
+
+
+async def test_requests_without_a_store_are_still_served():
+    middleware = ProfilingMiddleware(ok_app, slow_ms=0.000001)
+    assert await call(middleware) == {}
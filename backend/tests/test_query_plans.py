@@ -0,0 +1,95 @@
+"""Query-plan checks: every indexed service query shape must avoid a COLLSCAN
+
+The shape checks run against a real MongoDB server (explain plans cannot be
+faked) at QUERY_PLANS_MONGODB_URL, default mongodb://localhost:27017. They are
+skipped when no server answers, unless REQUIRE_MONGODB is set, as it is in CI.
+"""
+import os
+from datetime import datetime, timedelta
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from app.utils.query_plans import QueryShape, check_shape, query_shapes, seed, summarize_plan
+
+N_MOVIES, N_USERS, N_RATINGS = 2000, 1000, 30000
+MAX_RATIO = 2.0
+SCRATCH_DATABASE = "mvrs_query_plans_test"
+SHAPES = query_shapes(N_MOVIES, N_USERS, datetime.utcnow() - timedelta(days=1))
+
+
+@pytest.fixture(scope="module")
+def database():
+    url = os.environ.get("QUERY_PLANS_MONGODB_URL", "mongodb://localhost:27017")
+    client = MongoClient(url, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        if os.environ.get("REQUIRE_MONGODB"):
+            pytest.fail(f"MongoDB required for query-plan checks but unreachable at {url}: {e}")
+        pytest.skip(f"No MongoDB at {url}")
+    database = client[SCRATCH_DATABASE]
+    seed(database, N_MOVIES, N_USERS, N_RATINGS)
+    yield database
+    client.drop_database(SCRATCH_DATABASE)
+    client.close()
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=[shape.name for shape in SHAPES])
+def test_shape_plan(database, shape: QueryShape):
+    ok, summary = check_shape(database, shape, MAX_RATIO)
+    assert ok, f"{shape.name}: {summary['plan']} (docs {summary['docs_examined']}, returned {summary['returned']})"
+
+
+class CannedDatabase:
+    """Returns a fixed explain result"""
+
+    def __init__(self, explain):
+        self.explain = explain
+
+    def command(self, *args, **kwargs):
+        return self.explain
+
+
+def explain(plan, docs_examined, returned):
+    return {
+        "queryPlanner": {"winningPlan": plan},
+        "executionStats": {"totalDocsExamined": docs_examined, "totalKeysExamined": returned, "nReturned": returned}
+    }
+
+
+INDEXED = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1"}}
+COLLSCAN = {"stage": "COLLSCAN"}
+SHAPE = QueryShape("user history", {"find": "ratings", "filter": {"user_id": 1}})
+
+
+def test_indexed_plan_passes():
+    ok, summary = check_shape(CannedDatabase(explain(INDEXED, 10, 10)), SHAPE, MAX_RATIO)
+    assert ok
+    assert summary["plan"] == "FETCH < IXSCAN(user_id_1)"
+    assert summary["indexes"] == ["user_id_1"]
+
+
+def test_collscan_fails():
+    ok, summary = check_shape(CannedDatabase(explain(COLLSCAN, 1000, 10)), SHAPE, MAX_RATIO)
+    assert not ok
+    assert summary["collscan"]
+
+
+def test_index_examining_too_many_documents_fails():
+    ok, summary = check_shape(CannedDatabase(explain(INDEXED, 100, 10)), SHAPE, MAX_RATIO)
+    assert not ok
+    assert summary["ratio"] == 10.0
+
+
+def test_allowed_scans_pass():
+    shape = SHAPE._replace(expect="scan")
+    assert check_shape(CannedDatabase(explain(COLLSCAN, 1000, 10)), shape, MAX_RATIO)[0]
+
+
+def test_aggregate_cursor_plans_are_found():
+    summary = summarize_plan({
+        "stages": [{"$cursor": explain(COLLSCAN, 5, 5)}, {"$lookup": {}}]
+    })
+    assert summary["collscan"]
+    assert summary["stages"] == ["COLLSCAN", "$lookup"]
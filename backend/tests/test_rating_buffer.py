@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import orjson
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from app.cache import MemoryCache, TieredCache
+from app.indexes.change_feed import Position, read_changes
+from app.indexes.trending import TrendingIndex
+from app.services.rating_buffer import RatingWriteBuffer
+from app.services.rating_service import RatingService
+
+
+class RatingsCollection:
+    """Upserts into a dict keyed by (user_id, movie_id), reporting upserted_ids by operation index as MongoDB does"""
+
+    def __init__(self, existing=()):
+        self.documents = {key: {} for key in existing}
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted = {}
+        for i, operation in enumerate(operations):
+            key = (operation._filter["user_id"], operation._filter["movie_id"])
+            if type(operation).__name__ == "DeleteOne":
+                self.documents.pop(key, None)
+                continue
+            if key not in self.documents:
+                upserted[i] = key
+                self.documents[key] = {}
+            self.documents[key].update(operation._doc["$set"])
+        return SimpleNamespace(upserted_ids=upserted)
+
+
+class Trending:
+    def __init__(self):
+        self.recorded = []
+
+    def record(self, movie_id, at=None):
+        self.recorded.append(movie_id)
+
+
+class Repository:
+    async def apply_flushed(self, records):
+        pass
+
+
+def make_service(tmp_path, existing=()):
+    buffer = RatingWriteBuffer(RatingsCollection(existing), str(tmp_path), flush_interval=60)
+    trending = Trending()
+    service = RatingService(
+        AsyncMongoMockClient()["buffer_test"], TieredCache(MemoryCache()), buffer=buffer,
+        repository=Repository(), trending=trending
+    )
+    return service, buffer, trending
+
+
+async def test_flush_reports_which_writes_created_ratings(tmp_path):
+    buffer = RatingWriteBuffer(RatingsCollection(existing=[(1, 10)]), str(tmp_path), flush_interval=60)
+    flushed = []
+
+    async def on_flush(records):
+        flushed.extend(records)
+
+    buffer.on_flush = on_flush
+    await buffer.start()
+    now = datetime.utcnow()
+    await buffer.put(1, 10, 4.0, now)
+    await buffer.put(1, 20, 3.0, now)
+    await buffer.put(2, 10, 5.0, now)
+    await buffer.close()
+    assert {(r["user_id"], r["movie_id"]): r["inserted"] for r in flushed} == {(1, 10): False, (1, 20): True, (2, 10): True}
+
+
+async def test_rerating_does_not_count_towards_trending(tmp_path):
+    service, buffer, trending = make_service(tmp_path, existing=[(1, 10)])
+    await buffer.start()
+    await service.create_or_update_rating(1, 10, 2.0)
+    await service.create_or_update_rating(1, 20, 4.0)
+    # Nothing counts until the writes reach MongoDB
+    assert trending.recorded == []
+    await buffer.flush()
+    assert trending.recorded == [20]
+
+    await service.create_or_update_rating(1, 20, 5.0)
+    await buffer.close()
+    assert trending.recorded == [20]
+
+
+async def test_flushed_ratings_are_read_after_a_poll_passed_their_accept_time(tmp_path):
+    collection = AsyncMongoMockClient()["buffer_test"]["ratings"]
+    buffer = RatingWriteBuffer(collection, str(tmp_path), flush_interval=60)
+    await buffer.start()
+    accepted = datetime.utcnow() - timedelta(seconds=5)
+    await buffer.put(1, 10, 4.0, accepted)
+
+    # Another worker's direct write, seen by a poll before the buffer flushes
+    await collection.insert_one({"user_id": 2, "movie_id": 20, "rating": 3.0, "updated_at": datetime.utcnow()})
+    changes, position = await read_changes(collection, Position(accepted - timedelta(seconds=1)))
+    assert [c.document["user_id"] for c in changes] == [2]
+
+    await buffer.close()
+    changes, _ = await read_changes(collection, position)
+    assert [(c.document["user_id"], c.document["movie_id"]) for c in changes] == [(1, 10)]
+    assert abs(changes[0].document["created_at"] - accepted) < timedelta(milliseconds=1)
+
+
+async def test_recovery_keeps_the_latest_accepted_write(tmp_path):
+    now = datetime.utcnow()
+    # File names sort the other way round from the writes they hold
+    for name, rating, at in (("ratings-1-1-1.log", 5.0, now), ("ratings-2-2-1.log", 1.0, now - timedelta(seconds=1))):
+        (tmp_path / name).write_bytes(orjson.dumps(
+            {"op": "set", "user_id": 1, "movie_id": 10, "rating": rating, "at": at.isoformat()}
+        ) + b"\n")
+    collection = RatingsCollection()
+    buffer = RatingWriteBuffer(collection, str(tmp_path), flush_interval=60)
+    await buffer.start()
+    await buffer.close()
+    assert collection.documents[(1, 10)]["rating"] == 5.0
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_polling_workers_count_only_new_buffered_ratings(tmp_path):
+    collection = AsyncMongoMockClient()["buffer_test"]["ratings"]
+    buffer = RatingWriteBuffer(collection, str(tmp_path), flush_interval=60)
+    await buffer.start()
+    position = Position(datetime.utcnow() - timedelta(seconds=1))
+    trending = TrendingIndex(None)
+
+    await buffer.put(1, 10, 4.0, datetime.utcnow() - timedelta(seconds=5))
+    await buffer.flush()
+    changes, position = await read_changes(collection, position)
+    trending.apply_changes(changes)
+    assert list(trending.counters.scores) == [10]
+
+    await buffer.put(1, 10, 2.0, datetime.utcnow())
+    await buffer.close()
+    changes, _ = await read_changes(collection, position)
+    assert len(changes) == 1
+    trending.apply_changes(changes)
+    assert trending.counters.score(10) == pytest.approx(1.0, rel=1e-3)
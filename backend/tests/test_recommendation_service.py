@@ -0,0 +1,181 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from mongomock_motor import AsyncMongoMockClient
+from app.cache import MemoryCache, TieredCache
+from app.container import get_recommendation_service
+from app.indexes.catalog import MovieCatalog
+from app.indexes.seen import SeenIndex
+from app.ml.scoring import ScoringExecutor
+from app.routers import recommendations
+from app.services.recommendation_service import RecommendationService
+
+
+class Ranker:
+    """Model returning fixed movie ids in order, optionally slowly or failing"""
+
+    def __init__(self, movie_ids, delay: float = 0.0, fail: bool = False):
+        self.movie_ids = list(movie_ids)
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def recommend(self, user_id, n_recommendations=10, exclude_seen=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model failed")
+        seen = set(exclude_seen or ())
+        ranked = [movie_id for movie_id in self.movie_ids if movie_id not in seen]
+        return [(movie_id, 1.0 / (rank + 1)) for rank, movie_id in enumerate(ranked)][:n_recommendations]
+
+
+class Repository:
+    def __init__(self, histories, delay: float = 0.0):
+        self.histories = histories
+        self.delay = delay
+        self.reads = 0
+
+    async def user_rating_values(self, user_id):
+        self.reads += 1
+        await asyncio.sleep(self.delay)
+        movie_ids = self.histories.get(user_id, [])
+        return np.array(movie_ids, dtype=np.int64), np.full(len(movie_ids), 4.0)
+
+
+class Cohorts:
+    def __init__(self, lists):
+        self.lists = lists
+
+    async def cohort_of(self, user_id):
+        return "age_band=25-34|gender=F" if self.lists else None
+
+    def top(self, key, n, exclude=None):
+        seen = set(exclude or ())
+        return [(movie_id, 4.0) for movie_id in self.lists if movie_id not in seen][:n]
+
+
+def make_service(settings, models, histories=None, history_delay=0.0, cohort_list=(), seen=None):
+    settings.RECOMMENDATION_BUDGET_MS = 300
+    # Every call runs the cascade instead of reusing the previous call's result
+    settings.SINGLE_FLIGHT_TTL_SECONDS = 0.0
+    catalog = SimpleNamespace(snapshot=MovieCatalog([
+        {"movie_id": i, "title": f"Movie {i}", "genre": "Drama"} for i in range(1, 60)
+    ]))
+    service = RecommendationService(
+        AsyncMongoMockClient()["recommendation_test"], TieredCache(MemoryCache()), settings,
+        catalog=catalog, seen=seen, repository=Repository(histories or {}, history_delay),
+        cohorts=Cohorts(list(cohort_list))
+    )
+    service.models = models
+    service.scoring = ScoringExecutor(models, timeout=1.0)
+    service.popular_ranking = [(movie_id, 1.0) for movie_id in range(50, 60)]
+    service.popular_ids = np.arange(50, 60, dtype=np.int64)
+    return service
+
+
+def ids(response):
+    return [r.movie_id for r in response.recommendations]
+
+
+async def test_requested_model_is_served_then_cached(settings):
+    hybrid = Ranker([1, 2, 3, 4])
+    service = make_service(settings, {"hybrid": hybrid}, {7: [2]})
+    first = await service.get_recommendations(7, "hybrid", 2)
+    assert (first.served_by, first.model_used, ids(first)) == ("model", "hybrid", [1, 3])
+
+    second = await service.get_recommendations(7, "hybrid", 2)
+    assert (second.served_by, ids(second)) == ("cache", [1, 3])
+    assert hybrid.calls == 1
+
+
+@pytest.mark.parametrize("hybrid", [Ranker([1, 2], delay=1.0), Ranker([1, 2], fail=True), Ranker([])])
+async def test_fallback_model_serves_when_the_requested_one_cannot(settings, hybrid):
+    service = make_service(settings, {"hybrid": hybrid, "content": Ranker([5, 6, 7])}, {7: [6]})
+    response = await service.get_recommendations(7, "hybrid", 2)
+    assert (response.served_by, response.model_used, ids(response)) == ("fallback", "content", [5, 7])
+    # Degraded lists are not cached
+    assert (await service.get_recommendations(7, "hybrid", 2)).served_by == "fallback"
+
+
+async def test_cohort_list_follows_failed_models_without_seen_movies(settings):
+    seen = SeenIndex()
+    seen.build(np.array([7]), np.array([11]))
+    service = make_service(
+        settings, {"hybrid": Ranker([1], fail=True), "content": Ranker([2], fail=True)}, {7: [11]},
+        cohort_list=[10, 11, 12, 13], seen=seen
+    )
+    response = await service.get_recommendations(7, "hybrid", 2)
+    assert (response.served_by, ids(response)) == ("cohort", [10, 12])
+    assert response.recommendations[0].reason == "Popular with similar viewers (25-34, F)"
+
+
+async def test_popularity_is_the_last_resort_without_seen_movies(settings):
+    seen = SeenIndex()
+    seen.build(np.array([7, 7]), np.array([50, 52]))
+    service = make_service(settings, {"hybrid": Ranker([1], fail=True)}, {7: [50, 52]}, seen=seen)
+    response = await service.get_recommendations(7, "hybrid", 3)
+    assert (response.served_by, response.model_used, ids(response)) == ("popularity", "popularity", [51, 53, 54])
+
+
+async def test_users_without_ratings_skip_the_models(settings):
+    hybrid = Ranker([1, 2])
+    service = make_service(settings, {"hybrid": hybrid}, cohort_list=[20, 21])
+    response = await service.get_recommendations(8, "hybrid", 2)
+    assert (response.served_by, ids(response)) == ("cohort", [20, 21])
+    assert hybrid.calls == 0
+
+
+async def test_history_timeout_still_scores_with_the_seen_index(settings):
+    seen = SeenIndex()
+    seen.build(np.array([7]), np.array([1]))
+    service = make_service(settings, {"hybrid": Ranker([1, 2, 3])}, {7: [1]}, history_delay=5.0, seen=seen)
+    response = await service.get_recommendations(7, "hybrid", 2)
+    assert (response.served_by, ids(response)) == ("model", [2, 3])
+
+
+async def test_spent_budget_skips_to_precomputed_lists(settings):
+    hybrid = Ranker([1, 2])
+    service = make_service(settings, {"hybrid": hybrid}, {7: [1]})
+    response = await service.get_recommendations(7, "hybrid", 2, budget=0.0)
+    assert (response.served_by, ids(response)) == ("popularity", [50, 51])
+    assert hybrid.calls == 0
+
+
+async def test_comparison_shares_one_context_across_models(settings):
+    svd = Ranker([1, 2, 3])
+    models = {"svd": svd, "collaborative": svd, "content": Ranker([3, 4, 5]), "broken": Ranker([], fail=True)}
+    service = make_service(settings, models, {7: [3]})
+    comparison = await service.compare_models(7, ["content", "svd", "collaborative", "broken"], 2)
+
+    assert service.ratings.reads == 1 and comparison.history_count == 1
+    # A model served under two names runs once
+    assert svd.calls == 1
+    lists = {c.model: [r.movie_id for r in c.recommendations] for c in comparison.models}
+    assert lists == {"content": [4, 5], "svd": [1, 2], "collaborative": [1, 2], "broken": []}
+    assert [c.model for c in comparison.models] == ["content", "svd", "collaborative", "broken"]
+    assert comparison.models[3].error == "model failed"
+    assert comparison.models[0].recommendations[0].reason == "Recommended by content model"
+
+
+async def test_compare_endpoint_validates_its_parameters(settings):
+    service = make_service(settings, {"svd": Ranker([1, 2]), "content": Ranker([2, 3])}, {7: []})
+    app = FastAPI()
+    app.include_router(recommendations.router, prefix="/recommendations")
+    app.dependency_overrides[get_recommendation_service] = lambda: service
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/recommendations/compare", params={"user_id": 7, "models": "svd, als,knn"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Unknown or unloaded models: als, knn"
+        for params in ({"models": "svd"}, {"user_id": 7, "limit": 0}, {"user_id": 7, "limit": 51}, {"user_id": "x"}):
+            assert (await client.get("/recommendations/compare", params=params)).status_code == 422
+
+        response = await client.get("/recommendations/compare", params={"user_id": 7, "limit": 1})
+        assert response.status_code == 200
+        assert [(m["model"], [r["movie_id"] for r in m["recommendations"]]) for m in response.json()["models"]] == [
+            ("svd", [1]), ("content", [2])
+        ]
@@ -0,0 +1,46 @@
+import time
+import pytest
+from app.ml.scoring import ScoringExecutor, ScoringOverloaded, ScoringTimeout
+
+
+class SlowModel:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.calls = 0
+
+    def predict_batch(self, user_ids, movie_ids):
+        return []
+
+    def recommend(self, user_id, n):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return [(1, 5.0)][:n]
+
+
+@pytest.mark.parametrize("budget", [0.0, -0.5])
+async def test_spent_budget_fails_at_once_without_running(budget):
+    model = SlowModel(0.5)
+    executor = ScoringExecutor({"slow": model}, timeout=2.0)
+    started = time.perf_counter()
+    with pytest.raises(ScoringTimeout):
+        await executor.run("slow", "recommend", 1, 1, timeout=budget)
+    assert time.perf_counter() - started < 0.1
+    assert model.calls == 0 and executor.stats()["thread"] == 0
+    executor.shutdown()
+
+
+async def test_default_timeout_applies_without_a_budget():
+    executor = ScoringExecutor({"slow": SlowModel(0.3)}, timeout=0.05)
+    with pytest.raises(ScoringTimeout):
+        await executor.run("slow", "recommend", 1, 1)
+    assert await executor.run("slow", "recommend", 1, 1, timeout=1.0) == [(1, 5.0)]
+    executor.shutdown()
+
+
+async def test_full_pool_rejects_calls():
+    executor = ScoringExecutor({"slow": SlowModel(0.2)}, thread_workers=1, queue_size=0, timeout=1.0)
+    running = executor.threads.submit(time.sleep, 0.2)
+    with pytest.raises(ScoringOverloaded):
+        await executor.run("slow", "recommend", 1, 1)
+    running.result()
+    executor.shutdown()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from app.indexes.change_feed import Change
+from app.indexes.seen import SeenIndex, SeenSet
+from app.ml.ranking import exclusion_mask
+
+
+def test_light_raters_are_stored_as_sorted_ids():
+    seen = SeenSet([900, 5, 5, 40])
+    assert seen.bits is None and seen.ids.tolist() == [5, 40, 900]
+    assert len(seen) == 3
+
+
+def test_heavy_raters_are_stored_as_a_bitset():
+    seen = SeenSet(range(0, 200, 2))
+    assert seen.ids is None and seen.bits.dtype == np.uint8
+    assert seen.nbytes == 25
+    assert seen.to_array().tolist() == list(range(0, 200, 2))
+
+
+@pytest.mark.parametrize("movie_ids", [[3, 1000, 77], list(range(1, 300, 3)), []])
+def test_both_forms_answer_membership_the_same(movie_ids):
+    seen = SeenSet(movie_ids)
+    items = np.arange(-5, 1100)
+    np.testing.assert_array_equal(seen.mask(items), np.isin(items, movie_ids))
+    assert all(movie_id in seen for movie_id in movie_ids)
+    assert -1 not in seen and 5000 not in seen
+
+
+def test_adding_and_removing_switches_form():
+    seen = SeenSet(range(1, 40))
+    assert seen.bits is not None
+    grown = seen.add(100000)
+    assert grown.ids is not None and 100000 in grown and 39 in grown
+    shrunk = grown.remove(100000)
+    assert shrunk.bits is not None and shrunk.to_array().tolist() == list(range(1, 40))
+    # Sets are immutable
+    assert 100000 not in seen and 100000 in grown
+
+
+def test_seen_sets_drive_exclusion():
+    item_ids = np.array([1, 2, 3, 4, 5])
+    np.testing.assert_array_equal(exclusion_mask(item_ids, SeenSet([2, 5])), [False, True, False, False, True])
+    np.testing.assert_array_equal(exclusion_mask(item_ids, [2, 5]), [False, True, False, False, True])
+    assert exclusion_mask(item_ids, None) is None
+
+
+def test_index_builds_applies_changes_and_round_trips_through_export():
+    index = SeenIndex()
+    index.build(np.array([2, 1, 2, 1, 3]), np.array([20, 10, 21, 11, 30]))
+    assert index.get(1).to_array().tolist() == [10, 11]
+    assert len(index.get(99)) == 0
+
+    snapshot = index.copy()
+    affected = index.apply_changes([
+        Change("insert", {"user_id": 1, "movie_id": 12}),
+        Change("delete", None, {"user_id": 2, "movie_id": 20})
+    ])
+    assert affected == {1, 2}
+    assert index.get(1).to_array().tolist() == [10, 11, 12]
+    assert index.get(2).to_array().tolist() == [21]
+    assert snapshot.get(1).to_array().tolist() == [10, 11]
+
+    restored = SeenIndex()
+    restored.restore(*index.export())
+    assert restored.users == {}
+    for user_id in (1, 2, 3, 99):
+        assert restored.get(user_id).to_array().tolist() == index.get(user_id).to_array().tolist()
+    restored.add(3, 31)
+    assert restored.export()[2].tolist() == [10, 11, 12, 21, 30, 31]
@@ -0,0 +1,87 @@
+import math
+from datetime import datetime, timedelta
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from app.indexes.change_feed import Change
+from app.indexes.trending import MAX_EXPONENT, TrendingCounters, TrendingIndex
+
+HOUR = 3600.0
+
+
+def test_scores_halve_every_half_life():
+    counters = TrendingCounters(half_life_seconds=HOUR, landmark=0.0)
+    counters.add(1, at=0.0)
+    counters.add(1, at=HOUR)
+    assert counters.score(1, now=HOUR) == pytest.approx(1.5)
+    assert counters.score(1, now=3 * HOUR) == pytest.approx(0.375)
+    assert counters.score(2, now=HOUR) == 0.0
+
+
+def test_recent_activity_outranks_old_volume():
+    counters = TrendingCounters(half_life_seconds=HOUR, landmark=0.0)
+    # Three ratings two half-lives ago are worth 0.75 of one now
+    for _ in range(3):
+        counters.add(1, at=0.0)
+    for _ in range(3):
+        counters.add(2, at=2 * HOUR)
+    counters.add(3, at=2 * HOUR)
+    assert [movie_id for movie_id, _ in counters.top(3, now=2 * HOUR)] == [2, 3, 1]
+    assert counters.top(1, now=2 * HOUR)[0][1] == pytest.approx(3.0)
+
+
+def test_landmark_moves_forward_without_changing_scores():
+    counters = TrendingCounters(half_life_seconds=HOUR, landmark=0.0)
+    later = (MAX_EXPONENT + 0.5) / counters.rate
+    counters.add(1, at=0.0)
+    counters.add(2, at=later - HOUR)
+    before = counters.score(2, now=later)
+    counters.add(3, at=later)
+
+    assert counters.landmark == later
+    # Stored scores are rescaled to the new landmark; ratings decayed to nothing are dropped
+    assert counters.scores == pytest.approx({2: 0.5, 3: 1.0})
+    assert counters.score(2, now=later) == pytest.approx(before)
+    assert counters.score(3, now=later + HOUR) == pytest.approx(0.5)
+
+
+def test_saved_counters_keep_their_values_under_a_new_half_life():
+    counters = TrendingCounters(half_life_seconds=HOUR)
+    counters.add(1)
+    counters.add(2)
+    counters.add(2)
+    restored = TrendingCounters.from_document(counters.to_document(), 2 * HOUR)
+    assert restored.half_life_seconds == 2 * HOUR
+    assert restored.score(2) == pytest.approx(counters.score(2), rel=1e-6)
+    assert restored.ranked_ids().tolist() == [2, 1]
+
+
+async def test_index_counts_only_new_ratings_and_excludes_seen_movies():
+    trending = TrendingIndex(None, half_life_seconds=HOUR)
+    now = datetime.utcnow()
+    trending.apply_changes([
+        Change("insert", {"movie_id": 1, "created_at": now}),
+        Change("update", {"movie_id": 2, "created_at": now, "updated_at": now}),
+        Change("update", {"movie_id": 2, "created_at": now, "updated_at": now}),
+        Change("update", {"movie_id": 3, "created_at": now - timedelta(days=1), "updated_at": now}),
+        Change("delete", None, {"movie_id": 1})
+    ])
+    assert trending.top_ids(5) == [2, 1]
+    assert trending.top_ids(5, exclude=[2]) == [1]
+
+
+async def test_index_rebuilds_from_recent_ratings_then_loads_persisted_counters():
+    database = AsyncMongoMockClient()["trending_test"]
+    now = datetime.utcnow()
+    await database.ratings.insert_many([
+        {"movie_id": 1, "created_at": now - timedelta(hours=1)},
+        {"movie_id": 2, "created_at": now},
+        {"movie_id": 3, "created_at": now - timedelta(days=30)}
+    ])
+    trending = TrendingIndex(database.trending, half_life_seconds=HOUR)
+    await trending.load(database.ratings)
+    assert trending.top_ids(5) == [2, 1]
+    await trending.save()
+
+    reloaded = TrendingIndex(database.trending, half_life_seconds=HOUR)
+    await reloaded.load(database.ratings)
+    assert reloaded.counters.scores == pytest.approx(trending.counters.scores)
@@ -106,6 +106,7 @@ export default function RecommendationsPage() {
                   <option value="collaborative">Collaborative Filtering</option>
                   <option value="content">Content-Based</option>
                   <option value="hybrid">Hybrid</option>
+                  <option value="als">Implicit ALS</option>
                 </select>
               </div>
             </div>
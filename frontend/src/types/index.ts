@@ -38,6 +38,7 @@ export interface RecommendationResponse {
   recommendations: MovieRecommendation[];
   model_used: string;
   total_count: number;
+  served_by?: string;
 }
 
 export interface RatingPrediction {
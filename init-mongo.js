@@ -186,12 +186,20 @@ db.ratings.insertMany([
 db.movies.createIndex({ movie_id: 1 }, { unique: true });
 db.movies.createIndex({ title: 1 });
 db.movies.createIndex({ genre: 1 });
+db.movies.createIndex({ vote_average: 1 });
+db.movies.createIndex({ vote_count: 1 });
+db.movies.createIndex({ release_date: 1 });
+db.movies.createIndex({ updated_at: 1, _id: 1 });
 
 db.users.createIndex({ user_id: 1 }, { unique: true });
 
 db.ratings.createIndex({ user_id: 1, movie_id: 1 }, { unique: true });
 db.ratings.createIndex({ user_id: 1 });
 db.ratings.createIndex({ movie_id: 1 });
+db.ratings.createIndex({ created_at: 1 });
+db.ratings.createIndex({ updated_at: 1, _id: 1 });
+
+db.rating_buckets.createIndex({ user_id: 1, seq: 1 }, { unique: true });
 
 db.recommendations.createIndex({ user_id: 1, model_type: 1 });
 db.recommendations.createIndex({ user_id: 1 });